@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""历史数据归档：把早于 N 个月、已结束的就诊 / 预约分批移入归档表
+
+热表 Visits / Appointments 只保留近期和未结束的数据，待缴费 / 待核验队列与日常写入只访问热表。
+MySQL 分区表不支持外键（Visits 引用 Appointments / Staff / Departments），因此用归档表而不是分区。
+每批在独立的短事务中 INSERT ... SELECT + DELETE，不长时间持锁；先归档就诊，再归档已无就诊
+引用的预约（Visits.appt_id 外键）。
+
+检索、导出、汇总重算的日期范围早于归档水位（horizon）时，才会同时查询归档表。
+
+    python archive.py run --months 6
+    python archive.py status
+"""
+import argparse
+import calendar
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+from db import db_transaction, raise_query_errors, run_query
+
+ARCHIVE_MONTHS = int(os.environ.get("HOSPITAL_ARCHIVE_MONTHS", 6))
+BATCH_SIZE = 5000
+# 批次之间让出一点时间，避免归档任务占满主库
+BATCH_PAUSE = 0.05
+HORIZON_TTL = 300
+
+VISIT_COLUMNS = ("visit_id, appt_id, patient_name, id_card, phone, gender, dept_id, doctor_id, "
+                 "room_no, status, total_fee, visit_time, finish_time, request_key")
+APPT_COLUMNS = ("appt_id, patient_name, id_card, phone, dept_id, appt_date, "
+                "expected_arrival_time, status, created_at")
+
+# 热表 -> (归档表, 计算归档水位的 SQL)
+ARCHIVES = {
+    "Visits": ("VisitsArchive", """
+        SELECT MAX(visit_time) AS h,
+               (SELECT MAX(finish_time) FROM VisitsArchive WHERE status = 'Finished') AS f
+        FROM VisitsArchive
+    """),
+    "Appointments": ("AppointmentsArchive", "SELECT MAX(appt_date) AS h FROM AppointmentsArchive"),
+}
+
+_horizons = {}
+
+
+def cutoff_date(months=ARCHIVE_MONTHS, today=None):
+    """months 个月前的同一天（月末自动取该月最后一天）"""
+    today = today or date.today()
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    month += 1
+    return date(year, month, min(today.day, calendar.monthrange(year, month)[1]))
+
+
+def _as_date(value):
+    # pd.Timestamp 也是 datetime 的子类
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def horizon(table, refresh=False):
+    """table 已归档数据中最晚的日期，没有归档数据时为 None
+
+    就诊取 visit_time 与 finish_time 的较大者，这样按任一时间过滤都不会漏掉归档行。
+    """
+    cached = _horizons.get(table)
+    if cached is not None and not refresh and time.monotonic() - cached[1] < HORIZON_TTL:
+        return cached[0]
+    df = run_query(ARCHIVES[table][1])
+    if df.empty:
+        # MAX() 总返回一行，空表说明查询失败（run_query 已提示）：不缓存，下次调用重试，有旧值时先沿用
+        return cached[0] if cached is not None else None
+    values = [v for v in df.iloc[0] if not pd.isna(v)]
+    value = max(_as_date(v) for v in values) if values else None
+    _horizons[table] = (value, time.monotonic())
+    return value
+
+
+def needs_archive(table, start_date=None, refresh=False):
+    """从 start_date（None 表示不限）开始的范围是否可能包含已归档的数据"""
+    h = horizon(table, refresh)
+    return h is not None and (start_date is None or _as_date(start_date) <= h)
+
+
+def tables_for(table, start_date=None, refresh=False):
+    """查询 [start_date, ...) 需要访问的表：热表，必要时加上归档表"""
+    return [table, ARCHIVES[table][0]] if needs_archive(table, start_date, refresh) else [table]
+
+
+def _move_batch(cursor, select_sql, params, table, archive, key, columns):
+    cursor.execute(select_sql + " FOR UPDATE", params)
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(
+        f"INSERT INTO {archive} ({columns}) SELECT {columns} FROM {table} WHERE {key} IN ({placeholders})",
+        tuple(ids),
+    )
+    cursor.execute(f"DELETE FROM {table} WHERE {key} IN ({placeholders})", tuple(ids))
+    return len(ids)
+
+
+def _drain(select_sql, params, table, key, columns, batch_size, on_batch):
+    archive = ARCHIVES[table][0]
+    total = 0
+    while True:
+        with db_transaction() as cursor:
+            # 被归档的都是已结束的历史行，不在今日队列快照里：跳过 ChangeLog 触发器
+            cursor.execute("SET @skip_changelog = 1")
+            try:
+                moved = _move_batch(cursor, select_sql, params + (batch_size,), table, archive, key, columns)
+            finally:
+                # 连接会归还连接池，会话变量不能带给下一个借用者
+                cursor.execute("SET @skip_changelog = NULL")
+        if not moved:
+            return total
+        total += moved
+        if on_batch:
+            on_batch(table, total)
+        time.sleep(BATCH_PAUSE)
+
+
+def archive_visits(cutoff, batch_size=BATCH_SIZE, on_batch=None):
+    """归档 visit_time 早于 cutoff 的已结算就诊，返回移动的行数"""
+    # 按 visit_time 顺序取批次，直接沿 idx_status_visit_time 扫描
+    return _drain(
+        "SELECT visit_id FROM Visits WHERE status = 'Finished' AND visit_time < %s ORDER BY visit_time LIMIT %s",
+        (cutoff,), "Visits", "visit_id", VISIT_COLUMNS, batch_size, on_batch,
+    )
+
+
+def archive_appointments(cutoff, batch_size=BATCH_SIZE, on_batch=None):
+    """归档 appt_date 早于 cutoff、已完成或已取消且没有在线就诊引用的预约，返回移动的行数"""
+    total = 0
+    for status in ("Completed", "Cancelled"):
+        total += _drain(
+            "SELECT a.appt_id FROM Appointments a WHERE a.status = %s AND a.appt_date < %s "
+            "AND NOT EXISTS (SELECT 1 FROM Visits v WHERE v.appt_id = a.appt_id) "
+            "ORDER BY a.appt_date LIMIT %s",
+            (status, cutoff), "Appointments", "appt_id", APPT_COLUMNS, batch_size, on_batch,
+        )
+    return total
+
+
+def run(months=ARCHIVE_MONTHS, batch_size=BATCH_SIZE, on_batch=None):
+    """执行一次归档，返回 {表名: 移动行数}"""
+    cutoff = cutoff_date(months)
+    result = {
+        "Visits": archive_visits(cutoff, batch_size, on_batch),
+        "Appointments": archive_appointments(cutoff, batch_size, on_batch),
+    }
+    for table in ARCHIVES:
+        horizon(table, refresh=True)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="就诊 / 预约历史数据归档")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run", help="把早于 N 个月的已结束记录移入归档表")
+    p_run.add_argument("--months", type=int, default=ARCHIVE_MONTHS)
+    p_run.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    sub.add_parser("status", help="显示各表的归档水位")
+    args = parser.parse_args(argv)
+
+    with raise_query_errors():
+        if args.command == "run":
+            print(f"归档 {cutoff_date(args.months)} 之前的记录 ...")
+            result = run(args.months, args.batch_size,
+                         on_batch=lambda table, n: print(f"  {table}: {n}", file=sys.stderr))
+            print(", ".join(f"{table} 移动 {n} 行" for table, n in result.items()))
+        else:
+            for table in ARCHIVES:
+                print(f"{table}: 归档至 {horizon(table) or '（无）'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""操作审计：写语句异步落库（write-behind）
+
+db_transaction() 在提交或回滚后把本事务中的写语句（SQL 模板、参数、行数、耗时）连同当前操作者
+交给 record()，record() 只把条目放进进程内有界队列就返回，不增加业务事务的耗时。
+后台线程从收到第一条起攒批，满 FLUSH_INTERVAL 秒或 FLUSH_BATCH 条后在一个独立事务里批量写入
+只追加的 AuditLog 表；写库失败时改写本地滚动文件 AUDIT_FILE（JSON 行），不丢弃条目。
+
+队列满时 record() 最多等待 PUT_TIMEOUT 秒（背压），仍放不进去就直接同步写入本地文件。
+进程退出时 atexit 钩子会停止后台线程并把队列中剩余的条目全部写出。
+审计写入直接使用原始游标，不经过 TimedCursor，因此不会被自身再次审计。
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+
+from profiling import normalize
+
+QUEUE_SIZE = int(os.environ.get("HOSPITAL_AUDIT_QUEUE", 10000))
+FLUSH_BATCH = 500
+FLUSH_INTERVAL = 1.0
+PUT_TIMEOUT = 0.05
+AUDIT_FILE = os.environ.get("HOSPITAL_AUDIT_FILE", "audit.log")
+AUDIT_FILE_BYTES = 10 * 1024 * 1024
+AUDIT_FILE_BACKUPS = 5
+# 参数序列化后的最大长度（批量 IN 列表等超长参数截断）
+PARAMS_MAX = 2000
+
+_INSERT_SQL = """
+    INSERT INTO AuditLog (logged_at, actor, session_id, kind, statement, params, row_count, elapsed_ms, outcome, error)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+_actor = threading.local()
+
+
+def set_actor(actor, session_id=None):
+    """设置当前线程（即当前页面会话）的操作者，之后的写语句都记在其名下"""
+    _actor.name = actor
+    _actor.session_id = session_id
+
+
+def current_actor():
+    return getattr(_actor, "name", "system"), getattr(_actor, "session_id", None)
+
+
+def _params_text(params):
+    if params is None:
+        return None
+    if isinstance(params, list):
+        # executemany 的逐行参数：只序列化到超出长度为止，不必整批转成 JSON
+        parts, size = [], 0
+        for row in params:
+            parts.append(json.dumps(row, ensure_ascii=False, default=str))
+            size += len(parts[-1]) + 2
+            if size > PARAMS_MAX:
+                break
+        text = "[" + ", ".join(parts) + ("]" if len(parts) == len(params) else ", …")
+    else:
+        text = json.dumps(params, ensure_ascii=False, default=str)
+    return text if len(text) <= PARAMS_MAX else text[:PARAMS_MAX] + "…"
+
+
+def _row(entry):
+    ts, actor, session_id, kind, sql, params, rows, elapsed, outcome, error = entry
+    return (datetime.fromtimestamp(ts), actor, session_id, kind, normalize(sql), params, rows,
+            round(elapsed * 1000, 2), outcome, error[:255] if error else None)
+
+
+class AuditWriter:
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._file = None
+        self._stats = {"queued": 0, "written": 0, "to_file": 0, "spilled": 0, "flush_errors": 0, "lost": 0}
+        self.last_error = None
+
+    def record(self, entries):
+        """entries: [(ts, actor, session_id, kind, sql, params, rows, elapsed, outcome, error)]"""
+        self.start()
+        for entry in entries:
+            try:
+                self._queue.put(entry, timeout=PUT_TIMEOUT)
+            except queue.Full:
+                # 后台写入跟不上：不阻塞业务，也不丢条目，直接落本地文件
+                try:
+                    self._write_file([entry])
+                except Exception as e:
+                    self.last_error = str(e)
+                    self._count("lost", 1)
+                else:
+                    self._count("spilled", 1)
+            else:
+                self._count("queued", 1)
+
+    def _count(self, name, n):
+        with self._lock:
+            self._stats[name] += n
+
+    def _drain(self, first=None, limit=FLUSH_BATCH):
+        batch = [] if first is None else [first]
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_db(self, batch):
+        from db import db_connection
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(_INSERT_SQL, [_row(e) for e in batch])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _write_file(self, batch):
+        with self._lock:
+            if self._file is None:
+                self._file = logging.getLogger("hospital.audit")
+                self._file.propagate = False
+                self._file.setLevel(logging.INFO)
+                handler = RotatingFileHandler(AUDIT_FILE, maxBytes=AUDIT_FILE_BYTES,
+                                              backupCount=AUDIT_FILE_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._file.addHandler(handler)
+        for entry in batch:
+            row = _row(entry)
+            self._file.info(json.dumps(
+                dict(zip(("logged_at", "actor", "session_id", "kind", "statement", "params", "row_count",
+                          "elapsed_ms", "outcome", "error"), row)),
+                ensure_ascii=False, default=str,
+            ))
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self._write_db(batch)
+        except Exception as e:
+            self.last_error = str(e)
+            self._count("flush_errors", 1)
+            try:
+                self._write_file(batch)
+            except Exception as e:
+                # 后台线程不能因此退出
+                self.last_error = f"{self.last_error}; {e}"
+                self._count("lost", len(batch))
+            else:
+                self._count("to_file", len(batch))
+        else:
+            self.last_error = None
+            self._count("written", len(batch))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            # 攒批：从第一条起最多等 FLUSH_INTERVAL 秒或攒够 FLUSH_BATCH 条再写，一批一个事务
+            batch, deadline = [first], time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < FLUSH_BATCH and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout=5.0):
+        """停止后台线程并写出队列中剩余的全部条目（进程退出时调用）"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._flush(batch)
+        self._stop.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        stats["last_error"] = self.last_error
+        return stats
+
+
+_writer = AuditWriter()
+atexit.register(_writer.close)
+
+
+def record(statements, outcome, error=None):
+    """记录一个事务中的写语句：statements 为 [(kind, sql, params, rows, elapsed)]
+
+    在事务提交 / 回滚之后调用，因此从不抛出异常：连本地文件也写不进去时只计入 stats()["lost"]。
+    """
+    if not statements:
+        return
+    try:
+        actor, session_id = current_actor()
+        now = time.time()
+        # 参数在这里就转成限长文本，队列里不保留整批 executemany 参数
+        _writer.record([
+            (now, actor, session_id, kind, sql, _params_text(params), rows, elapsed, outcome, error)
+            for kind, sql, params, rows, elapsed in statements
+        ])
+    except Exception as e:
+        _writer.last_error = str(e)
+        _writer._count("lost", len(statements))
+
+
+def stats():
+    return _writer.stats()
+
+
+def fetch_log(start_date, end_date, actor=None, max_rows=None):
+    """查询 [start_date, end_date] 的审计记录，按时间倒序"""
+    from db import MAX_ROWS, run_query
+
+    max_rows = max_rows or MAX_ROWS
+    where, params = ["logged_at >= %s", "logged_at < %s"], [start_date, end_date + timedelta(days=1)]
+    if actor is not None:
+        where.append("actor = %s")
+        params.append(actor)
+    # 多取一行，run_query 据此标记结果被截断
+    return run_query(f"""
+        SELECT audit_id, logged_at, actor, session_id, kind, statement, params, row_count, elapsed_ms, outcome, error
+        FROM AuditLog
+        WHERE {' AND '.join(where)}
+        ORDER BY logged_at DESC
+        LIMIT %s
+    """, tuple(params) + (max_rows + 1,), max_rows=max_rows)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""实时出诊索引：(日期, 时段, 科室) -> 可分配的 医生+诊室 组合，以及各诊室候诊人数
+
+索引由 Schedules + 在职医生（Staff.is_active）+ 可用诊室（Rooms.status）构建，覆盖今天起
+INDEX_DAYS 天，进程内共享。本应用的排班保存、员工变动会增量更新索引；其他进程 / 途径的修改
+最多延迟 INDEX_TTL 秒后通过整体重建生效。
+
+候诊人数 = 今日 status 为 Waiting / Consulting / ToPay 的就诊数，挂号时增量 +1，
+结算后标记过期，下次读取时用一条走 idx_status_visit_time 的分组查询刷新。
+索引为所有会话共享、且要和本进程的写入保持一致，因此总是从主库加载。
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from db import run_query, use_primary
+
+INDEX_DAYS = 7
+INDEX_TTL = float(os.environ.get("HOSPITAL_AVAILABILITY_TTL", 300))
+QUEUE_TTL = 30
+
+
+def _query(sql, params=None):
+    with use_primary():
+        return run_query(sql, params)
+
+
+def current_shift(now=None):
+    return "Morning" if (now or datetime.now()).hour < 12 else "Afternoon"
+
+
+class Assignment:
+    __slots__ = ("doctor_id", "doctor_name", "room_no", "dept_id", "dept_name", "queue")
+
+    def __init__(self, doctor_id, doctor_name, room_no, dept_id, dept_name, queue=0):
+        self.doctor_id = doctor_id
+        self.doctor_name = doctor_name
+        self.room_no = room_no
+        self.dept_id = dept_id
+        self.dept_name = dept_name
+        self.queue = queue
+
+    @property
+    def label(self):
+        return f"{self.dept_name} · {self.doctor_name} @ {self.room_no}（候诊 {self.queue}）"
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._slots = {}        # (date, shift, dept_id) -> {doctor_id: room_no}
+        self._slot_depts = {}   # (date, shift) -> {dept_id}
+        self._doctors = {}      # staff_id -> (name, is_active)
+        self._rooms = {}        # room_no -> (dept_id, dept_name, available)
+        self._built_for = None
+        self._built_at = 0.0
+        self._queue = {}
+        self._queue_at = 0.0
+
+    # --- 构建 ---
+
+    def _stale(self):
+        return self._built_for != date.today() or time.monotonic() - self._built_at > INDEX_TTL
+
+    def rebuild(self):
+        today = date.today()
+        doctors = _query("SELECT staff_id, name, is_active FROM Staff WHERE role = 'Doctor'")
+        rooms = _query("""
+            SELECT r.room_no, r.dept_id, d.dept_name, r.status = 'Available' AS available
+            FROM Rooms r JOIN Departments d ON r.dept_id = d.dept_id
+        """)
+        shifts = _query(
+            "SELECT doctor_id, shift_date, shift_time, room_no FROM Schedules WHERE shift_date BETWEEN %s AND %s",
+            (today, today + timedelta(days=INDEX_DAYS - 1)),
+        )
+        with self._lock:
+            self._doctors = {r.staff_id: (r.name, bool(r.is_active)) for r in doctors.itertuples(index=False)}
+            self._rooms = {r.room_no: (r.dept_id, r.dept_name, bool(r.available)) for r in rooms.itertuples(index=False)}
+            self._slots, self._slot_depts = {}, {}
+            for doctor_id, shift_date, shift_time, room_no in shifts.itertuples(index=False, name=None):
+                self._put(doctor_id, shift_date, shift_time, room_no)
+            self._built_for, self._built_at = today, time.monotonic()
+
+    def _ensure(self):
+        if self._stale():
+            self.rebuild()
+
+    def _put(self, doctor_id, shift_date, shift_time, room_no):
+        """加入一条排班，不在职医生 / 不可用诊室直接忽略"""
+        doctor, room = self._doctors.get(doctor_id), self._rooms.get(room_no)
+        if not doctor or not doctor[1] or not room or not room[2]:
+            return
+        self._remove_doctor(doctor_id, shift_date, shift_time)
+        dept_id = room[0]
+        self._slots.setdefault((shift_date, shift_time, dept_id), {})[doctor_id] = room_no
+        self._slot_depts.setdefault((shift_date, shift_time), set()).add(dept_id)
+
+    def _remove_doctor(self, doctor_id, shift_date, shift_time):
+        for dept_id in self._slot_depts.get((shift_date, shift_time), ()):
+            self._slots.get((shift_date, shift_time, dept_id), {}).pop(doctor_id, None)
+
+    # --- 增量更新 ---
+
+    def on_schedule_saved(self, rows):
+        """rows: [(doctor_id, shift_date, shift_time, room_no)]"""
+        with self._lock:
+            if self._built_for is None:
+                return
+            for doctor_id, shift_date, shift_time, room_no in rows:
+                self._put(doctor_id, shift_date, shift_time, room_no)
+
+    def on_staff_changed(self, staff_id):
+        """入职 / 离职 / 改岗后调用：离职或不再是医生时从所有时段移除"""
+        with self._lock:
+            if self._built_for is None:
+                return
+        df = _query("SELECT name, role, is_active FROM Staff WHERE staff_id = %s", (staff_id,))
+        with self._lock:
+            if df.empty or df.iloc[0]["role"] != "Doctor" or not df.iloc[0]["is_active"]:
+                self._doctors.pop(staff_id, None)
+                for slot in self._slots.values():
+                    slot.pop(staff_id, None)
+            else:
+                # 重新在职的医生需要从 Schedules 恢复时段，交给下次整体重建
+                was_active = self._doctors.get(staff_id, (None, False))[1]
+                self._doctors[staff_id] = (df.iloc[0]["name"], True)
+                if not was_active:
+                    self._built_at = 0.0
+
+    def invalidate(self):
+        """批量导入等无法逐条增量更新的修改后调用：下次读取时整体重建"""
+        with self._lock:
+            self._built_at = 0.0
+
+    # --- 候诊人数 ---
+
+    def _refresh_queue(self):
+        df = _query("""
+            SELECT room_no, COUNT(*) AS n FROM Visits
+            WHERE status IN ('Waiting', 'Consulting', 'ToPay') AND visit_time >= %s
+            GROUP BY room_no
+        """, (date.today(),))
+        with self._lock:
+            self._queue = dict(zip(df["room_no"], df["n"])) if not df.empty else {}
+            self._queue_at = time.monotonic()
+
+    def on_visit_created(self, room_no):
+        with self._lock:
+            self._queue[room_no] = self._queue.get(room_no, 0) + 1
+
+    def on_visit_settled(self):
+        with self._lock:
+            self._queue_at = 0.0
+
+    # --- 查询 ---
+
+    def options(self, shift_date=None, shift_time=None, dept_id=None):
+        """某时段可分配的 医生+诊室，按候诊人数升序；dept_id 为 None 时返回全部科室"""
+        shift_date = shift_date or date.today()
+        shift_time = shift_time or current_shift()
+        self._ensure()
+        if time.monotonic() - self._queue_at > QUEUE_TTL:
+            self._refresh_queue()
+        with self._lock:
+            depts = [dept_id] if dept_id is not None else sorted(self._slot_depts.get((shift_date, shift_time), ()))
+            result = []
+            for d in depts:
+                for doctor_id, room_no in self._slots.get((shift_date, shift_time, d), {}).items():
+                    _, dept_name, _ = self._rooms[room_no]
+                    result.append(Assignment(doctor_id, self._doctors[doctor_id][0], room_no, d, dept_name,
+                                             int(self._queue.get(room_no, 0))))
+        result.sort(key=lambda a: (a.queue, a.dept_id, a.room_no))
+        return result
+
+
+_index = AvailabilityIndex()
+
+options = _index.options
+on_schedule_saved = _index.on_schedule_saved
+on_staff_changed = _index.on_staff_changed
+on_visit_created = _index.on_visit_created
+on_visit_settled = _index.on_visit_settled
+invalidate = _index.invalidate
+rebuild = _index.rebuild
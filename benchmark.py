@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""压测与基准：合成数据生成 + 并发工作流回放 + 延迟分位数报告 / 基线对比
+
+只连接本机 MySQL 8.0+（init_db.sql 的 ngram 全文索引 MariaDB 不支持），不需要外网。先建一个独立的压测库，再生成数据并回放：
+
+    mysql -uroot -p -e "CREATE DATABASE community_hospital_bench"
+    sed 's/community_hospital_db/community_hospital_bench/' init_db.sql | mysql -uroot -p
+    export HOSPITAL_DB_NAME=community_hospital_bench
+    python benchmark.py generate --visits 2000000 --appointments 300000 --years 3
+    python benchmark.py run --duration 60 --mix patient=2,frontdesk=4,admin=1 --save-baseline bench_baseline.json
+    python benchmark.py run --duration 60 --compare bench_baseline.json
+
+回放直接调用数据访问层（refdata / slots / queues / checkin / search / reports / scheduling），
+与页面走的是同一套代码路径，而不是 MOCK_MODE 的假数据。
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import audit
+import checkin
+import db
+import payments
+import profiling
+import queues
+import refdata
+import reports
+import scheduling
+import search
+import slots
+from db import DB_CONFIG, REPLICAS, Route, bound_route, db_transaction, raise_query_errors, run_query
+
+BATCH_SIZE = 5000
+WORKFLOWS = ("patient", "frontdesk", "admin")
+
+_SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+_GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红建国文辉鑫宇浩然子涵欣怡梓轩诗雨俊杰嘉豪思远晨阳佳琪雅婷"
+_TITLES = ["主任医师", "副主任医师", "主治医师", "住院医师"]
+
+
+# --- 数据生成 ---
+
+def _name(rng):
+    return rng.choice(_SURNAMES) + "".join(rng.choice(_GIVEN) for _ in range(rng.choice((1, 2))))
+
+
+def _phone(rng):
+    return rng.choice(("13", "15", "17", "18", "19")) + "".join(rng.choice(string.digits) for _ in range(9))
+
+
+def _id_card(rng):
+    birth = date(1940, 1, 1) + timedelta(days=rng.randrange(30000))
+    tail = rng.choice(string.digits + "X")
+    return f"{rng.randrange(110000, 660000)}{birth:%Y%m%d}{rng.randrange(1000):03d}{tail}"
+
+
+def _insert_batches(sql, rows, label):
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            with db_transaction() as cursor:
+                cursor.executemany(sql, batch)
+            total += len(batch)
+            batch = []
+            print(f"\r  {label}: {total}", end="", flush=True)
+    if batch:
+        with db_transaction() as cursor:
+            cursor.executemany(sql, batch)
+        total += len(batch)
+    print(f"\r  {label}: {total}")
+    return total
+
+
+def generate(visits, appointments, years, departments, doctors_per_dept, rooms_per_dept, seed):
+    rng = random.Random(seed)
+    today = date.today()
+    first_day = today - timedelta(days=365 * years)
+    last_day = today + timedelta(days=30)
+
+    print("生成科室 / 诊室 / 医生 ...")
+    existing = run_query("SELECT dept_id FROM Departments")
+    with db_transaction() as cursor:
+        for i in range(len(existing), departments):
+            cursor.execute("INSERT INTO Departments (dept_name, location) VALUES (%s, %s)",
+                           (f"专科{i + 1}", f"综合楼{i % 9 + 1}F"))
+    dept_ids = run_query("SELECT dept_id FROM Departments ORDER BY dept_id")["dept_id"].tolist()[:departments]
+
+    _insert_batches(
+        "INSERT INTO Rooms (room_no, dept_id) VALUES (%s, %s)",
+        ((f"B{d:02d}{i:02d}", d) for d in dept_ids for i in range(rooms_per_dept)),
+        "Rooms",
+    )
+    _insert_batches(
+        "INSERT INTO Staff (name, role, dept_id, title, phone, is_active) VALUES (%s, 'Doctor', %s, %s, %s, %s)",
+        ((_name(rng), d, rng.choice(_TITLES), _phone(rng), int(rng.random() > 0.05))
+         for d in dept_ids for _ in range(doctors_per_dept)),
+        "Staff",
+    )
+    doctors = run_query("SELECT staff_id, dept_id FROM Staff WHERE role='Doctor' AND is_active=1")
+    doctors_by_dept = doctors.groupby("dept_id")["staff_id"].apply(list).to_dict()
+    rooms_by_dept = {d: [f"B{d:02d}{i:02d}" for i in range(rooms_per_dept)] for d in dept_ids}
+
+    print("生成排班 ...")
+
+    def schedule_rows():
+        for d in dept_ids:
+            docs = doctors_by_dept.get(d, [])
+            if not docs:
+                continue
+            plan = scheduling.plan_schedule(docs, rooms_by_dept[d], first_day, last_day,
+                                            weekdays=range(6), pattern="按天轮转",
+                                            occupancy=scheduling.OccupancyIndex())
+            yield from plan.rows
+
+    _insert_batches(
+        "INSERT INTO Schedules (doctor_id, shift_date, shift_time, room_no) VALUES (%s, %s, %s, %s)",
+        schedule_rows(), "Schedules",
+    )
+
+    print("生成预约 ...")
+    span = (last_day - first_day).days
+
+    def appointment_rows():
+        for _ in range(appointments):
+            d = first_day + timedelta(days=rng.randrange(span + 1))
+            if d >= today:
+                status = "Pending"
+            else:
+                status = "Completed" if rng.random() < 0.85 else "Cancelled"
+            arrival = f"{rng.choice((8, 9, 10, 11, 14, 15, 16))}:{rng.choice(('00', '15', '30', '45'))}:00"
+            yield (_name(rng), _id_card(rng), _phone(rng), rng.choice(dept_ids), d, arrival, status,
+                   datetime.combine(d - timedelta(days=rng.randrange(1, 8)), datetime.min.time()))
+
+    _insert_batches(
+        "INSERT INTO Appointments (patient_name, id_card, phone, dept_id, appt_date, expected_arrival_time, "
+        "status, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        appointment_rows(), "Appointments",
+    )
+    completed = run_query(
+        "SELECT appt_id, patient_name, id_card, phone, dept_id, appt_date FROM Appointments WHERE status='Completed'",
+        max_rows=None,
+    ).itertuples(index=False, name=None)
+
+    print("生成就诊 ...")
+    past_span = (today - first_day).days
+
+    def visit_rows():
+        linked = iter(completed)
+        for i in range(visits):
+            appt = next(linked, None) if rng.random() < 0.4 else None
+            if appt:
+                appt_id, name, id_card, phone, dept_id, day = appt
+            else:
+                appt_id, name, id_card, phone = None, _name(rng), _id_card(rng), _phone(rng)
+                dept_id = rng.choice(dept_ids)
+                day = first_day + timedelta(days=rng.randrange(past_span + 1))
+            docs = doctors_by_dept.get(dept_id) or doctors["staff_id"].tolist()
+            visit_time = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randrange(480, 1020))
+            if day == today:
+                status = rng.choice(("Waiting", "Consulting", "ToPay", "Finished"))
+            else:
+                status = "Finished"
+            finished = status == "Finished"
+            yield (appt_id, name, id_card, phone, rng.choice("MF"), dept_id, rng.choice(docs),
+                   rng.choice(rooms_by_dept[dept_id]), status,
+                   round(rng.uniform(20, 800), 2) if finished else 0,
+                   visit_time, visit_time + timedelta(minutes=rng.randrange(20, 180)) if finished else None)
+
+    _insert_batches(
+        "INSERT INTO Visits (appt_id, patient_name, id_card, phone, gender, dept_id, doctor_id, room_no, "
+        "status, total_fee, visit_time, finish_time) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        visit_rows(), "Visits",
+    )
+
+    print("重算收入日汇总 ...")
+    reports.rebuild_rollup()
+    print("重算预约号源 ...")
+    slots.rebuild(today, last_day)
+    print("完成")
+
+
+# --- 工作流回放 ---
+
+class Sampler:
+    """线程安全地收集每个工作流的单次耗时（秒）与错误数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {w: [] for w in WORKFLOWS}
+        self.errors = {w: 0 for w in WORKFLOWS}
+
+    def add(self, workflow, elapsed, ok):
+        with self._lock:
+            self.latencies[workflow].append(elapsed)
+            if not ok:
+                self.errors[workflow] += 1
+
+
+def _patient(rng, ctx):
+    depts = refdata.get_departments()
+    dept_id = int(rng.choice(depts["dept_id"].tolist()))
+    free = slots.available_slots(dept_id)
+    if free.empty:
+        return
+    slot = free.iloc[rng.randrange(len(free))]
+    begin, _ = slots.SHIFT_HOURS[slot["shift_time"]]
+    arrival = (datetime.combine(date.today(), begin) + timedelta(minutes=15 * rng.randrange(16))).time()
+    slots.book(_name(rng), _phone(rng), _id_card(rng), dept_id, slot["slot_date"], arrival)
+
+
+def _frontdesk(rng, ctx):
+    today = date.today()
+    ref = {
+        "doctors": db.submit(refdata.get_doctors),
+        "rooms": db.submit(refdata.get_available_rooms),
+        "depts": db.submit(refdata.get_departments),
+    }
+    doctors = ref["doctors"].result()
+    doctors, rooms = doctors.loc[doctors["is_active"] == 1, "staff_id"].tolist(), ref["rooms"].result()["room_no"].tolist()
+    ref["depts"].result()
+    pages = [db.submit(queues.fetch_pending_appointments, today), db.submit(queues.fetch_topay_visits)]
+    (df_appt, _), (df_pay, _) = (f.result() for f in pages)
+
+    if not df_appt.empty and doctors and rooms:
+        appt_id = int(rng.choice(df_appt["appt_id"].tolist()))
+        checkin.check_in(appt_id, _id_card(rng), rng.choice("MF"), int(rng.choice(doctors)), rng.choice(rooms))
+    if not df_pay.empty:
+        visit_ids = rng.sample(df_pay["visit_id"].tolist(), min(len(df_pay), rng.randint(1, 5)))
+        payments.settle([payments.Bill(v, [("挂号费", 10), ("诊疗费", round(rng.uniform(20, 300), 2))],
+                                       rng.choice(payments.METHODS)) for v in visit_ids])
+
+
+def _admin(rng, ctx):
+    today = date.today()
+    start = today - timedelta(days=rng.choice((7, 30, 90, 365)))
+    reports.revenue_report(rng.choice(reports.REPORT_DIMENSIONS), start, today)
+    term = rng.choice((_name(rng), _phone(rng)[:7], rng.choice(ctx["id_cards"]) if ctx["id_cards"] else _id_card(rng)))
+    search.search_visits(term)
+    refdata.get_staff_roster()
+    scheduling.OccupancyIndex.load(today, today + timedelta(days=30))
+
+
+_STEPS = {"patient": _patient, "frontdesk": _frontdesk, "admin": _admin}
+
+
+def _worker(workflow, sampler, stop_at, seed, ctx, no_cache):
+    rng = random.Random(seed)
+    audit.set_actor(f"benchmark:{workflow}")
+    # 每个压测线程相当于一个会话：配置了副本时只读查询按会话路由分流
+    with raise_query_errors(), bound_route(Route()):
+        while time.monotonic() < stop_at:
+            if no_cache:
+                refdata.clear()
+            start = time.perf_counter()
+            ok = True
+            try:
+                _STEPS[workflow](rng, ctx)
+            except Exception as e:
+                ok = False
+                if sampler.errors[workflow] < 5:
+                    print(f"[{workflow}] {type(e).__name__}: {e}", file=sys.stderr)
+            sampler.add(workflow, time.perf_counter() - start, ok)
+
+
+def _percentile(values, q):
+    return float(pd.Series(values).quantile(q)) * 1000 if values else 0.0
+
+
+def run(mix, duration, seed, no_cache):
+    ctx = {"id_cards": run_query("SELECT id_card FROM Visits ORDER BY visit_id DESC LIMIT 200")["id_card"].tolist()}
+    sampler = Sampler()
+    stop_at = time.monotonic() + duration
+    threads = []
+    for workflow, count in mix.items():
+        for i in range(count):
+            t = threading.Thread(target=_worker, name=f"bench-{workflow}-{i}",
+                                 args=(workflow, sampler, stop_at, seed + len(threads), ctx, no_cache))
+            threads.append(t)
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    report = {}
+    for workflow in mix:
+        lat = sampler.latencies[workflow]
+        report[workflow] = {
+            "ops": len(lat),
+            "errors": sampler.errors[workflow],
+            "throughput": round(len(lat) / elapsed, 2),
+            "p50_ms": round(_percentile(lat, 0.50), 2),
+            "p95_ms": round(_percentile(lat, 0.95), 2),
+            "p99_ms": round(_percentile(lat, 0.99), 2),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """返回回归项列表：p95 变慢或吞吐下降超过 tolerance 比例"""
+    regressions = []
+    for workflow, cur in report.items():
+        base = baseline.get("workflows", {}).get(workflow)
+        if not base:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{workflow}: p95 {base['p95_ms']} -> {cur['p95_ms']} ms")
+        if base["throughput"] and cur["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{workflow}: 吞吐 {base['throughput']} -> {cur['throughput']} ops/s")
+    return regressions
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, count = part.partition("=")
+        if name not in WORKFLOWS:
+            raise argparse.ArgumentTypeError(f"未知工作流 {name}，可选 {', '.join(WORKFLOWS)}")
+        mix[name] = int(count or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="社区医院系统压测工具（仅连接本机数据库）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_gen = sub.add_parser("generate", help="向压测库写入合成数据")
+    p_gen.add_argument("--visits", type=int, default=2_000_000)
+    p_gen.add_argument("--appointments", type=int, default=300_000)
+    p_gen.add_argument("--years", type=int, default=3)
+    p_gen.add_argument("--departments", type=int, default=12)
+    p_gen.add_argument("--doctors-per-dept", type=int, default=10)
+    p_gen.add_argument("--rooms-per-dept", type=int, default=4)
+    p_gen.add_argument("--seed", type=int, default=42)
+    p_gen.add_argument("--force", action="store_true", help="允许写入默认业务库 community_hospital_db")
+
+    p_run = sub.add_parser("run", help="并发回放工作流并报告延迟分位数")
+    p_run.add_argument("--mix", type=_parse_mix, default=_parse_mix("patient=2,frontdesk=4,admin=1"),
+                       help="各工作流并发线程数，如 patient=2,frontdesk=4,admin=1")
+    p_run.add_argument("--duration", type=float, default=30, help="持续秒数")
+    p_run.add_argument("--seed", type=int, default=7)
+    p_run.add_argument("--no-cache", action="store_true", help="每次操作前清空参考数据缓存")
+    p_run.add_argument("--save-baseline", metavar="PATH")
+    p_run.add_argument("--compare", metavar="PATH", help="与基线对比，出现回归时退出码为 1")
+    p_run.add_argument("--tolerance", type=float, default=0.2, help="允许的回归比例，默认 0.2")
+    args = parser.parse_args(argv)
+
+    for host in [DB_CONFIG["host"]] + [r["host"] for r in REPLICAS]:
+        if host not in ("localhost", "127.0.0.1", "::1"):
+            parser.error(f"压测只允许连接本机数据库，当前配置了 {host}")
+
+    if args.command == "generate":
+        if DB_CONFIG["database"] == "community_hospital_db" and not args.force:
+            parser.error("请通过 HOSPITAL_DB_NAME 指定独立的压测库，或加 --force")
+        with raise_query_errors():
+            generate(args.visits, args.appointments, args.years, args.departments,
+                     args.doctors_per_dept, args.rooms_per_dept, args.seed)
+        return 0
+
+    report = run(args.mix, args.duration, args.seed, args.no_cache)
+    print(pd.DataFrame(report).T.to_string())
+    print("\n连接池:", db.pool_stats())
+    print("参考数据缓存:", refdata.cache_stats())
+    top = profiling.summary(top=5)
+    if not top.empty:
+        print("\n最慢语句 (p95):")
+        print(top[["调用位置", "次数", "p50_ms", "p95_ms", "p99_ms"]].to_string(index=False))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created": datetime.now().isoformat(timespec="seconds"),
+                       "mix": args.mix, "duration": args.duration, "workflows": report},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\n性能回归:")
+            for r in regressions:
+                print("  " + r)
+            return 1
+        print("\n与基线相比无回归")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""批量导入 / 导出：预约、就诊、员工
+
+导入：流式读取 CSV / Parquet，逐行校验，按批 executemany 写入，每批一个事务，
+      某批失败只回滚该批并记录，继续处理后续批次。导入完成后按导入的日期范围
+      重算受影响的收入日汇总（就诊）与号源已约人数（预约 / 员工）。
+导出：服务端游标（非缓冲）分块 fetchmany，边读边写 CSV / Parquet，内存占用与总行数无关。
+
+    python bulk.py import visits his_visits.csv --batch-size 2000
+    python bulk.py export visits visits_2025.parquet --start 2025-01-01 --end 2025-12-31
+"""
+import argparse
+import csv
+import io
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import archive
+import availability
+import refdata
+import reports
+import slots
+from db import TimedCursor, db_connection, db_transaction, raise_query_errors
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 5000
+# 导入结果中最多保留的错误明细条数
+MAX_ERRORS = 200
+
+
+# --- 字段解析器：输入为去掉首尾空白的非空字符串，非法时抛 ValueError ---
+
+def _str(max_len):
+    def parse(v):
+        if len(v) > max_len:
+            raise ValueError(f"长度超过 {max_len}")
+        return v
+    return parse
+
+
+def _int(v):
+    return int(v)
+
+
+def _bool(v):
+    if v.lower() in ("1", "true", "yes", "在职"):
+        return 1
+    if v.lower() in ("0", "false", "no", "离职", "已离职"):
+        return 0
+    raise ValueError(f"无法识别的布尔值 {v!r}")
+
+
+def _enum(*values):
+    def parse(v):
+        if v not in values:
+            raise ValueError(f"取值须为 {'/'.join(values)}")
+        return v
+    return parse
+
+
+def _decimal(v):
+    try:
+        return Decimal(v).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"无法识别的金额 {v!r}")
+
+
+def _date(v):
+    return date.fromisoformat(v[:10])
+
+
+def _datetime(v):
+    return datetime.fromisoformat(v)
+
+
+def _time(v):
+    return time.fromisoformat(v)
+
+
+class Column:
+    def __init__(self, name, parse, required=False, default=None, arrow_type=pa.string(), export_expr=None):
+        self.name = name
+        self.parse = parse
+        self.required = required
+        # 单元格为空时使用的值，可为可调用对象
+        self.default = default
+        self.arrow_type = arrow_type
+        self.export_expr = export_expr or name
+
+
+_TIMESTAMP = pa.timestamp("s")
+_MONEY = pa.decimal128(10, 2)
+
+SPECS = {
+    "appointments": {
+        "table": "Appointments",
+        "date_column": "appt_date",
+        "columns": [
+            Column("appt_id", _int, arrow_type=pa.int64()),
+            Column("patient_name", _str(50), required=True),
+            Column("id_card", _str(18), required=True),
+            Column("phone", _str(20), required=True),
+            Column("dept_id", _int, required=True, arrow_type=pa.int64()),
+            Column("appt_date", _date, required=True, arrow_type=pa.date32()),
+            Column("expected_arrival_time", _time,
+                   export_expr="CAST(expected_arrival_time AS CHAR) AS expected_arrival_time"),
+            Column("status", _enum("Pending", "Completed", "Cancelled"), default="Pending"),
+            Column("created_at", _datetime, default=datetime.now, arrow_type=_TIMESTAMP),
+        ],
+    },
+    "visits": {
+        "table": "Visits",
+        "date_column": "visit_time",
+        "columns": [
+            Column("visit_id", _int, arrow_type=pa.int64()),
+            Column("appt_id", _int, arrow_type=pa.int64()),
+            Column("patient_name", _str(50), required=True),
+            Column("id_card", _str(18), required=True),
+            Column("phone", _str(20)),
+            Column("gender", _enum("M", "F"), required=True),
+            Column("dept_id", _int, required=True, arrow_type=pa.int64()),
+            Column("doctor_id", _int, required=True, arrow_type=pa.int64()),
+            Column("room_no", _str(20), required=True),
+            Column("status", _enum("Waiting", "Consulting", "ToPay", "Finished"), default="Waiting"),
+            Column("total_fee", _decimal, default=Decimal("0.00"), arrow_type=_MONEY),
+            Column("visit_time", _datetime, default=datetime.now, arrow_type=_TIMESTAMP),
+            Column("finish_time", _datetime, arrow_type=_TIMESTAMP),
+        ],
+    },
+    "staff": {
+        "table": "Staff",
+        "date_column": None,
+        "columns": [
+            Column("staff_id", _int, arrow_type=pa.int64()),
+            Column("name", _str(50), required=True),
+            Column("role", _enum("Doctor", "Nurse", "Admin", "Cashier"), required=True),
+            Column("dept_id", _int, arrow_type=pa.int64()),
+            Column("title", _str(50)),
+            Column("phone", _str(20)),
+            Column("is_active", _bool, default=1, arrow_type=pa.int8()),
+        ],
+    },
+}
+
+
+class ImportResult:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.errors = []
+        # 导入的已结算就诊的结算日期范围，用于重算收入汇总
+        self.finish_range = None
+        # 导入的预约日期范围，用于重算号源已约人数
+        self.appt_range = None
+        # 导入后未能完成的重算：[(需手动执行的命令, 错误)]，已写入的批次不受影响
+        self.pending_rebuilds = []
+
+    def add_error(self, line, message, count=1):
+        self.rejected += count
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self):
+        return (f"读取 {self.read} 行，写入 {self.inserted} 行，"
+                f"未写入 {self.rejected} 行，失败批次 {self.failed_batches}")
+
+
+def _iter_csv(stream):
+    reader = csv.DictReader(stream)
+    yield reader.fieldnames or []
+    for row in reader:
+        yield row
+
+
+def _iter_parquet(source, batch_size):
+    pf = pq.ParquetFile(source)
+    yield pf.schema_arrow.names
+    for batch in pf.iter_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            yield {k: ("" if v is None else str(v)) for k, v in row.items()}
+
+
+def _parse_row(columns, raw):
+    values = []
+    for col in columns:
+        cell = (raw.get(col.name) or "").strip()
+        if not cell:
+            if col.required:
+                raise ValueError(f"{col.name} 不能为空")
+            values.append(col.default() if callable(col.default) else col.default)
+            continue
+        try:
+            values.append(col.parse(cell))
+        except ValueError as e:
+            raise ValueError(f"{col.name}: {e}")
+    return values
+
+
+def import_rows(kind, rows, batch_size=BATCH_SIZE):
+    """rows 为可迭代对象：第一个元素是表头字段列表，其后每个元素是 {字段: 字符串} 的一行"""
+    spec = SPECS[kind]
+    rows = iter(rows)
+    header = next(rows, [])
+    missing = [c.name for c in spec["columns"] if c.required and c.name not in header]
+    if missing:
+        raise ValueError(f"缺少必填列: {', '.join(missing)}")
+
+    # 只写入文件中出现的列，其余列交给表默认值
+    columns = [c for c in spec["columns"] if c.name in header or c.default is not None]
+    sql = (f"INSERT INTO {spec['table']} ({', '.join(c.name for c in columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))})")
+    names = [c.name for c in columns]
+
+    result = ImportResult()
+    batch, first_line = [], 2
+
+    def flush(last_line):
+        nonlocal batch, first_line
+        if not batch:
+            return
+        try:
+            with db_transaction() as cursor:
+                cursor.executemany(sql, batch)
+        except Exception as e:
+            result.failed_batches += 1
+            result.add_error(first_line, f"第 {first_line}-{last_line} 行所在批次写入失败: {e}", count=len(batch))
+        else:
+            result.inserted += len(batch)
+            if kind == "visits":
+                _track_finish_range(result, names, batch)
+            elif kind == "appointments":
+                _track_appt_range(result, names, batch)
+        batch, first_line = [], last_line + 1
+
+    line = 1
+    for line, raw in enumerate(rows, start=2):
+        result.read += 1
+        try:
+            batch.append(_parse_row(columns, raw))
+        except ValueError as e:
+            result.add_error(line, str(e))
+        if len(batch) >= batch_size:
+            flush(line)
+    flush(line)
+
+    if result.inserted:
+        _refresh_derived(kind, result)
+    return result
+
+
+def _rebuild_step(result, command, fn, *args):
+    try:
+        fn(*args)
+    except Exception as e:
+        result.pending_rebuilds.append((command, str(e)))
+
+
+def _refresh_derived(kind, result):
+    """导入后重算派生数据；某一步失败时记入 result.pending_rebuilds，继续其余步骤"""
+    if kind == "staff":
+        refdata.invalidate("Staff")
+        # 新导入的医生不在出诊索引里，下次读取时整体重建
+        availability.invalidate()
+        # 在职医生数变化会改变号源容量
+        _rebuild_step(result, "python slots.py rebuild", slots.rebuild)
+    if result.finish_range:
+        lo, hi = result.finish_range
+        _rebuild_step(result, f"python reports.py rebuild --start {lo} --end {hi}", reports.rebuild_rollup, lo, hi)
+    if result.appt_range:
+        lo, hi = result.appt_range
+        _rebuild_step(result, f"python slots.py rebuild --start {lo} --days {(hi - lo).days + 1}",
+                      slots.rebuild, lo, hi)
+
+def _track_finish_range(result, names, batch):
+    if "finish_time" not in names:
+        return
+    i_status, i_finish = names.index("status"), names.index("finish_time")
+    days = [r[i_finish].date() for r in batch if r[i_status] == "Finished" and r[i_finish]]
+    if not days:
+        return
+    lo, hi = min(days), max(days)
+    if result.finish_range:
+        lo, hi = min(lo, result.finish_range[0]), max(hi, result.finish_range[1])
+    result.finish_range = (lo, hi)
+
+
+def _track_appt_range(result, names, batch):
+    # 今天之前的号源已不可预约，只需重算今天及以后的日期
+    i_date = names.index("appt_date")
+    days = [r[i_date] for r in batch if r[i_date] >= date.today()]
+    if not days:
+        return
+    lo, hi = min(days), max(days)
+    if result.appt_range:
+        lo, hi = min(lo, result.appt_range[0]), max(hi, result.appt_range[1])
+    result.appt_range = (lo, hi)
+
+
+def import_file(kind, source, fmt=None, batch_size=BATCH_SIZE):
+    """source 为文件路径或二进制文件对象，fmt 为 'csv' / 'parquet'，默认按扩展名判断"""
+    fmt = fmt or _guess_format(source)
+    if fmt == "parquet":
+        return import_rows(kind, _iter_parquet(source, batch_size), batch_size)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            return import_rows(kind, _iter_csv(f), batch_size)
+    stream = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        return import_rows(kind, _iter_csv(stream), batch_size)
+    finally:
+        stream.detach()
+
+
+def _guess_format(target):
+    name = target if isinstance(target, (str, os.PathLike)) else getattr(target, "name", "")
+    return "parquet" if str(name).lower().endswith(".parquet") else "csv"
+
+
+def _fetch_chunks(cursor, sqls, params, chunk_size):
+    for sql in sqls:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield rows
+
+
+def export_table(kind, target, fmt=None, start_date=None, end_date=None, chunk_size=CHUNK_SIZE):
+    """流式导出到 target（路径或二进制文件对象），返回导出行数
+
+    日期范围早于归档水位时先导出归档表，再导出热表。
+    """
+    spec = SPECS[kind]
+    fmt = fmt or _guess_format(target)
+    columns = spec["columns"]
+    where, params = [], []
+    if spec["date_column"] and start_date is not None:
+        where.append(f"{spec['date_column']} >= %s")
+        params.append(start_date)
+    if spec["date_column"] and end_date is not None:
+        where.append(f"{spec['date_column']} < %s")
+        params.append(end_date + timedelta(days=1))
+    tables = [spec["table"]]
+    if spec["table"] in archive.ARCHIVES:
+        with raise_query_errors():
+            tables = archive.tables_for(spec["table"], start_date, refresh=True)[::-1]
+    sqls = [
+        f"SELECT {', '.join(c.export_expr for c in columns)} FROM {table}"
+        + (f" WHERE {' AND '.join(where)}" if where else "")
+        + f" ORDER BY {columns[0].name}"
+        for table in tables
+    ]
+
+    total = 0
+    with db_connection() as conn:
+        cursor = TimedCursor(conn.cursor(buffered=False))
+        try:
+            chunks = _fetch_chunks(cursor, sqls, tuple(params), chunk_size)
+            if fmt == "parquet":
+                schema = pa.schema([(c.name, c.arrow_type) for c in columns])
+                with pq.ParquetWriter(target, schema) as writer:
+                    for rows in chunks:
+                        arrays = list(zip(*rows))
+                        writer.write_table(pa.Table.from_arrays(
+                            [pa.array(arrays[i], type=c.arrow_type) for i, c in enumerate(columns)],
+                            schema=schema,
+                        ))
+                        total += len(rows)
+            else:
+                owns_file = isinstance(target, (str, os.PathLike))
+                text = (open(target, "w", newline="", encoding="utf-8-sig") if owns_file
+                        else io.TextIOWrapper(target, encoding="utf-8-sig", newline=""))
+                try:
+                    writer = csv.writer(text)
+                    writer.writerow([c.name for c in columns])
+                    for rows in chunks:
+                        writer.writerows(rows)
+                        total += len(rows)
+                finally:
+                    if owns_file:
+                        text.close()
+                    else:
+                        text.flush()
+                        text.detach()
+        finally:
+            cursor.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预约 / 就诊 / 员工数据批量导入导出")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_imp = sub.add_parser("import", help="从 CSV / Parquet 导入")
+    p_imp.add_argument("kind", choices=list(SPECS))
+    p_imp.add_argument("path")
+    p_imp.add_argument("--format", choices=["csv", "parquet"])
+    p_imp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    p_exp = sub.add_parser("export", help="导出为 CSV / Parquet")
+    p_exp.add_argument("kind", choices=list(SPECS))
+    p_exp.add_argument("path")
+    p_exp.add_argument("--format", choices=["csv", "parquet"])
+    p_exp.add_argument("--start", type=date.fromisoformat, help="起始日期 YYYY-MM-DD")
+    p_exp.add_argument("--end", type=date.fromisoformat, help="结束日期 YYYY-MM-DD（含）")
+    p_exp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        result = import_file(args.kind, args.path, args.format, args.batch_size)
+        print(result.summary())
+        for line, message in result.errors:
+            print(f"  第 {line} 行: {message}")
+        for command, error in result.pending_rebuilds:
+            print(f"  重算失败（{error}），请手动执行: {command}")
+        return 1 if result.rejected or result.pending_rebuilds else 0
+
+    rows = export_table(args.kind, args.path, args.format, args.start, args.end, args.chunk_size)
+    print(f"导出完成，共 {rows} 行 -> {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
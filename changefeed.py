@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""变更订阅：ChangeLog 增量拉取 + 进程内队列快照
+
+Visits / Appointments 上的触发器把每次增删改写入 ChangeLog（见 init_db.sql）。
+每个进程只有一个后台线程按高水位 change_id 增量拉取 ChangeLog，只重新读取变动的那几行，
+更新内存中的「今日在院就诊」与「今日待核验预约」快照。前台页面和候诊大屏用
+st.fragment(run_every=...) 定时读取快照，不再各自轮询整张表。
+
+AUTO_INCREMENT 的分配顺序与事务提交顺序不一定一致，较小的 change_id 可能晚于较大的提交，
+因此每次都回看高水位之前 LOOKBACK 条，并用最近处理过的 ID 集合去重。
+
+批量导入等操作会一次写入大量变更：积压超过 RESYNC_BACKLOG 条时不再逐条追赶，
+直接重新加载快照并把高水位跳到最新。归档任务在会话变量 @skip_changelog 下执行，
+触发器不为被移走的历史行写 ChangeLog（它们本来就不在今日快照里）。
+"""
+import threading
+import time
+from collections import deque
+from datetime import date
+
+from db import db_transaction, raise_query_errors, run_query
+
+POLL_INTERVAL = 2.0
+LOOKBACK = 200
+# 每次从 ChangeLog 读取的条数；积压超过 RESYNC_BACKLOG 条时改为重新加载快照
+POLL_BATCH = 1000
+RESYNC_BACKLOG = 5000
+# 保留最近的增量，供各会话计算「自上次刷新以来的变动」
+DELTA_HISTORY = 1000
+# ChangeLog 只是传输通道，超过一天的记录定期分批清理，直到清完
+PURGE_INTERVAL = 3600
+PURGE_BATCH = 10000
+
+_ACTIVE_VISITS_SQL = """
+    SELECT v.visit_id, v.patient_name, v.room_no, v.status, d.dept_name, s.name AS doctor, v.visit_time
+    FROM Visits v
+    JOIN Departments d ON v.dept_id = d.dept_id
+    JOIN Staff s ON v.doctor_id = s.staff_id
+    WHERE v.status IN ('Waiting', 'Consulting', 'ToPay') AND v.visit_time >= %s
+"""
+
+_PENDING_APPTS_SQL = """
+    SELECT a.appt_id, a.patient_name, d.dept_name, a.appt_date, a.expected_arrival_time
+    FROM Appointments a
+    JOIN Departments d ON a.dept_id = d.dept_id
+    WHERE a.status = 'Pending' AND a.appt_date = %s
+"""
+
+
+def _in_clause(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._visits = {}
+        self._appts = {}
+        self._high_water = 0
+        self._seen = deque(maxlen=LOOKBACK * 5)
+        self._seen_set = set()
+        self._deltas = deque(maxlen=DELTA_HISTORY)
+        self.version = 0
+        self._day = None
+        self._thread = None
+        self._last_purge = time.monotonic()
+        self.last_error = None
+
+    # --- 快照 ---
+
+    def _load_snapshot(self):
+        today = date.today()
+        hw = int(run_query("SELECT COALESCE(MAX(change_id), 0) AS hw FROM ChangeLog").iloc[0]["hw"])
+        # 回看窗口内已可见的变更都已体现在随后读取的快照里，不必再作为增量处理
+        recent = run_query("SELECT change_id FROM ChangeLog WHERE change_id > %s", (max(0, hw - LOOKBACK),))
+        visits = run_query(_ACTIVE_VISITS_SQL, (today,))
+        appts = run_query(_PENDING_APPTS_SQL, (today,))
+        with self._lock:
+            self._seen.clear()
+            self._seen_set.clear()
+            for change_id in recent["change_id"] if not recent.empty else ():
+                self._mark_seen(int(change_id))
+            self._high_water = hw
+            self._visits = {int(r["visit_id"]): r for r in visits.to_dict("records")}
+            self._appts = {int(r["appt_id"]): r for r in appts.to_dict("records")}
+            self._day = today
+            self.version += 1
+
+    def _refetch(self, table, ids):
+        today = date.today()
+        if table == "Visits":
+            df = run_query(_ACTIVE_VISITS_SQL + f" AND v.visit_id IN ({_in_clause(ids)})", (today, *ids))
+            key, store = "visit_id", self._visits
+        else:
+            df = run_query(_PENDING_APPTS_SQL + f" AND a.appt_id IN ({_in_clause(ids)})", (today, *ids))
+            key, store = "appt_id", self._appts
+        rows = {int(r[key]): r for r in df.to_dict("records")}
+        with self._lock:
+            for row_id in ids:
+                if row_id in rows:
+                    store[row_id] = rows[row_id]
+                else:
+                    store.pop(row_id, None)
+
+    def _mark_seen(self, change_id):
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(change_id)
+        self._seen_set.add(change_id)
+
+    def _backlog(self):
+        df = run_query("SELECT COALESCE(MAX(change_id), 0) AS hw FROM ChangeLog")
+        return int(df.iloc[0]["hw"]) - self._high_water
+
+    def poll_once(self):
+        """拉取增量直到追平，返回本次处理的变更条数；积压过多时重新加载快照并返回 0"""
+        if self._day != date.today():
+            self._load_snapshot()
+            return 0
+        total = 0
+        while True:
+            df = run_query(
+                "SELECT change_id, table_name, row_id, op FROM ChangeLog WHERE change_id > %s "
+                "ORDER BY change_id LIMIT %s",
+                (max(0, self._high_water - LOOKBACK), POLL_BATCH),
+            )
+            if len(df) >= POLL_BATCH and self._backlog() > RESYNC_BACKLOG:
+                self._load_snapshot()
+                return 0
+            fresh = [r for r in df.itertuples(index=False) if int(r.change_id) not in self._seen_set]
+            if fresh:
+                self._apply(fresh)
+                total += len(fresh)
+            if len(df) < POLL_BATCH or not fresh:
+                return total
+
+    def _apply(self, fresh):
+        for table in ("Visits", "Appointments"):
+            ids = sorted({int(r.row_id) for r in fresh if r.table_name == table})
+            if ids:
+                self._refetch(table, ids)
+        with self._lock:
+            for r in fresh:
+                self._mark_seen(int(r.change_id))
+                self._high_water = max(self._high_water, int(r.change_id))
+                self.version += 1
+                self._deltas.append((self.version, r.table_name, int(r.row_id), r.op))
+
+    def _purge(self):
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        # 分批删除，每批一个短事务，直到没有可删的记录
+        while True:
+            with db_transaction() as cursor:
+                cursor.execute(
+                    "DELETE FROM ChangeLog WHERE changed_at < NOW() - INTERVAL 1 DAY LIMIT %s", (PURGE_BATCH,)
+                )
+                deleted = cursor.rowcount
+            if deleted < PURGE_BATCH:
+                return
+
+    def _run(self):
+        with raise_query_errors():
+            while True:
+                try:
+                    if self._day is None:
+                        self._load_snapshot()
+                    self.poll_once()
+                    self._purge()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                time.sleep(POLL_INTERVAL)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="changefeed", daemon=True)
+                self._thread.start()
+
+    # --- 读取 ---
+
+    def active_visits(self, status=None):
+        with self._lock:
+            rows = list(self._visits.values())
+        if status:
+            rows = [r for r in rows if r["status"] == status]
+        return sorted(rows, key=lambda r: r["visit_id"])
+
+    def pending_appointments(self):
+        with self._lock:
+            return sorted(self._appts.values(), key=lambda r: r["appt_id"])
+
+    def deltas_since(self, version):
+        """返回 (当前版本, [(版本, 表名, 行ID, 操作)])，version 过旧时只返回仍保留的部分"""
+        with self._lock:
+            return self.version, [d for d in self._deltas if d[0] > version]
+
+
+_feed = ChangeFeed()
+
+
+def get_feed():
+    """进程内共享的变更订阅，首次调用时启动后台拉取线程"""
+    _feed.start()
+    return _feed
+
+
+def mask_name(name):
+    """大屏脱敏：张三 -> 张*，张三丰 -> 张*丰"""
+    if not name:
+        return ""
+    return name[0] + "*" + (name[2:] if len(name) > 2 else "")
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""到院核验（预约转就诊）与现场挂号
+
+核验在单个事务内完成：先 SELECT ... FOR UPDATE 锁住预约行，只处理仍为 Pending 的预约，
+插入 Visits 后把预约置为 Completed。加锁之后对 Visits 的查询都是加锁读（FOR SHARE），
+并发的重复提交等到锁时能读到前一个事务已提交的就诊，而不是被事务快照挡住。
+Visits.appt_id 唯一，保证一条预约最多生成一条就诊；
+request_key（幂等键，同样唯一）用于识别同一次提交的重复请求，重复请求直接返回已有结果。
+批量核验按 appt_id 升序加锁，避免多个前台同时批量操作时死锁。
+"""
+from mysql.connector import errors as mysql_errors
+
+from db import db_transaction
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+
+class CheckInResult:
+    def __init__(self, appt_id, status, message, visit_id=None, patient_name=None):
+        self.appt_id = appt_id
+        self.status = status
+        self.message = message
+        self.visit_id = visit_id
+        self.patient_name = patient_name
+
+    @property
+    def ok(self):
+        return self.status != REJECTED
+
+    def as_row(self):
+        return {"预约ID": self.appt_id, "就诊号": self.visit_id, "患者": self.patient_name, "结果": self.message}
+
+
+def _item_key(request_key, appt_id, batch):
+    if not request_key:
+        return None
+    return f"{request_key}:{appt_id}" if batch else request_key
+
+
+def _check_in(cursor, items, request_key, batch):
+    """items: [(appt_id, id_card, gender, doctor_id, room_no)]，返回按 items 顺序的结果列表"""
+    results = {}
+    appt_ids = sorted({item[0] for item in items})
+    placeholders = ", ".join(["%s"] * len(appt_ids))
+
+    # 先锁预约行：并发的重复提交在这里排队，拿到锁时前一个事务已提交
+    cursor.execute(
+        f"SELECT appt_id, patient_name, phone, dept_id, status FROM Appointments "
+        f"WHERE appt_id IN ({placeholders}) ORDER BY appt_id FOR UPDATE",
+        tuple(appt_ids),
+    )
+    appts = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    # 之后对 Visits 的查询用加锁读（FOR SHARE），读到最新提交的版本而不是事务快照
+    if request_key:
+        keys = [_item_key(request_key, a, batch) for a in appt_ids]
+        cursor.execute(
+            f"SELECT appt_id, visit_id, patient_name FROM Visits "
+            f"WHERE request_key IN ({', '.join(['%s'] * len(keys))}) FOR SHARE",
+            tuple(keys),
+        )
+        for appt_id, visit_id, name in cursor.fetchall():
+            # 单条核验时幂等键只对应本次提交的这一条预约
+            appt_id = appt_id if batch else items[0][0]
+            results[appt_id] = CheckInResult(appt_id, DUPLICATE, "重复提交，已返回先前结果", visit_id, name)
+
+    completed = [a for a, row in appts.items() if row[3] == "Completed" and a not in results]
+    if completed:
+        cursor.execute(
+            f"SELECT appt_id, visit_id, patient_name FROM Visits "
+            f"WHERE appt_id IN ({', '.join(['%s'] * len(completed))}) FOR SHARE",
+            tuple(completed),
+        )
+        for appt_id, visit_id, name in cursor.fetchall():
+            results[appt_id] = CheckInResult(appt_id, DUPLICATE, "该预约已核验", visit_id, name)
+
+    to_insert = []
+    for appt_id, id_card, gender, doctor_id, room_no in items:
+        if appt_id in results:
+            continue
+        row = appts.get(appt_id)
+        if row is None:
+            results[appt_id] = CheckInResult(appt_id, REJECTED, "预约不存在")
+            continue
+        name, phone, dept_id, status = row
+        if status != "Pending":
+            results[appt_id] = CheckInResult(appt_id, REJECTED, f"预约状态为 {status}，无法核验", patient_name=name)
+            continue
+        to_insert.append((appt_id, name, phone, id_card, gender, dept_id, doctor_id, room_no,
+                          _item_key(request_key, appt_id, batch)))
+        results[appt_id] = CheckInResult(appt_id, CREATED, "核验成功，已转入待缴费", patient_name=name)
+
+    if to_insert:
+        cursor.executemany("""
+            INSERT INTO Visits (appt_id, patient_name, phone, id_card, gender, dept_id,
+                                doctor_id, room_no, status, request_key)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'ToPay', %s)
+        """, to_insert)
+        new_ids = tuple(r[0] for r in to_insert)
+        in_new = ", ".join(["%s"] * len(new_ids))
+        cursor.execute(
+            f"UPDATE Appointments SET status='Completed' WHERE appt_id IN ({in_new}) AND status='Pending'",
+            new_ids,
+        )
+        cursor.execute(f"SELECT appt_id, visit_id FROM Visits WHERE appt_id IN ({in_new})", new_ids)
+        for appt_id, visit_id in cursor.fetchall():
+            results[appt_id].visit_id = visit_id
+
+    return [results[item[0]] for item in items]
+
+
+def check_in(appt_id, id_card, gender, doctor_id, room_no, request_key=None):
+    """核验单条预约，返回 CheckInResult"""
+    with db_transaction() as cursor:
+        return _check_in(cursor, [(appt_id, id_card, gender, doctor_id, room_no)], request_key, batch=False)[0]
+
+
+def check_in_many(items, request_key=None):
+    """在一个事务中批量核验，items 为 [(appt_id, id_card, gender, doctor_id, room_no)]
+
+    同一预约重复出现时只处理第一次。
+    """
+    seen, unique_items = set(), []
+    for item in items:
+        if item[0] not in seen:
+            seen.add(item[0])
+            unique_items.append(item)
+    if not unique_items:
+        return []
+    with db_transaction() as cursor:
+        return _check_in(cursor, unique_items, request_key, batch=True)
+
+
+def _walk_in_visit(cursor, request_key):
+    cursor.execute("SELECT visit_id FROM Visits WHERE request_key = %s FOR SHARE", (request_key,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def register_walk_in(name, phone, id_card, gender, dept_id, doctor_id, room_no, request_key=None):
+    """现场挂号，返回 (visit_id, 是否为重复提交)"""
+    with db_transaction() as cursor:
+        if request_key:
+            visit_id = _walk_in_visit(cursor, request_key)
+            if visit_id is not None:
+                return visit_id, True
+        try:
+            cursor.execute("""
+                INSERT INTO Visits (patient_name, phone, id_card, gender, dept_id,
+                                    doctor_id, room_no, status, request_key)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, 'ToPay', %s)
+            """, (name, phone, id_card, gender, dept_id, doctor_id, room_no, request_key))
+        except mysql_errors.IntegrityError:
+            # 并发的重复提交先插入了同一 request_key：插入会等对方提交后报唯一键冲突，再读出它的结果
+            visit_id = _walk_in_visit(cursor, request_key) if request_key else None
+            if visit_id is None:
+                raise
+            return visit_id, True
+        return cursor.lastrowid, False
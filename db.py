@@ -0,0 +1,670 @@
+# -*- coding: utf-8 -*-
+"""数据访问层：进程级连接池 + 通用查询/执行函数
+
+Streamlit 每次重跑都会重新执行 app.py，但被 import 的模块只加载一次，
+因此连接池放在这里即可跨重跑、跨会话复用。
+
+配置了只读副本（HOSPITAL_DB_REPLICAS）时，run_query 的只读语句按当前线程绑定的 Route
+轮询发往健康且复制延迟在会话上限内的副本；写入、事务以及未绑定 Route 的线程一律走主库。
+会话写入后的一段时间内（副本追上这次写入之前）读也留在主库，保证读到自己刚写的数据。
+"""
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import mysql.connector
+from mysql.connector import errors as mysql_errors
+
+import audit
+import profiling
+
+DB_CONFIG = {
+    "host": os.environ.get("HOSPITAL_DB_HOST", "localhost"),
+    "port": int(os.environ.get("HOSPITAL_DB_PORT", 3306)),
+    "user": os.environ.get("HOSPITAL_DB_USER", "root"),
+    "password": os.environ.get("HOSPITAL_DB_PASSWORD", "root"),
+    "database": os.environ.get("HOSPITAL_DB_NAME", "community_hospital_db"),
+}
+
+# 连接池大小与借出等待超时（秒）
+POOL_SIZE = int(os.environ.get("HOSPITAL_DB_POOL_SIZE", 8))
+POOL_TIMEOUT = float(os.environ.get("HOSPITAL_DB_POOL_TIMEOUT", 5))
+# 连接空闲超过该秒数，借出前先 ping 一次做健康检查
+POOL_HEALTHCHECK_IDLE = 30
+
+# 并发查询线程数（不少于连接池大小）与单次查询超时（秒，从任务开始执行时计起）
+QUERY_WORKERS = max(int(os.environ.get("HOSPITAL_DB_QUERY_WORKERS", POOL_SIZE)), POOL_SIZE)
+QUERY_TIMEOUT = float(os.environ.get("HOSPITAL_DB_QUERY_TIMEOUT", 10))
+
+# run_query 每次从服务端取的行数，以及单次查询返回的行数上限（超出部分不取，结果标记为截断）
+FETCH_SIZE = 5000
+MAX_ROWS = int(os.environ.get("HOSPITAL_DB_MAX_ROWS", 200000))
+# 低基数文本列转为 category，避免每行一个 Python 字符串对象
+CATEGORY_COLUMNS = {"dept_name", "status", "gender", "role", "shift_time", "状态"}
+
+# 只读副本："host:port,host:port"，账号与库名同主库
+REPLICAS = [
+    dict(DB_CONFIG, host=h, port=int(p or 3306))
+    for h, _, p in (item.strip().partition(":") for item in os.environ.get("HOSPITAL_DB_REPLICAS", "").split(","))
+    if h
+]
+# 会话默认可接受的最大复制延迟（秒），副本健康检查间隔（秒）
+REPLICA_MAX_LAG = float(os.environ.get("HOSPITAL_DB_REPLICA_MAX_LAG", 5))
+REPLICA_CHECK_INTERVAL = 5
+# Seconds_Behind_Source 只精确到秒且按检查间隔采样，写后粘滞时额外留出的余量（秒）
+STICKY_MARGIN = 2
+
+MOCK_MODE = False
+
+
+class ConnectionPool:
+    """固定上限的 MySQL 连接池，带健康检查和借出统计"""
+
+    def __init__(self, config, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self._idle = []     # [(conn, last_used)]，后进先出
+        self._created = 0
+        self._in_use = 0
+        self._lock = threading.Lock()
+        # 归还连接或释放名额时唤醒一个等待者
+        self._available = threading.Condition(self._lock)
+        self._stats = {
+            "checkouts": 0,     # 借出总次数
+            "misses": 0,        # 池中无空闲连接、需新建的次数
+            "waits": 0,         # 连接数已达上限、需排队等待的次数
+            "wait_time": 0.0,   # 借出累计耗时（秒）
+            "reconnects": 0,    # 健康检查失败后重连的次数
+            "timeouts": 0,      # 等待超时的次数
+        }
+
+    def _connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def _checkout(self):
+        """取空闲连接，或占用一个名额准备新建；都没有时等待归还 / 释放名额
+
+        返回 (conn, last_used, missed, waited)，conn 为 None 表示已占用名额、需要新建连接。
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._available:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    return conn, last_used, False, waited
+                if self._created < self.size:
+                    self._created += 1
+                    return None, None, True, waited
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise mysql_errors.PoolError(
+                        f"连接池已耗尽（{self.size} 个连接均在使用中），请稍后重试"
+                    )
+                waited = True
+                self._available.wait(remaining)
+
+    def _free_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _check_health(self, conn, last_used):
+        if time.monotonic() - last_used < POOL_HEALTHCHECK_IDLE:
+            return conn
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except mysql_errors.Error:
+            try:
+                conn.close()
+            except mysql_errors.Error:
+                pass
+            with self._lock:
+                self._stats["reconnects"] += 1
+            return self._connect()
+
+    def acquire(self):
+        start = time.perf_counter()
+        conn, last_used, missed, waited = self._checkout()
+        if conn is None:
+            try:
+                conn, last_used = self._connect(), time.monotonic()
+            except Exception:
+                self._free_slot()
+                raise
+        try:
+            conn = self._check_health(conn, last_used)
+        except Exception:
+            self._free_slot()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["misses"] += missed
+            self._stats["waits"] += waited
+            self._stats["wait_time"] += time.perf_counter() - start
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self._in_use -= 1
+        if not discard:
+            try:
+                # 归还前清掉未提交的事务，避免把锁带给下一个借用者
+                if conn.in_transaction:
+                    conn.rollback()
+            except mysql_errors.Error:
+                discard = True
+        if discard:
+            try:
+                conn.close()
+            except mysql_errors.Error:
+                pass
+            self._free_slot()
+        else:
+            with self._available:
+                self._idle.append((conn, time.monotonic()))
+                self._available.notify()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(size=self.size, open=self._created,
+                         in_use=self._in_use, idle=len(self._idle))
+        stats["avg_wait_ms"] = round(stats["wait_time"] * 1000 / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+        stats["wait_time"] = round(stats["wait_time"], 4)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG)
+    return _pool
+
+
+def pool_stats():
+    """连接池指标，供侧边栏展示"""
+    if MOCK_MODE or _pool is None:
+        return {}
+    stats = _pool.snapshot()
+    if _replicas:
+        stats["replicas"] = {node.name: node.snapshot() for node in _replicas}
+    return stats
+
+
+class ReplicaNode:
+    """一个只读副本：独立连接池 + 定期检查复制状态与延迟"""
+
+    def __init__(self, config):
+        self.name = f"{config['host']}:{config['port']}"
+        self.pool = ConnectionPool(config)
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+
+    def mark_down(self, error):
+        self.healthy, self.error = False, str(error)
+        self._checked_at = time.monotonic()
+
+    def _replication_status(self):
+        conn = self.pool.acquire()
+        broken = False
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except mysql_errors.ProgrammingError:
+                    # MySQL 8.0.22 之前 / MariaDB
+                    cursor.execute("SHOW SLAVE STATUS")
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        except (mysql_errors.OperationalError, mysql_errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.pool.release(conn, discard=broken)
+
+    def check(self):
+        try:
+            row = self._replication_status()
+        except mysql_errors.Error as e:
+            self.mark_down(e)
+            return
+        if row is None:
+            self.mark_down("未配置复制")
+            return
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        if lag is None:
+            self.mark_down("复制线程未运行")
+            return
+        self.healthy, self.lag, self.error = True, int(lag), None
+        self._checked_at = time.monotonic()
+
+    def usable(self, max_lag):
+        # 检查过期时只让一个线程去检查，其他线程沿用上次结果
+        if time.monotonic() - self._checked_at > REPLICA_CHECK_INTERVAL and self._check_lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._check_lock.release()
+        return self.healthy and self.lag is not None and self.lag <= max_lag
+
+    def snapshot(self):
+        stats = self.pool.snapshot()
+        stats.update(healthy=self.healthy, lag=self.lag, error=self.error)
+        return stats
+
+
+_replicas = [ReplicaNode(config) for config in REPLICAS]
+_next_replica = itertools.count()
+
+
+class Route:
+    """读路由策略：max_lag 为可接受的最大复制延迟（秒），0 表示只读主库
+
+    每个 Streamlit 会话一个（见 session_route），也可以为后台任务 / 共享缓存单独创建。
+    """
+
+    def __init__(self, max_lag=REPLICA_MAX_LAG):
+        self.max_lag = max_lag
+        self.last_write = None
+
+    def mark_write(self):
+        self.last_write = time.monotonic()
+
+    def accepts(self, lag):
+        if lag > self.max_lag:
+            return False
+        # 写入后要等副本延迟小于「距写入的时间」，才认为副本已包含这次写入
+        return self.last_write is None or time.monotonic() - self.last_write > lag + STICKY_MARGIN
+
+
+# 当前线程的读路由：current 为绑定的 Route，primary 为 True 时强制走主库
+_route = threading.local()
+
+
+def session_route():
+    """当前 Streamlit 会话的 Route（保存在 session_state），并绑定到当前线程"""
+    route = st.session_state.get("db_route")
+    if route is None:
+        route = st.session_state["db_route"] = Route()
+    _route.current = route
+    return route
+
+
+@contextmanager
+def bound_route(route):
+    """在块内把 route 绑定到当前线程（后台线程 / 共享缓存加载用）"""
+    previous = getattr(_route, "current", None)
+    _route.current = route
+    try:
+        yield route
+    finally:
+        _route.current = previous
+
+
+@contextmanager
+def use_primary():
+    """块内的读查询一律走主库，用于必须读到最新数据的流程"""
+    previous = getattr(_route, "primary", False)
+    _route.primary = True
+    try:
+        yield
+    finally:
+        _route.primary = previous
+
+
+_READ_RE = re.compile(r"^\s*(SELECT|SHOW|DESCRIBE|DESC|EXPLAIN)\b", re.IGNORECASE)
+# SET 只改会话变量（如归档时的 @skip_changelog），不修改数据，不计入审计
+_SESSION_RE = re.compile(r"^\s*SET\b", re.IGNORECASE)
+
+
+def _pick_replica(query):
+    """按当前线程的 Route 轮询挑选可用副本，没有合适的返回 None（走主库）"""
+    route = getattr(_route, "current", None)
+    if not _replicas or route is None or getattr(_route, "primary", False) or not _READ_RE.match(query):
+        return None
+    # max_lag 为 0 表示只读主库（延迟只精确到秒，报告 0 的副本也可能落后）
+    if route.max_lag <= 0:
+        return None
+    start = next(_next_replica)
+    for i in range(len(_replicas)):
+        node = _replicas[(start + i) % len(_replicas)]
+        if node.usable(route.max_lag) and route.accepts(node.lag):
+            return node
+    return None
+
+
+# 当前线程最近一次借出连接的耗时，供埋点使用
+_acquire = threading.local()
+
+
+class TimedCursor:
+    """游标代理：execute / executemany / callproc 逐条计时并写入 profiling
+
+    写语句（非 SELECT / SHOW 等只读语句，也不是 SET 会话变量）另外记入 writes，由 db_transaction() 结束时交给 audit。
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.writes = []   # [(kind, sql, params, rows, elapsed)]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, kind, sql, params, call, audit_params=None):
+        acquire = getattr(_acquire, "seconds", None)
+        _acquire.seconds = None  # 取连接耗时只记在连接上的第一条语句
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            elapsed = time.perf_counter() - start
+            rowcount = self._cursor.rowcount
+            rows = rowcount if rowcount is not None and rowcount >= 0 else None
+            profiling.record(kind, sql, params, elapsed, rows=rows, acquire=acquire)
+            if kind == "callproc" or not (_READ_RE.match(sql) or _SESSION_RE.match(sql)):
+                self.writes.append((kind, sql, params if audit_params is None else audit_params, rows, elapsed))
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        return self._timed("execute", sql, params, lambda: self._cursor.execute(sql, params, *args, **kwargs))
+
+    def executemany(self, sql, seq_params):
+        # 审计要记下每一行的参数（谁结清了哪些就诊）；profiling 只保留单行参数的语句供 EXPLAIN
+        seq_params = list(seq_params)
+        return self._timed("executemany", sql, None, lambda: self._cursor.executemany(sql, seq_params),
+                           audit_params=seq_params)
+
+    def callproc(self, proc_name, args=()):
+        return self._timed("callproc", f"CALL {proc_name}", args, lambda: self._cursor.callproc(proc_name, args))
+
+
+@contextmanager
+def _lend(pool, conn, start):
+    _acquire.seconds = time.perf_counter() - start
+    # 使用方可置 _acquire.discard = True 要求关闭而不是归还（如结果集未读完）
+    _acquire.discard = False
+    broken = False
+    try:
+        yield conn
+    except (mysql_errors.OperationalError, mysql_errors.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.release(conn, discard=broken or _acquire.discard)
+        _acquire.discard = False
+
+
+@contextmanager
+def db_connection():
+    """从主库连接池借出一个连接，退出时自动归还"""
+    pool = get_pool()
+    start = time.perf_counter()
+    conn = pool.acquire()
+    _acquire.node = None
+    with _lend(pool, conn, start) as conn:
+        yield conn
+
+
+@contextmanager
+def read_connection(query):
+    """为只读语句借连接：当前 Route 允许时用副本，副本连不上时退回主库"""
+    start = time.perf_counter()
+    node = _pick_replica(query)
+    if node is not None:
+        try:
+            conn = node.pool.acquire()
+        except mysql_errors.Error as e:
+            node.mark_down(e)
+        else:
+            _acquire.node = node.name
+            with _lend(node.pool, conn, start) as conn:
+                yield conn
+            return
+    pool = get_pool()
+    conn = pool.acquire()
+    _acquire.node = None
+    with _lend(pool, conn, start) as conn:
+        yield conn
+
+
+@contextmanager
+def db_transaction():
+    """在单个连接上开启事务：正常退出提交，出现异常回滚
+
+    事务中的写语句在提交 / 回滚后交给 audit 异步记录，不占用本事务的时间。
+    """
+    with db_connection() as conn:
+        cursor = TimedCursor(conn.cursor())
+        try:
+            yield cursor
+            conn.commit()
+        except BaseException as e:
+            try:
+                conn.rollback()
+            except mysql_errors.Error:
+                pass
+            audit.record(cursor.writes, "rollback", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            cursor.close()
+        # 已提交：之后的步骤不能再让调用方以为事务失败（audit.record 不会抛出异常）
+        route = getattr(_route, "current", None)
+        if route is not None:
+            route.mark_write()
+        audit.record(cursor.writes, "commit")
+
+
+_SELECT_RE = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+# 工作线程内为 True：查询出错时抛出异常，由主线程的 gather() 统一提示
+_worker = threading.local()
+
+
+def _with_time_limit(query, timeout):
+    """为 SELECT 加 MAX_EXECUTION_TIME 提示，超时后服务端也会终止查询（MariaDB 视作注释忽略）"""
+    if timeout is None or not _SELECT_RE.match(query):
+        return query
+    return _SELECT_RE.sub(f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */", query, count=1)
+
+
+def _batch(rows, names):
+    """一批行元组 -> Arrow 表；DECIMAL 转 float64，金额按数值列处理"""
+    arrays = []
+    for column in zip(*rows):
+        array = pa.array(column)
+        if pa.types.is_decimal(array.type):
+            array = array.cast(pa.float64())
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _to_frame(table):
+    df = table.to_pandas()
+    for name in CATEGORY_COLUMNS.intersection(df.columns):
+        if pd.api.types.is_string_dtype(df[name].dtype):
+            df[name] = df[name].astype("category")
+    return df
+
+
+def _fetch_frame(conn, query, params, max_rows):
+    """无缓冲游标分批读取，每批先转成紧凑的 Arrow 列，避免整表的行元组同时驻留内存
+
+    超过 max_rows 时停止读取，返回的 DataFrame 带 attrs["truncated"] = True。语句自带
+    LIMIT max_rows + 1 时多出的那一行会被读完丢弃，连接照常归还；只有服务端还有未读结果时才关闭连接。
+    """
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(query, params)
+    names = [d[0] for d in cursor.description]
+    batches, total, truncated = [], 0, False
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        if max_rows is not None and total + len(rows) > max_rows:
+            rows, truncated = rows[:max_rows - total], True
+        total += len(rows)
+        if rows:
+            batches.append(_batch(rows, names))
+        if truncated:
+            break
+    if truncated and cursor.fetchone() is not None:
+        # 剩余结果不再读取，连接直接关闭
+        _acquire.discard = True
+    else:
+        cursor.close()
+    if batches:
+        df = _to_frame(pa.concat_tables(batches, promote_options="default"))
+    else:
+        df = pd.DataFrame(columns=names)
+    df.attrs["truncated"] = truncated
+    return df
+
+
+def run_query(query, params=None, max_rows=MAX_ROWS):
+    """执行只读查询返回 DataFrame，最多 max_rows 行（None 表示不限），被截断时 df.attrs["truncated"] 为 True"""
+    if MOCK_MODE:
+        return pd.DataFrame({"提示": ["模拟数据", "模拟数据"], "数值": [1, 2]})
+
+    timeout = getattr(_worker, "timeout", None)
+    df = None
+    try:
+        with read_connection(query) as conn:
+            acquire, _acquire.seconds = _acquire.seconds, None
+            start = time.perf_counter()
+            try:
+                df = _fetch_frame(conn, _with_time_limit(query, timeout), params, max_rows)
+                return df
+            finally:
+                profiling.record(
+                    f"query@{_acquire.node}" if _acquire.node else "query", query, params, time.perf_counter() - start,
+                    rows=None if df is None else len(df),
+                    nbytes=None if df is None else int(df.memory_usage(index=False, deep=True).sum()),
+                    acquire=acquire,
+                )
+    except Exception as e:
+        if getattr(_worker, "active", False):
+            raise
+        st.error(f"查询出错: {e}")
+        return pd.DataFrame()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="db-query")
+    return _executor
+
+
+@contextmanager
+def raise_query_errors(timeout=None):
+    """在当前线程内让 run_query 出错时抛出异常而不是 st.error + 返回空表（后台线程 / 命令行工具用）"""
+    previous = getattr(_worker, "active", False), getattr(_worker, "timeout", None)
+    _worker.active, _worker.timeout = True, timeout
+    try:
+        yield
+    finally:
+        _worker.active, _worker.timeout = previous
+
+
+def _run_in_worker(started, timeout, route, primary, fn, args, kwargs):
+    started.at = time.monotonic()
+    started.set()
+    _route.primary = primary
+    try:
+        with raise_query_errors(timeout), bound_route(route):
+            return fn(*args, **kwargs)
+    finally:
+        _route.primary = False
+
+
+def submit(fn, *args, timeout=QUERY_TIMEOUT, **kwargs):
+    """在查询线程池中执行 fn(*args, **kwargs)，返回 Future
+
+    fn 可以是 run_query，也可以是内部调用 run_query 的函数（如 refdata.get_departments）。
+    互不依赖的查询先全部 submit，再用 gather() 一起等待，页面耗时约等于最慢的那条查询。
+    """
+    # 读路由在调用线程（持有会话）决定，随任务带到工作线程
+    route, primary = getattr(_route, "current", None), getattr(_route, "primary", False)
+    # 记录任务真正开始执行的时刻，gather 的超时从这里算起，不含线程池排队时间
+    started = threading.Event()
+    future = _get_executor().submit(_run_in_worker, started, timeout, route, primary, fn, args, kwargs)
+    future.started = started
+    return future
+
+
+def gather(tasks, timeout=QUERY_TIMEOUT, defaults=None):
+    """等待 {名称: Future}，返回 {名称: 结果}
+
+    每个任务的超时从它开始执行时计起；在线程池中排队超过 timeout 仍未开始的也按超时处理。
+    超时或出错的任务在主线程提示，并以 defaults 中对应的值（默认空 DataFrame）代替。
+    """
+    defaults = defaults or {}
+    results = {}
+    for name, future in tasks.items():
+        try:
+            if not future.started.wait(timeout):
+                raise FutureTimeout()
+            results[name] = future.result(timeout=max(0.0, future.started.at + timeout - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+            st.warning(f"查询超时（{timeout:g} 秒）: {name}")
+            results[name] = defaults.get(name, pd.DataFrame())
+        except Exception as e:
+            st.error(f"查询出错（{name}）: {e}")
+            results[name] = defaults.get(name, pd.DataFrame())
+    return results
+
+
+def run_action(sql, params=None):
+    if MOCK_MODE:
+        st.success("【模拟模式】操作已执行")
+        return True
+
+    try:
+        with db_transaction() as cursor:
+            cursor.execute(sql, params)
+        return True
+    except Exception as e:
+        st.error(f"操作失败: {e}")
+        return False
+
+
+def call_procedure(proc_name, args):
+    if MOCK_MODE:
+        st.success(f"【模拟模式】调用存储过程 {proc_name} 成功")
+        return True
+
+    try:
+        with db_transaction() as cursor:
+            cursor.callproc(proc_name, args)
+        return True
+    except Exception as e:
+        st.error(f"存储过程调用失败: {e}")
+        return False
@@ -1,106 +1,259 @@
-CREATE DATABASE IF NOT EXISTS community_hospital_db CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci;
-USE community_hospital_db;
-
-SET FOREIGN_KEY_CHECKS = 0;
-DROP TABLE IF EXISTS Visits;
-DROP TABLE IF EXISTS Appointments;
-DROP TABLE IF EXISTS Schedules;
-DROP TABLE IF EXISTS Staff;
-DROP TABLE IF EXISTS Rooms;
-DROP TABLE IF EXISTS Departments;
-SET FOREIGN_KEY_CHECKS = 1;
-
-CREATE TABLE Departments (
-    dept_id INT PRIMARY KEY AUTO_INCREMENT,
-    dept_name VARCHAR(50) NOT NULL UNIQUE,
-    location VARCHAR(100) COMMENT '¥/λ'
-) ENGINE=InnoDB;
-
-CREATE TABLE Rooms (
-    room_id INT PRIMARY KEY AUTO_INCREMENT,
-    room_no VARCHAR(20) NOT NULL UNIQUE,
-    dept_id INT NOT NULL,
-    room_type ENUM('General', 'Special', 'Consultation') DEFAULT 'General',
-    status ENUM('Available', 'Occupied', 'Maintenance') DEFAULT 'Available',
-    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id)
-) ENGINE=InnoDB;
-
-CREATE TABLE Staff (
-    staff_id INT PRIMARY KEY AUTO_INCREMENT,
-    name VARCHAR(50) NOT NULL,
-    role ENUM('Doctor', 'Nurse', 'Admin', 'Cashier') NOT NULL,
-    dept_id INT,
-    title VARCHAR(50) COMMENT 'ְ: ҽʦ',
-    phone VARCHAR(20),
-    is_active BOOLEAN DEFAULT TRUE COMMENT '1Ϊְ, 0Ϊְ',
-    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id)
-) ENGINE=InnoDB;
-
-CREATE TABLE Schedules (
-    schedule_id INT PRIMARY KEY AUTO_INCREMENT,
-    doctor_id INT NOT NULL,
-    room_no VARCHAR(20) NOT NULL,
-    shift_date DATE NOT NULL,
-    shift_time ENUM('Morning', 'Afternoon') NOT NULL,
-    UNIQUE KEY unique_doctor_shift (doctor_id, shift_date, shift_time),
-    UNIQUE KEY unique_room_shift (room_no, shift_date, shift_time),
-    FOREIGN KEY (doctor_id) REFERENCES Staff(staff_id),
-    FOREIGN KEY (room_no) REFERENCES Rooms(room_no)
-) ENGINE=InnoDB;
-
-CREATE TABLE Appointments (
-    appt_id INT PRIMARY KEY AUTO_INCREMENT,
-    patient_name VARCHAR(50) NOT NULL,
-    id_card VARCHAR(18) NOT NULL, 
-    phone VARCHAR(20) NOT NULL,
-    dept_id INT NOT NULL,
-    appt_date DATE NOT NULL,
-    expected_arrival_time TIME,
-    status ENUM('Pending', 'Completed', 'Cancelled') DEFAULT 'Pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id),
-    INDEX idx_id_card (id_card) 
-) ENGINE=InnoDB;
-
-CREATE TABLE Visits (
-    visit_id INT PRIMARY KEY AUTO_INCREMENT,
-    appt_id INT NULL,                      -- ԤԼת룬¼ԭID
-    patient_name VARCHAR(50) NOT NULL,
-    id_card VARCHAR(18) NOT NULL,
-    phone VARCHAR(20),
-    gender ENUM('M', 'F') NOT NULL,
-    dept_id INT NOT NULL,
-    doctor_id INT NOT NULL,
-    room_no VARCHAR(20) NOT NULL,
-    status ENUM('Waiting', 'Consulting', 'ToPay', 'Finished') DEFAULT 'Waiting',
-    total_fee DECIMAL(10, 2) DEFAULT 0.00,
-    visit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    finish_time TIMESTAMP NULL,             -- ʱ
-    FOREIGN KEY (appt_id) REFERENCES Appointments(appt_id),
-    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id),
-    FOREIGN KEY (doctor_id) REFERENCES Staff(staff_id)
-) ENGINE=InnoDB;
-
-
--- ʼʾ
-
--- 
-INSERT INTO Departments (dept_name, location) VALUES 
-('ڿ', '¥2F-A'),
-('', '¥3F-B'),
-('', 'סԺ¥1F-C'),
-('ҽ', 'ۺ¥4F-D');
-
--- 
-INSERT INTO Rooms (room_no, dept_id) VALUES 
-('201', 1), ('202', 1), 
-('301', 2), ('302', 2),
-('101', 3), 
-('401', 4);
-
--- ʼԱ
-INSERT INTO Staff (name, role, dept_id, title, phone, is_active) VALUES 
-('', 'Doctor', 1, 'ҽʦ', '13811112222', 1),
-('ҽ', 'Doctor', 1, 'ҽʦ', '13833334444', 1),
-('', 'Doctor', 2, 'ҽʦ', '13955556666', 1),
-('Զ', 'Doctor', 3, 'ҽʦ', '13777778888', 1);
\ No newline at end of file
+CREATE DATABASE IF NOT EXISTS community_hospital_db CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci;
+USE community_hospital_db;
+
+SET FOREIGN_KEY_CHECKS = 0;
+DROP TABLE IF EXISTS AuditLog;
+DROP TABLE IF EXISTS SlotCapacity;
+DROP TABLE IF EXISTS ChangeLog;
+DROP TABLE IF EXISTS VisitsArchive;
+DROP TABLE IF EXISTS AppointmentsArchive;
+DROP TABLE IF EXISTS PaymentItems;
+DROP TABLE IF EXISTS Payments;
+DROP TABLE IF EXISTS RevenueDaily;
+DROP TABLE IF EXISTS Visits;
+DROP TABLE IF EXISTS Appointments;
+DROP TABLE IF EXISTS Schedules;
+DROP TABLE IF EXISTS Staff;
+DROP TABLE IF EXISTS Rooms;
+DROP TABLE IF EXISTS Departments;
+SET FOREIGN_KEY_CHECKS = 1;
+
+CREATE TABLE Departments (
+    dept_id INT PRIMARY KEY AUTO_INCREMENT,
+    dept_name VARCHAR(50) NOT NULL UNIQUE,
+    location VARCHAR(100) COMMENT '科室楼层/位置'
+) ENGINE=InnoDB;
+
+CREATE TABLE Rooms (
+    room_id INT PRIMARY KEY AUTO_INCREMENT,
+    room_no VARCHAR(20) NOT NULL UNIQUE,
+    dept_id INT NOT NULL,
+    room_type ENUM('General', 'Special', 'Consultation') DEFAULT 'General',
+    status ENUM('Available', 'Occupied', 'Maintenance') DEFAULT 'Available',
+    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE Staff (
+    staff_id INT PRIMARY KEY AUTO_INCREMENT,
+    name VARCHAR(50) NOT NULL,
+    role ENUM('Doctor', 'Nurse', 'Admin', 'Cashier') NOT NULL,
+    dept_id INT,
+    title VARCHAR(50) COMMENT '职称: 如主任医师',
+    phone VARCHAR(20),
+    is_active BOOLEAN DEFAULT TRUE COMMENT '1为在职, 0为离职',
+    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE Schedules (
+    schedule_id INT PRIMARY KEY AUTO_INCREMENT,
+    doctor_id INT NOT NULL,
+    room_no VARCHAR(20) NOT NULL,
+    shift_date DATE NOT NULL,
+    shift_time ENUM('Morning', 'Afternoon') NOT NULL,
+    UNIQUE KEY unique_doctor_shift (doctor_id, shift_date, shift_time),
+    UNIQUE KEY unique_room_shift (room_no, shift_date, shift_time),
+    INDEX idx_shift_date (shift_date, shift_time),            -- 批量排班按日期区间加载已有排班
+    FOREIGN KEY (doctor_id) REFERENCES Staff(staff_id),
+    FOREIGN KEY (room_no) REFERENCES Rooms(room_no)
+) ENGINE=InnoDB;
+
+CREATE TABLE Appointments (
+    appt_id INT PRIMARY KEY AUTO_INCREMENT,
+    patient_name VARCHAR(50) NOT NULL,
+    id_card VARCHAR(18) NOT NULL, 
+    phone VARCHAR(20) NOT NULL,
+    dept_id INT NOT NULL,
+    appt_date DATE NOT NULL,
+    expected_arrival_time TIME,
+    status ENUM('Pending', 'Completed', 'Cancelled') DEFAULT 'Pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id),
+    INDEX idx_id_card (id_card),
+    INDEX idx_status_date_dept (status, appt_date, dept_id)   -- 待核验队列按状态+日期+科室过滤
+) ENGINE=InnoDB;
+
+CREATE TABLE Visits (
+    visit_id INT PRIMARY KEY AUTO_INCREMENT,
+    appt_id INT NULL,                      -- 如果是预约转入，记录原ID
+    patient_name VARCHAR(50) NOT NULL,
+    id_card VARCHAR(18) NOT NULL,
+    phone VARCHAR(20),
+    gender ENUM('M', 'F') NOT NULL,
+    dept_id INT NOT NULL,
+    doctor_id INT NOT NULL,
+    room_no VARCHAR(20) NOT NULL,
+    status ENUM('Waiting', 'Consulting', 'ToPay', 'Finished') DEFAULT 'Waiting',
+    total_fee DECIMAL(10, 2) DEFAULT 0.00,
+    visit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finish_time TIMESTAMP NULL,             -- 结算时间
+    request_key VARCHAR(64) NULL,           -- 前台提交的幂等键，防止重复提交生成多条就诊
+    FOREIGN KEY (appt_id) REFERENCES Appointments(appt_id),
+    UNIQUE KEY uk_visit_appt (appt_id),                       -- 一条预约最多转一条就诊
+    UNIQUE KEY uk_request_key (request_key),
+    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id),
+    FOREIGN KEY (doctor_id) REFERENCES Staff(staff_id),
+    INDEX idx_status_visit_time (status, visit_time),         -- 待缴费队列按状态+时间过滤
+    INDEX idx_status_finish_time (status, finish_time),       -- 收入汇总重算按结算时间取区间
+    -- 患者档案检索（见 search.py）
+    INDEX idx_visit_id_card (id_card),
+    INDEX idx_visit_phone (phone),
+    INDEX idx_room_time (room_no, visit_time),
+    INDEX idx_patient_name (patient_name),
+    FULLTEXT INDEX ft_patient_name (patient_name) WITH PARSER ngram
+) ENGINE=InnoDB;
+
+-- 门诊收入日汇总：收银结算时增量累加，财务报表只读此表
+CREATE TABLE RevenueDaily (
+    stat_date DATE NOT NULL,
+    dept_id INT NOT NULL,
+    doctor_id INT NOT NULL,
+    visit_count INT NOT NULL DEFAULT 0,
+    fee_sum DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (stat_date, dept_id, doctor_id),
+    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id),
+    FOREIGN KEY (doctor_id) REFERENCES Staff(staff_id)
+) ENGINE=InnoDB;
+
+-- 收费流水（只追加，见 payments.py）：每条结清的就诊一行，按支付方式的收入统计只读此表。
+-- 不对 Visits 建外键，就诊归档后流水仍然保留
+CREATE TABLE Payments (
+    payment_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    visit_id INT NOT NULL,
+    method ENUM('医保卡', '微信/支付宝', '现金') NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    request_key VARCHAR(64) NULL,           -- 同一次收款提交的幂等键，批量结清时多行共用
+    paid_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_payment_visit (visit_id),  -- 一条就诊只收一次费
+    INDEX idx_paid_at_method (paid_at, method),
+    INDEX idx_payment_request_key (request_key)
+) ENGINE=InnoDB;
+
+CREATE TABLE PaymentItems (
+    item_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    payment_id BIGINT NOT NULL,
+    item_name VARCHAR(50) NOT NULL,         -- 挂号费 / 诊疗费 / 检查费 / 药费
+    amount DECIMAL(10, 2) NOT NULL,
+    FOREIGN KEY (payment_id) REFERENCES Payments(payment_id)
+) ENGINE=InnoDB;
+
+-- 历史归档（见 archive.py）：列与热表一致，不建外键，只保留检索 / 导出 / 汇总重算用到的索引
+CREATE TABLE AppointmentsArchive (
+    appt_id INT PRIMARY KEY,
+    patient_name VARCHAR(50) NOT NULL,
+    id_card VARCHAR(18) NOT NULL,
+    phone VARCHAR(20) NOT NULL,
+    dept_id INT NOT NULL,
+    appt_date DATE NOT NULL,
+    expected_arrival_time TIME,
+    status ENUM('Pending', 'Completed', 'Cancelled'),
+    created_at TIMESTAMP NULL,
+    INDEX idx_id_card (id_card),
+    INDEX idx_appt_date (appt_date)
+) ENGINE=InnoDB;
+
+CREATE TABLE VisitsArchive (
+    visit_id INT PRIMARY KEY,
+    appt_id INT NULL,
+    patient_name VARCHAR(50) NOT NULL,
+    id_card VARCHAR(18) NOT NULL,
+    phone VARCHAR(20),
+    gender ENUM('M', 'F') NOT NULL,
+    dept_id INT NOT NULL,
+    doctor_id INT NOT NULL,
+    room_no VARCHAR(20) NOT NULL,
+    status ENUM('Waiting', 'Consulting', 'ToPay', 'Finished'),
+    total_fee DECIMAL(10, 2),
+    visit_time TIMESTAMP NULL,
+    finish_time TIMESTAMP NULL,
+    request_key VARCHAR(64) NULL,
+    INDEX idx_visit_time (visit_time),
+    INDEX idx_status_finish_time (status, finish_time),
+    INDEX idx_visit_id_card (id_card),
+    INDEX idx_visit_phone (phone),
+    INDEX idx_room_time (room_no, visit_time),
+    INDEX idx_patient_name (patient_name),
+    FULLTEXT INDEX ft_patient_name (patient_name) WITH PARSER ngram
+) ENGINE=InnoDB;
+
+-- 预约号源：(科室, 日期, 时段) 的容量与已约人数，由 slots.py 维护。
+-- 容量 = 该时段出诊医生数 × 每位医生号源数，排班保存时重算；预约时条件自增 booked，满额即失败
+CREATE TABLE SlotCapacity (
+    dept_id INT NOT NULL,
+    slot_date DATE NOT NULL,
+    shift_time ENUM('Morning', 'Afternoon') NOT NULL,
+    capacity INT NOT NULL DEFAULT 0,
+    booked INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dept_id, slot_date, shift_time),           -- 按科室查日期区间内的可约号源
+    INDEX idx_slot_date (slot_date),                         -- 排班保存时按日期区间重算容量
+    FOREIGN KEY (dept_id) REFERENCES Departments(dept_id)
+) ENGINE=InnoDB;
+
+-- 就诊 / 预约变更流水：由下方触发器写入，changefeed.py 按 change_id 增量拉取
+-- 会话变量 @skip_changelog 非空时不写（归档任务搬移历史行时设置）
+CREATE TABLE ChangeLog (
+    change_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    table_name ENUM('Visits', 'Appointments') NOT NULL,
+    row_id INT NOT NULL,
+    op ENUM('I', 'U', 'D') NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_changed_at (changed_at)
+) ENGINE=InnoDB;
+
+CREATE TRIGGER trg_visits_ins AFTER INSERT ON Visits FOR EACH ROW
+    INSERT INTO ChangeLog (table_name, row_id, op) SELECT 'Visits', NEW.visit_id, 'I' FROM DUAL WHERE @skip_changelog IS NULL;
+CREATE TRIGGER trg_visits_upd AFTER UPDATE ON Visits FOR EACH ROW
+    INSERT INTO ChangeLog (table_name, row_id, op) SELECT 'Visits', NEW.visit_id, 'U' FROM DUAL WHERE @skip_changelog IS NULL;
+CREATE TRIGGER trg_visits_del AFTER DELETE ON Visits FOR EACH ROW
+    INSERT INTO ChangeLog (table_name, row_id, op) SELECT 'Visits', OLD.visit_id, 'D' FROM DUAL WHERE @skip_changelog IS NULL;
+CREATE TRIGGER trg_appts_ins AFTER INSERT ON Appointments FOR EACH ROW
+    INSERT INTO ChangeLog (table_name, row_id, op) SELECT 'Appointments', NEW.appt_id, 'I' FROM DUAL WHERE @skip_changelog IS NULL;
+CREATE TRIGGER trg_appts_upd AFTER UPDATE ON Appointments FOR EACH ROW
+    INSERT INTO ChangeLog (table_name, row_id, op) SELECT 'Appointments', NEW.appt_id, 'U' FROM DUAL WHERE @skip_changelog IS NULL;
+CREATE TRIGGER trg_appts_del AFTER DELETE ON Appointments FOR EACH ROW
+    INSERT INTO ChangeLog (table_name, row_id, op) SELECT 'Appointments', OLD.appt_id, 'D' FROM DUAL WHERE @skip_changelog IS NULL;
+
+-- 操作审计（只追加，见 audit.py）：每条提交或回滚的写语句一行，由后台线程批量写入
+CREATE TABLE AuditLog (
+    audit_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    logged_at DATETIME(3) NOT NULL,
+    actor VARCHAR(50) NOT NULL COMMENT '操作角色，后台任务为 system',
+    session_id VARCHAR(32) NULL,
+    kind ENUM('execute', 'executemany', 'callproc') NOT NULL,
+    statement TEXT NOT NULL,
+    params TEXT NULL,
+    row_count INT NULL,
+    elapsed_ms DECIMAL(10, 2) NOT NULL,
+    outcome ENUM('commit', 'rollback') NOT NULL,
+    error VARCHAR(255) NULL,
+    INDEX idx_audit_time (logged_at),
+    INDEX idx_audit_actor_time (actor, logged_at)
+) ENGINE=InnoDB;
+
+CREATE TRIGGER trg_audit_no_update BEFORE UPDATE ON AuditLog FOR EACH ROW
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'AuditLog is append-only';
+CREATE TRIGGER trg_audit_no_delete BEFORE DELETE ON AuditLog FOR EACH ROW
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'AuditLog is append-only';
+
+
+-- 初始化演示数据
+
+-- 插入科室
+INSERT INTO Departments (dept_name, location) VALUES 
+('内科', '门诊楼2F-A区'),
+('外科', '门诊楼3F-B区'),
+('儿科', '住院楼1F-C区'),
+('中医科', '综合楼4F-D区');
+
+-- 插入诊室
+INSERT INTO Rooms (room_no, dept_id) VALUES 
+('201', 1), ('202', 1), 
+('301', 2), ('302', 2),
+('101', 3), 
+('401', 4);
+
+-- 插入初始员工
+INSERT INTO Staff (name, role, dept_id, title, phone, is_active) VALUES 
+('张主任', 'Doctor', 1, '主任医师', '13811112222', 1),
+('李医生', 'Doctor', 1, '副主任医师', '13833334444', 1),
+('王外科', 'Doctor', 2, '主治医师', '13955556666', 1),
+('赵儿科', 'Doctor', 3, '主任医师', '13777778888', 1);
\ No newline at end of file
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""收费：分项计费 + 收费流水（Payments / PaymentItems，只追加）
+
+一次收款可以结清多条就诊，全部在一个事务内完成：按 visit_id 升序 FOR UPDATE 锁住所选就诊，
+其中仍为 ToPay 的批量更新状态、写入每条就诊的收费记录与费用明细，并累加 RevenueDaily 日汇总。
+已被别的收银台结清的就诊跳过，不影响同批其他就诊。request_key 相同的重复提交直接返回先前结果：
+幂等键在拿到就诊行锁之后用加锁读（FOR SHARE）检查，并发的重复提交也能读到先前已提交的结果。
+按支付方式的收入统计只读 Payments，不访问 Visits。
+"""
+from decimal import Decimal
+
+import reports
+from db import db_transaction
+
+METHODS = ["医保卡", "微信/支付宝", "现金"]
+FEE_ITEMS = ["挂号费", "诊疗费", "检查费", "药费"]
+
+_CENT = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(str(value)).quantize(_CENT)
+
+
+class Bill:
+    """一条就诊的账单：items 为 [(费用项目, 金额)]，金额为 0 的项目不记明细"""
+
+    def __init__(self, visit_id, items, method=METHODS[0]):
+        if method not in METHODS:
+            raise ValueError(f"未知的支付方式: {method}")
+        self.visit_id = int(visit_id)
+        self.items = [(name, _money(amount)) for name, amount in items if _money(amount) != 0]
+        if any(amount < 0 for _, amount in self.items):
+            raise ValueError(f"就诊 {self.visit_id} 的费用不能为负数")
+        self.method = method
+
+    @property
+    def total(self):
+        return sum((amount for _, amount in self.items), Decimal("0.00"))
+
+
+class SettleResult:
+    def __init__(self, settled, skipped, total, duplicate=False):
+        self.settled = settled          # 本次结清的 visit_id
+        self.skipped = skipped          # 已结清 / 不存在而跳过的 visit_id
+        self.total = total
+        self.duplicate = duplicate
+
+    def summary(self):
+        text = f"结清 {len(self.settled)} 人，合计 ¥ {self.total:,.2f}"
+        if self.skipped:
+            text += f"；{len(self.skipped)} 条已结清或不存在，已跳过（{', '.join(map(str, self.skipped))}）"
+        return text
+
+
+def _previous(cursor, request_key):
+    cursor.execute(
+        "SELECT visit_id, amount FROM Payments WHERE request_key = %s ORDER BY visit_id FOR SHARE", (request_key,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    return SettleResult([r[0] for r in rows], [], sum((r[1] for r in rows), Decimal("0.00")), duplicate=True)
+
+
+def settle(bills, request_key=None):
+    """在一个事务中结清多条就诊，返回 SettleResult"""
+    bills = {b.visit_id: b for b in bills}
+    if not bills:
+        return SettleResult([], [], Decimal("0.00"))
+    visit_ids = sorted(bills)
+    placeholders = ", ".join(["%s"] * len(visit_ids))
+
+    with db_transaction() as cursor:
+        # 先锁就诊行（不论状态）：同一 request_key 的并发重复提交在这里排队
+        cursor.execute(
+            f"SELECT visit_id, status FROM Visits WHERE visit_id IN ({placeholders}) ORDER BY visit_id FOR UPDATE",
+            tuple(visit_ids),
+        )
+        payable = [visit_id for visit_id, status in cursor.fetchall() if status == "ToPay"]
+        # 拿到锁后再用加锁读查幂等键，读到前一个事务已提交的收费记录，而不是事务快照
+        if request_key:
+            previous = _previous(cursor, request_key)
+            if previous is not None:
+                return previous
+
+        skipped = sorted(set(visit_ids) - set(payable))
+        if not payable:
+            return SettleResult([], skipped, Decimal("0.00"))
+
+        cursor.executemany(
+            "UPDATE Visits SET status = 'Finished', total_fee = %s, finish_time = NOW() WHERE visit_id = %s",
+            [(bills[v].total, v) for v in payable],
+        )
+        cursor.executemany(
+            "INSERT INTO Payments (visit_id, method, amount, request_key) VALUES (%s, %s, %s, %s)",
+            [(v, bills[v].method, bills[v].total, request_key) for v in payable],
+        )
+        paid = ", ".join(["%s"] * len(payable))
+        cursor.execute(f"SELECT visit_id, payment_id FROM Payments WHERE visit_id IN ({paid})", tuple(payable))
+        payment_ids = dict(cursor.fetchall())
+        items = [(payment_ids[v], name, amount) for v in payable for name, amount in bills[v].items]
+        if items:
+            cursor.executemany(
+                "INSERT INTO PaymentItems (payment_id, item_name, amount) VALUES (%s, %s, %s)", items
+            )
+        reports.record_settlement(cursor, payable)
+
+    return SettleResult(payable, skipped, sum((bills[v].total for v in payable), Decimal("0.00")))
+
+
+def settle_visit(visit_id, items, method=METHODS[0], request_key=None):
+    """结清单条就诊，返回是否结清"""
+    return bool(settle([Bill(visit_id, items, method)], request_key).settled)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""查询埋点与慢查询分析
+
+db.py 中的 run_query / run_action / call_procedure 以及 db_transaction() 交出的游标
+每执行一条语句都会调用 record()，样本存入进程级环形缓冲区（最近 SAMPLE_LIMIT 条），
+summary() 按 (调用位置, SQL 模板) 汇总 p50 / p95 / p99，供管理员面板找出最该加索引的语句。
+
+页面耗时：app.py 每次执行用 PageTimer 分段计时（导入依赖 / 侧边栏 / 加载视图 / 渲染），
+进程内第一次执行记为冷启动；views.load() 记录各页面模块首次导入的耗时。
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+SAMPLE_LIMIT = int(os.environ.get("HOSPITAL_PROFILE_SAMPLES", 5000))
+PAGE_SAMPLE_LIMIT = 1000
+# 最多保留多少条 SQL 模板的最近参数（按最近使用淘汰）
+PARAMS_LIMIT = 500
+
+_samples = deque(maxlen=SAMPLE_LIMIT)
+_page_runs = deque(maxlen=PAGE_SAMPLE_LIMIT)
+_imports = {}
+_cold_lock = threading.Lock()
+_cold_run = None
+# SQL 模板 -> 最近一次的参数，供 EXPLAIN 使用
+_last_params = OrderedDict()
+_params_lock = threading.Lock()
+
+_SKIP_FILES = ("db.py", "profiling.py")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    return _WS_RE.sub(" ", sql).strip()
+
+
+def call_site():
+    """调用栈中第一个不在 db.py / profiling.py 里的位置，如 queues.py:58 fetch_topay_visits"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        name = os.path.basename(code.co_filename)
+        if name not in _SKIP_FILES:
+            return f"{name}:{frame.f_lineno} {code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def record(kind, sql, params, elapsed, rows=None, nbytes=None, acquire=None):
+    """记录一次语句执行；elapsed / acquire 单位为秒"""
+    template = normalize(sql)
+    _samples.append((time.time(), kind, call_site(), template, elapsed, rows, nbytes, acquire))
+    if params is not None:
+        with _params_lock:
+            _last_params[template] = params
+            _last_params.move_to_end(template)
+            if len(_last_params) > PARAMS_LIMIT:
+                _last_params.popitem(last=False)
+
+
+def samples():
+    return pd.DataFrame(
+        list(_samples),
+        columns=["时间", "类型", "调用位置", "SQL", "耗时", "行数", "字节数", "取连接耗时"],
+    )
+
+
+def summary(top=20):
+    """按 (调用位置, SQL) 汇总，按 p95 降序返回前 top 条"""
+    df = samples()
+    if df.empty:
+        return df
+    df["耗时"] *= 1000
+    df["取连接耗时"] = pd.to_numeric(df["取连接耗时"]) * 1000
+    grouped = df.groupby(["调用位置", "类型", "SQL"])
+    out = grouped["耗时"].agg(
+        次数="count",
+        p50_ms=lambda s: s.quantile(0.50),
+        p95_ms=lambda s: s.quantile(0.95),
+        p99_ms=lambda s: s.quantile(0.99),
+        总耗时_ms="sum",
+    )
+    out["平均行数"] = grouped["行数"].mean()
+    out["平均字节数"] = grouped["字节数"].mean()
+    out["平均取连接_ms"] = grouped["取连接耗时"].mean()
+    return out.sort_values("p95_ms", ascending=False).head(top).round(2).reset_index()
+
+
+def explain(sql):
+    """用最近一次的参数对 SELECT 语句执行 EXPLAIN"""
+    from db import run_query
+
+    template = normalize(sql)
+    if not template.upper().startswith("SELECT"):
+        raise ValueError("只能对 SELECT 语句执行 EXPLAIN")
+    with _params_lock:
+        params = _last_params.get(template)
+    return run_query("EXPLAIN " + template, params)
+
+
+def clear():
+    _samples.clear()
+    _page_runs.clear()
+    with _params_lock:
+        _last_params.clear()
+
+
+class PageTimer:
+    """一次页面执行的分段耗时：with timer.stage("渲染"): ...，结束时调用 finish()"""
+
+    def __init__(self, view=None, import_seconds=0.0):
+        self.view = view
+        self.stages = {"导入依赖": import_seconds} if import_seconds else {}
+        self._start = time.perf_counter() - import_seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self):
+        global _cold_run
+        run = (time.time(), self.view, time.perf_counter() - self._start, dict(self.stages))
+        with _cold_lock:
+            cold = _cold_run is None
+            if cold:
+                _cold_run = run
+        if not cold:
+            _page_runs.append(run)
+
+
+def record_import(module, elapsed):
+    _imports[module] = elapsed
+
+
+def _run_row(run):
+    ts, view, total, stages = run
+    return {"时间": ts, "视图": view, "总耗时_ms": total * 1000,
+            **{f"{name}_ms": seconds * 1000 for name, seconds in stages.items()}}
+
+
+def page_runs():
+    """冷启动之后的每次页面执行一行：视图、总耗时与各阶段耗时（毫秒）"""
+    return pd.DataFrame([_run_row(run) for run in list(_page_runs)])
+
+
+def page_summary():
+    """按视图汇总页面重跑耗时：p50 / p95 与各阶段平均值"""
+    warm = page_runs()
+    if warm.empty:
+        return warm
+    grouped = warm.groupby("视图")
+    out = grouped["总耗时_ms"].agg(
+        次数="count",
+        p50_ms=lambda s: s.quantile(0.50),
+        p95_ms=lambda s: s.quantile(0.95),
+    )
+    stages = [c for c in warm.columns if c.endswith("_ms") and c != "总耗时_ms"]
+    out = out.join(grouped[stages].mean().add_prefix("平均"))
+    return out.sort_values("p95_ms", ascending=False).round(1).reset_index()
+
+
+def cold_start():
+    """本进程第一次页面执行（冷启动）的分段耗时（毫秒），尚未记录时为 None"""
+    if _cold_run is None:
+        return None
+    row = _run_row(_cold_run)
+    del row["时间"]
+    return {k: round(v, 1) if isinstance(v, float) else v for k, v in row.items()}
+
+
+def import_times():
+    """各页面模块首次导入耗时（含其依赖），毫秒"""
+    return pd.DataFrame(
+        sorted(((m, round(s * 1000, 1)) for m, s in _imports.items()), key=lambda r: -r[1]),
+        columns=["模块", "首次导入_ms"],
+    )
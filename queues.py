@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""前台工作队列：待核验预约 / 待缴费就诊的键集分页查询
+
+按主键做键集（keyset）分页：每页只取 limit + 1 行判断是否还有下一页，
+翻页时以上一页最后一行的 ID 作为游标，不使用 OFFSET。
+依赖 init_db.sql 中的 idx_status_date_dept 与 idx_status_visit_time 两个联合索引。
+"""
+from datetime import timedelta
+
+from db import run_query
+
+PAGE_SIZE = 50
+
+
+def _page(sql, params, limit):
+    df = run_query(sql, tuple(params) + (limit + 1,))
+    has_more = len(df) > limit
+    return df.iloc[:limit], has_more
+
+
+def fetch_pending_appointments(appt_date, dept_id=None, after_id=None, limit=PAGE_SIZE):
+    """某日待核验预约的一页，返回 (DataFrame, 是否还有下一页)"""
+    where = ["a.status = 'Pending'", "a.appt_date = %s"]
+    params = [appt_date]
+    if dept_id is not None:
+        where.append("a.dept_id = %s")
+        params.append(dept_id)
+    if after_id is not None:
+        where.append("a.appt_id > %s")
+        params.append(after_id)
+    sql = f"""
+        SELECT a.appt_id, a.patient_name, a.phone, a.id_card, d.dept_name, a.appt_date
+        FROM Appointments a
+        JOIN Departments d ON a.dept_id = d.dept_id
+        WHERE {' AND '.join(where)}
+        ORDER BY a.appt_id
+        LIMIT %s
+    """
+    return _page(sql, params, limit)
+
+
+def fetch_topay_visits(visit_date=None, dept_id=None, doctor_id=None, after_id=None, limit=PAGE_SIZE):
+    """待缴费就诊的一页，visit_date 为 None 时不限日期"""
+    where = ["v.status = 'ToPay'"]
+    params = []
+    if visit_date is not None:
+        # 用半开区间代替 DATE(visit_time) = ?，保证能走索引
+        where.append("v.visit_time >= %s AND v.visit_time < %s")
+        params += [visit_date, visit_date + timedelta(days=1)]
+    if dept_id is not None:
+        where.append("v.dept_id = %s")
+        params.append(dept_id)
+    if doctor_id is not None:
+        where.append("v.doctor_id = %s")
+        params.append(doctor_id)
+    if after_id is not None:
+        where.append("v.visit_id > %s")
+        params.append(after_id)
+    sql = f"""
+        SELECT v.visit_id, v.patient_name, d.dept_name, s.name as doctor
+        FROM Visits v
+        JOIN Departments d ON v.dept_id = d.dept_id
+        JOIN Staff s ON v.doctor_id = s.staff_id
+        WHERE {' AND '.join(where)}
+        ORDER BY v.visit_id
+        LIMIT %s
+    """
+    return _page(sql, params, limit)
+
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""参考数据缓存：科室 / 诊室 / 员工 / 医生等变化缓慢的下拉选项
+
+进程级 TTL + LRU 缓存，所有会话共享。通过本应用写入的数据在写成功后
+调用 invalidate(表名) 使相关条目失效；其他途径的修改最多延迟 REFDATA_TTL 秒可见。
+
+缓存为所有会话共享，加载时使用缓存自己的读路由：失效后的重新加载留在主库，
+直到副本追上那次写入，避免把副本上的旧数据缓存 REFDATA_TTL 秒。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db import MOCK_MODE, Route, bound_route, run_query
+
+REFDATA_TTL = float(os.environ.get("HOSPITAL_REFDATA_TTL", 300))
+REFDATA_MAXSIZE = 256
+
+# 表名 -> 受影响的缓存标签
+_TABLE_TAGS = {
+    "Departments": ("departments", "doctors", "rooms", "staff"),
+    "Rooms": ("rooms",),
+    "Staff": ("doctors", "staff"),
+}
+
+
+class TTLCache:
+    """带过期时间和容量上限（LRU 淘汰）的线程安全缓存"""
+
+    def __init__(self, ttl=REFDATA_TTL, maxsize=REFDATA_MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        # 标签 -> 失效次数；加载期间标签被失效时丢弃加载结果，不把旧数据存进缓存
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+            generation = self._generations.get(key[0], 0)
+
+        value = loader()
+        # 查询出错时 run_query 返回空表，不缓存，下次重试
+        if getattr(value, "empty", False):
+            return value
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return value
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def invalidate(self, tag, match=None):
+        """删除标签（key 的第一个元素）为 tag 的条目；给出 match 时只删除 match(key) 为真的"""
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [k for k in self._data if k[0] == tag and (match is None or match(k))]
+            for k in stale:
+                del self._data[k]
+            self._stats["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._data), maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_cache = TTLCache()
+_route = Route()
+
+
+def _load(sql, params):
+    with bound_route(_route):
+        return run_query(sql, params)
+
+
+def _cached(key, sql, params=None):
+    if MOCK_MODE:
+        return run_query(sql, params)
+    return _cache.get_or_load(key, lambda: _load(sql, params))
+
+
+def invalidate(*tables):
+    """写入成功后调用，传入被修改的表名"""
+    _route.mark_write()
+    for table in tables:
+        for tag in _TABLE_TAGS.get(table, ()):
+            _cache.invalidate(tag)
+
+
+def clear():
+    _cache.clear()
+
+
+def cache_stats():
+    return _cache.snapshot()
+
+
+def get_departments():
+    return _cached(("departments",), "SELECT dept_id, dept_name FROM Departments")
+
+
+def get_doctors():
+    """全部医生（含已离职，供按医生筛选历史就诊；分配时按 is_active 过滤）"""
+    return _cached(("doctors", None), "SELECT staff_id, name, dept_id, is_active FROM Staff WHERE role='Doctor'")
+
+
+def get_active_doctors(dept_id):
+    """指定科室的在职医生（排班用）"""
+    return _cached(
+        ("doctors", dept_id),
+        "SELECT staff_id, name FROM Staff WHERE dept_id = %s AND role = 'Doctor' AND is_active = 1",
+        (dept_id,),
+    )
+
+
+def get_available_rooms(dept_id=None):
+    if dept_id is None:
+        return _cached(("rooms", None), "SELECT room_no, dept_id FROM Rooms WHERE status='Available'")
+    return _cached(
+        ("rooms", dept_id),
+        "SELECT room_no FROM Rooms WHERE dept_id = %s AND status = 'Available'",
+        (dept_id,),
+    )
+
+
+def get_staff_roster():
+    """员工花名册（含科室名与在职状态）"""
+    sql = """
+        SELECT s.staff_id, s.name, s.role, d.dept_name, s.title, s.phone,
+               CASE WHEN s.is_active = 1 THEN '在职' ELSE '已离职' END as 状态
+        FROM Staff s LEFT JOIN Departments d ON s.dept_id = d.dept_id
+        ORDER BY s.is_active DESC, s.staff_id ASC
+    """
+    return _cached(("staff", "roster"), sql)
+
+
+def get_staff_options():
+    return _cached(("staff", "options"), "SELECT staff_id, name, is_active FROM Staff")
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""门诊收入日汇总表 RevenueDaily 的维护与查询
+
+收银结算（payments.settle）时在同一事务内调用 record_settlement() 增量累加；
+历史数据或汇总出现偏差时用 rebuild_rollup() 按日期区间重算：
+
+    python reports.py rebuild --start 2025-01-01 --end 2025-12-31
+"""
+import argparse
+from datetime import date, timedelta
+
+import archive
+from db import MAX_ROWS, db_transaction, raise_query_errors, run_query
+
+_ROLLUP_UPSERT = """
+    INSERT INTO RevenueDaily (stat_date, dept_id, doctor_id, visit_count, fee_sum)
+    SELECT DATE(finish_time), dept_id, doctor_id, COUNT(*), SUM(total_fee)
+    FROM Visits
+    WHERE visit_id IN ({ids}) AND status = 'Finished'
+    GROUP BY DATE(finish_time), dept_id, doctor_id
+    ON DUPLICATE KEY UPDATE visit_count = visit_count + VALUES(visit_count), fee_sum = fee_sum + VALUES(fee_sum)
+"""
+
+_REPORT_SQL = {
+    "按科室统计": """
+        SELECT d.dept_name as 维度, SUM(r.visit_count) as 就诊人次, SUM(r.fee_sum) as 总收入
+        FROM RevenueDaily r JOIN Departments d ON r.dept_id = d.dept_id
+        WHERE r.stat_date BETWEEN %s AND %s
+        GROUP BY d.dept_name
+        ORDER BY d.dept_name
+    """,
+    "按医生统计": """
+        SELECT s.name as 维度, SUM(r.visit_count) as 就诊人次, SUM(r.fee_sum) as 总收入
+        FROM RevenueDaily r JOIN Staff s ON r.doctor_id = s.staff_id
+        WHERE r.stat_date BETWEEN %s AND %s
+        GROUP BY s.name
+        ORDER BY s.name
+    """,
+    "按日期统计": """
+        SELECT r.stat_date as 维度, SUM(r.visit_count) as 就诊人次, SUM(r.fee_sum) as 总收入
+        FROM RevenueDaily r
+        WHERE r.stat_date BETWEEN %s AND %s
+        GROUP BY r.stat_date
+        ORDER BY r.stat_date
+    """,
+    # 收费流水只追加，按支付方式统计直接汇总 Payments
+    "按支付方式统计": """
+        SELECT p.method as 维度, COUNT(*) as 就诊人次, SUM(p.amount) as 总收入
+        FROM Payments p
+        WHERE p.paid_at >= %s AND p.paid_at < DATE_ADD(%s, INTERVAL 1 DAY)
+        GROUP BY p.method
+        ORDER BY p.method
+    """,
+}
+
+REPORT_DIMENSIONS = list(_REPORT_SQL)
+
+
+def record_settlement(cursor, visit_ids):
+    """把刚结算（status='Finished'）的一批就诊累加进日汇总，需在结算事务内调用"""
+    cursor.execute(_ROLLUP_UPSERT.format(ids=", ".join(["%s"] * len(visit_ids))), tuple(visit_ids))
+
+
+def revenue_report(group_by, start_date, end_date, max_rows=MAX_ROWS):
+    # 多取一行供 run_query 标记截断，游标总能读完，连接可以归还连接池而不必关闭
+    return run_query(_REPORT_SQL[group_by] + "    LIMIT %s\n", (start_date, end_date, max_rows + 1), max_rows=max_rows)
+
+
+def rebuild_rollup(start_date=None, end_date=None):
+    """从 Visits 重算 [start_date, end_date] 区间的日汇总，返回写入的汇总行数
+
+    两端均为 None 时重建全表。区间早于归档水位时同时统计 VisitsArchive。
+    """
+    where, params = ["status = 'Finished'", "finish_time IS NOT NULL"], []
+    del_where, del_params = [], []
+    if start_date is not None:
+        where.append("finish_time >= %s")
+        params.append(start_date)
+        del_where.append("stat_date >= %s")
+        del_params.append(start_date)
+    if end_date is not None:
+        where.append("finish_time < %s")
+        params.append(end_date + timedelta(days=1))
+        del_where.append("stat_date <= %s")
+        del_params.append(end_date)
+
+    # 重算会先删除区间内的汇总，归档水位必须是最新的且查询成功
+    with raise_query_errors():
+        tables = archive.tables_for("Visits", start_date, refresh=True)
+    with db_transaction() as cursor:
+        cursor.execute(
+            "DELETE FROM RevenueDaily" + (" WHERE " + " AND ".join(del_where) if del_where else ""),
+            tuple(del_params),
+        )
+        source = " UNION ALL ".join(
+            f"SELECT finish_time, dept_id, doctor_id, total_fee FROM {table} WHERE {' AND '.join(where)}"
+            for table in tables
+        )
+        cursor.execute(f"""
+            INSERT INTO RevenueDaily (stat_date, dept_id, doctor_id, visit_count, fee_sum)
+            SELECT DATE(finish_time), dept_id, doctor_id, COUNT(*), SUM(total_fee)
+            FROM ({source}) v
+            GROUP BY DATE(finish_time), dept_id, doctor_id
+        """, tuple(params) * len(tables))
+        return cursor.rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="门诊收入日汇总维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="从 Visits（及归档）重算日汇总（不指定日期则重建全表）")
+    p_rebuild.add_argument("--start", type=date.fromisoformat, help="起始日期 YYYY-MM-DD")
+    p_rebuild.add_argument("--end", type=date.fromisoformat, help="结束日期 YYYY-MM-DD（含）")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        with raise_query_errors():
+            rows = rebuild_rollup(args.start, args.end)
+        print(f"日汇总重建完成，写入 {rows} 行")
+
+
+if __name__ == "__main__":
+    main()
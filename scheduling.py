@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""排班：单条保存与按日期区间批量生成
+
+批量排班先一次性读出区间内已有排班，建立 (医生, 日期, 时段) 与 (诊室, 日期, 时段)
+两个占用索引，在内存中按轮转规则分配并跳过冲突，最后在一个事务里批量插入。
+插入依赖 Schedules 的 unique_doctor_shift / unique_room_shift 兜底：
+若生成预览后有人并发写入，整批回滚，重新生成即可。
+保存排班时在同一事务内重算对应日期的预约号源容量（见 slots.py）。
+"""
+from datetime import timedelta
+
+import slots
+from db import db_transaction, run_query
+
+SHIFTS = ["Morning", "Afternoon"]
+
+# 轮转方式 -> 每推进多少个时段轮换一次医生与诊室的对应关系
+PATTERNS = {
+    "固定诊室": None,
+    "按时段轮转": "shift",
+    "按天轮转": "day",
+    "按周轮转": "week",
+}
+
+
+class OccupancyIndex:
+    """已有排班的占用索引，O(1) 判断医生 / 诊室某时段是否已被占用"""
+
+    def __init__(self, rows=()):
+        self.doctors = set()
+        self.rooms = {}
+        for doctor_id, room_no, shift_date, shift_time in rows:
+            self.add(doctor_id, room_no, shift_date, shift_time)
+
+    @classmethod
+    def load(cls, start_date, end_date):
+        df = run_query(
+            "SELECT doctor_id, room_no, shift_date, shift_time FROM Schedules WHERE shift_date BETWEEN %s AND %s",
+            (start_date, end_date),
+        )
+        return cls(df.itertuples(index=False, name=None))
+
+    def doctor_busy(self, doctor_id, shift_date, shift_time):
+        return (doctor_id, shift_date, shift_time) in self.doctors
+
+    def room_holder(self, room_no, shift_date, shift_time):
+        return self.rooms.get((room_no, shift_date, shift_time))
+
+    def add(self, doctor_id, room_no, shift_date, shift_time):
+        self.doctors.add((doctor_id, shift_date, shift_time))
+        self.rooms[(room_no, shift_date, shift_time)] = doctor_id
+
+
+class SchedulePlan:
+    def __init__(self):
+        self.rows = []        # (doctor_id, shift_date, shift_time, room_no)
+        self.conflicts = []   # {"日期", "时段", "对象", "原因"}
+
+    def conflict(self, shift_date, shift_time, target, reason):
+        self.conflicts.append({"日期": shift_date, "时段": shift_time, "对象": target, "原因": reason})
+
+
+def _rotation_offset(pattern, day_index, shift_index, shift_date, n_shifts):
+    unit = PATTERNS[pattern]
+    if unit == "shift":
+        return day_index * n_shifts + shift_index
+    if unit == "day":
+        return day_index
+    if unit == "week":
+        return shift_date.isocalendar()[1]
+    return 0
+
+
+def plan_schedule(doctor_ids, room_nos, start_date, end_date, shifts=SHIFTS,
+                  weekdays=range(7), pattern="按天轮转", occupancy=None):
+    """生成 [start_date, end_date] 的排班计划（不写库）
+
+    每个时段为每间诊室按轮转顺序挑选一位当时段空闲的医生，
+    与已有排班冲突的诊室 / 医生会被跳过并记入 plan.conflicts。
+    """
+    plan = SchedulePlan()
+    if not doctor_ids or not room_nos:
+        return plan
+    occupancy = occupancy or OccupancyIndex.load(start_date, end_date)
+    weekdays = set(weekdays)
+    n_doc = len(doctor_ids)
+
+    day_index = 0
+    d = start_date
+    while d <= end_date:
+        if d.weekday() in weekdays:
+            for shift_index, shift in enumerate(shifts):
+                offset = _rotation_offset(pattern, day_index, shift_index, d, len(shifts))
+                candidates = [doctor_ids[(offset + i) % n_doc] for i in range(n_doc)]
+                for doc in candidates:
+                    if occupancy.doctor_busy(doc, d, shift):
+                        plan.conflict(d, shift, f"医生 {doc}", "该时段已有排班")
+                candidates = [doc for doc in candidates if not occupancy.doctor_busy(doc, d, shift)]
+                for room in room_nos:
+                    holder = occupancy.room_holder(room, d, shift)
+                    if holder is not None:
+                        plan.conflict(d, shift, f"诊室 {room}", f"已由医生 {holder} 占用")
+                        continue
+                    if not candidates:
+                        plan.conflict(d, shift, f"诊室 {room}", "无空闲医生可分配")
+                        continue
+                    doc = candidates.pop(0)
+                    occupancy.add(doc, room, d, shift)
+                    plan.rows.append((doc, d, shift, room))
+            day_index += 1
+        d += timedelta(days=1)
+    return plan
+
+
+def save_plan(plan):
+    """单事务批量写入计划，返回写入行数；任一行违反唯一约束则整批回滚并抛出异常"""
+    if not plan.rows:
+        return 0
+    with db_transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO Schedules (doctor_id, shift_date, shift_time, room_no) VALUES (%s, %s, %s, %s)",
+            plan.rows,
+        )
+        dates = [row[1] for row in plan.rows]
+        slots.refresh_capacity(cursor, min(dates), max(dates))
+    slots.invalidate()
+    return len(plan.rows)
+
+
+def save_single(doctor_id, room_no, shift_date, shift_time):
+    """保存一条排班；诊室该时段已被其他医生占用时返回该医生 ID，成功返回 None
+
+    冲突检查与写入在同一事务中完成，FOR UPDATE 锁住 unique_room_shift 上的记录（或间隙），
+    避免两人同时给同一诊室排班。医生已有该时段排班时改为新诊室。
+    """
+    with db_transaction() as cursor:
+        cursor.execute(
+            "SELECT doctor_id FROM Schedules WHERE room_no = %s AND shift_date = %s AND shift_time = %s FOR UPDATE",
+            (room_no, shift_date, shift_time),
+        )
+        row = cursor.fetchone()
+        if row and row[0] != doctor_id:
+            return row[0]
+        cursor.execute("""
+            INSERT INTO Schedules (doctor_id, shift_date, shift_time, room_no)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE room_no = VALUES(room_no)
+        """, (doctor_id, shift_date, shift_time, room_no))
+        slots.refresh_capacity(cursor, shift_date, shift_date)
+    slots.invalidate()
+    return None
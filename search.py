@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""患者档案检索：按输入类型路由到对应索引
+
+- 18 位身份证号      -> id_card 等值查询（idx_visit_id_card）
+- 5 位及以上纯数字   -> phone 前缀查询（idx_visit_phone）
+- 其余短编号         -> room_no 等值查询（idx_room_time）
+- 姓名（2 字及以上） -> ngram 全文索引（ft_patient_name），按相关度取前 N 条
+- 单字姓名           -> patient_name 前缀查询（idx_patient_name）
+
+除姓名全文检索外，结果按就诊时间倒序做键集分页。
+已归档的就诊（VisitsArchive）只在热表结果不足一页、或本页可能跨过归档水位时才查询。
+"""
+import re
+
+import pandas as pd
+
+import archive
+from db import run_query
+
+PAGE_SIZE = 50
+# 姓名全文检索只返回相关度最高的前 N 条
+NAME_TOP_N = 100
+
+_ID_CARD_RE = re.compile(r"^\d{17}[\dXx]$")
+_PHONE_RE = re.compile(r"^\d{5,}$")
+_ROOM_RE = re.compile(r"^[A-Za-z]?\d{1,4}[A-Za-z]?$")
+
+_COLUMNS = """
+    SELECT v.visit_id, v.patient_name, v.gender, v.phone, v.id_card,
+           d.dept_name, v.room_no, v.visit_time, v.status, v.total_fee
+    FROM {table} v
+    LEFT JOIN Departments d ON v.dept_id = d.dept_id
+"""
+
+MODE_LABELS = {
+    "id_card": "身份证号精确匹配",
+    "phone": "手机号前缀匹配",
+    "room": "诊室号精确匹配",
+    "name": "姓名全文检索",
+    "name_prefix": "姓氏前缀匹配",
+}
+
+
+def classify(term):
+    """判断检索词类型"""
+    if _ID_CARD_RE.match(term):
+        return "id_card"
+    if _PHONE_RE.match(term):
+        return "phone"
+    if _ROOM_RE.match(term):
+        return "room"
+    return "name" if len(term) >= 2 else "name_prefix"
+
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _merge(df, older):
+    if older.empty:
+        return df
+    if df.empty:
+        return older
+    return pd.concat([df, older], ignore_index=True)
+
+
+def search_visits(term, after=None, limit=PAGE_SIZE):
+    """返回 (DataFrame, 是否还有下一页, 检索类型)
+
+    after 为上一页最后一行的 (visit_time, visit_id)，姓名全文检索不分页。
+    """
+    term = term.strip()
+    mode = classify(term)
+
+    if mode == "name":
+        # 双引号短语检索，精确同名排最前，其次按相关度和就诊时间
+        sql = """
+            WHERE MATCH(v.patient_name) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY v.patient_name = %s DESC,
+                     MATCH(v.patient_name) AGAINST (%s IN BOOLEAN MODE) DESC,
+                     v.visit_time DESC
+            LIMIT %s
+        """
+        phrase = '"' + term.replace('"', "") + '"'
+        df = run_query(_COLUMNS.format(table="Visits") + sql, (phrase, term, phrase, NAME_TOP_N))
+        # 在线数据不足 N 条时再从归档中补齐，近期就诊排在前面
+        if len(df) < NAME_TOP_N and archive.needs_archive("Visits"):
+            older = run_query(_COLUMNS.format(table="VisitsArchive") + sql,
+                              (phrase, term, phrase, NAME_TOP_N - len(df)))
+            df = _merge(df, older)
+        return df, False, mode
+
+    if mode == "id_card":
+        where, params = "v.id_card = %s", [term.upper()]
+    elif mode == "phone":
+        where, params = "v.phone LIKE %s", [_escape_like(term) + "%"]
+    elif mode == "room":
+        where, params = "v.room_no = %s", [term]
+    else:
+        where, params = "v.patient_name LIKE %s", [_escape_like(term) + "%"]
+
+    if after is not None:
+        where += " AND (v.visit_time < %s OR (v.visit_time = %s AND v.visit_id < %s))"
+        params += [after[0], after[0], after[1]]
+    sql = f"""
+        WHERE {where}
+        ORDER BY v.visit_time DESC, v.visit_id DESC
+        LIMIT %s
+    """
+    params = tuple(params) + (limit + 1,)
+    df = run_query(_COLUMNS.format(table="Visits") + sql, params)
+    # 归档行的就诊时间都不晚于归档水位：热表已取满一页且第 limit+1 行仍晚于水位时，归档行不会出现在本页
+    h = archive.horizon("Visits")
+    if h is not None and (len(df) <= limit or df["visit_time"].iloc[limit].date() <= h):
+        older = run_query(_COLUMNS.format(table="VisitsArchive") + sql, params)
+        df = _merge(df, older)
+        if len(older):
+            df = df.sort_values(["visit_time", "visit_id"], ascending=False, ignore_index=True).head(limit + 1)
+    return df.iloc[:limit], len(df) > limit, mode
+
+
+def next_cursor(df):
+    """当前页最后一行的 (visit_time, visit_id)，作为下一页的游标"""
+    last = df.iloc[-1]
+    return last["visit_time"].to_pydatetime(), int(last["visit_id"])
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""预约号源：按排班计算 (科室, 日期, 时段) 的容量，预约时原子占号
+
+容量 = 该时段在职出诊医生数 × PER_DOCTOR，保存在 SlotCapacity 中；排班保存时在同一事务内
+调用 refresh_capacity() 重算受影响日期的容量，已约人数 booked 不变（容量缩小时该时段显示约满）。
+预约时用一条 UPDATE ... SET booked = booked + 1 WHERE booked < capacity 条件自增占号，
+影响行数为 0 即约满，事务回滚并返回同科室其他可约时段；成功才写入 Appointments。
+可约时段查询只读 SlotCapacity 主键范围（科室 + 日期区间），结果短时缓存，避免集中放号时反复查询。
+
+rebuild() 按 Schedules / Appointments 整体重算；bulk.py 导入预约 / 员工与人员变动后会自动调用，
+绕过应用直接改库后可手动执行：
+
+    python slots.py rebuild --days 14
+"""
+import argparse
+import os
+from datetime import date, datetime, time, timedelta
+
+from db import MOCK_MODE, Route, bound_route, db_transaction, raise_query_errors, run_query
+from refdata import TTLCache
+
+PER_DOCTOR = int(os.environ.get("HOSPITAL_SLOT_PER_DOCTOR", 20))
+# 患者可预约今天起多少天内的号源
+BOOKING_DAYS = 14
+ALTERNATIVES = 6
+SLOT_TTL = 5
+
+SHIFT_LABELS = {"Morning": "上午", "Afternoon": "下午"}
+# 各时段可选的到达时间 [开始, 结束)
+SHIFT_HOURS = {"Morning": (time(8, 0), time(12, 0)), "Afternoon": (time(13, 30), time(17, 30))}
+
+_CAPACITY_UPSERT = """
+    INSERT INTO SlotCapacity (dept_id, slot_date, shift_time, capacity)
+    SELECT st.dept_id, sc.shift_date, sc.shift_time, COUNT(*) * %s
+    FROM Schedules sc
+    JOIN Staff st ON sc.doctor_id = st.staff_id
+    WHERE sc.shift_date BETWEEN %s AND %s AND st.role = 'Doctor' AND st.is_active = 1
+    GROUP BY st.dept_id, sc.shift_date, sc.shift_time
+    ON DUPLICATE KEY UPDATE capacity = VALUES(capacity)
+"""
+
+_cache = TTLCache(ttl=SLOT_TTL)
+_route = Route()
+
+
+def shift_of(arrival_time):
+    return "Morning" if arrival_time < time(12, 0) else "Afternoon"
+
+
+def _as_date(value):
+    # pd.Timestamp 也是 datetime 的子类
+    return value.date() if isinstance(value, datetime) else value
+
+
+def slot_label(slot_date, shift_time, remaining=None):
+    text = f"{_as_date(slot_date)} {SHIFT_LABELS[shift_time]}"
+    return text if remaining is None else f"{text}（剩余 {remaining}）"
+
+
+class BookingResult:
+    def __init__(self, appt_id=None, message="", alternatives=None):
+        self.appt_id = appt_id
+        self.message = message
+        self.alternatives = alternatives   # 约满时同科室其他可约时段（DataFrame）
+
+    @property
+    def ok(self):
+        return self.appt_id is not None
+
+
+def refresh_capacity(cursor, start_date, end_date):
+    """按 Schedules 重算 [start_date, end_date] 各时段容量，需在排班写入的事务内调用，提交后再调用 invalidate()"""
+    # 先清零再按排班回填，撤掉的排班对应时段容量归零；同一事务内预约看不到中间状态
+    cursor.execute(
+        "UPDATE SlotCapacity SET capacity = 0 WHERE slot_date BETWEEN %s AND %s", (start_date, end_date)
+    )
+    cursor.execute(_CAPACITY_UPSERT, (PER_DOCTOR, start_date, end_date))
+
+
+def rebuild(start_date=None, end_date=None):
+    """整体重算 [start_date, end_date]（默认为可预约窗口）的容量与已约人数，返回涉及的时段数"""
+    start_date = start_date or date.today()
+    end_date = end_date or start_date + timedelta(days=BOOKING_DAYS - 1)
+    with db_transaction() as cursor:
+        refresh_capacity(cursor, start_date, end_date)
+        cursor.execute("""
+            UPDATE SlotCapacity sc
+            LEFT JOIN (
+                SELECT dept_id, appt_date,
+                       IF(expected_arrival_time < '12:00:00', 'Morning', 'Afternoon') AS shift_time,
+                       COUNT(*) AS n
+                FROM Appointments
+                WHERE status IN ('Pending', 'Completed') AND appt_date BETWEEN %s AND %s
+                GROUP BY dept_id, appt_date, shift_time
+            ) a ON a.dept_id = sc.dept_id AND a.appt_date = sc.slot_date AND a.shift_time = sc.shift_time
+            SET sc.booked = COALESCE(a.n, 0)
+            WHERE sc.slot_date BETWEEN %s AND %s
+        """, (start_date, end_date, start_date, end_date))
+        cursor.execute("SELECT COUNT(*) FROM SlotCapacity WHERE slot_date BETWEEN %s AND %s", (start_date, end_date))
+        rows = cursor.fetchone()[0]
+    invalidate()
+    return rows
+
+
+def invalidate():
+    """容量重算提交后调用：清空全部余号缓存，之后共享缓存的加载先读主库"""
+    _route.mark_write()
+    _cache.invalidate("slots")
+
+
+def _load_slots(dept_id, start_date, end_date):
+    with bound_route(_route):
+        return run_query("""
+            SELECT slot_date, shift_time, capacity, booked, capacity - booked AS remaining
+            FROM SlotCapacity
+            WHERE dept_id = %s AND slot_date BETWEEN %s AND %s AND booked < capacity
+            ORDER BY slot_date, shift_time
+        """, (dept_id, start_date, end_date))
+
+
+def available_slots(dept_id, start_date=None, end_date=None):
+    """科室在 [start_date, end_date] 内仍有余号的时段，默认今天起 BOOKING_DAYS 天
+
+    今天已经结束的时段不返回。结果最多缓存 SLOT_TTL 秒，是否真能约上以 book() 为准。
+    """
+    start_date = start_date or date.today()
+    end_date = end_date or date.today() + timedelta(days=BOOKING_DAYS - 1)
+    key = ("slots", int(dept_id), start_date, end_date)
+    if MOCK_MODE:
+        df = _load_slots(*key[1:])
+    else:
+        df = _cache.get_or_load(key, lambda: _load_slots(*key[1:]))
+    if df.empty:
+        return df
+    now = datetime.now()
+    open_now = [not _ended(d, s, now) for d, s in zip(df["slot_date"], df["shift_time"])]
+    return df[open_now].reset_index(drop=True)
+
+
+def _ended(slot_date, shift_time, now):
+    return datetime.combine(_as_date(slot_date), SHIFT_HOURS[shift_time][1]) <= now
+
+
+def book(name, phone, id_card, dept_id, appt_date, arrival_time):
+    """占号并写入预约，返回 BookingResult；约满时附带同科室其他可约时段"""
+    appt_date = _as_date(appt_date)
+    shift = shift_of(arrival_time)
+    begin, end = SHIFT_HOURS[shift]
+    if not begin <= arrival_time < end:
+        return BookingResult(message=f"到达时间需在 {begin:%H:%M}–{end:%H:%M} 之间")
+    if not date.today() <= appt_date < date.today() + timedelta(days=BOOKING_DAYS):
+        return BookingResult(message=f"只能预约今天起 {BOOKING_DAYS} 天内的号源")
+    if datetime.combine(appt_date, arrival_time) <= datetime.now():
+        return BookingResult(message="到达时间已过，请重新选择")
+
+    with db_transaction() as cursor:
+        cursor.execute("""
+            UPDATE SlotCapacity SET booked = booked + 1
+            WHERE dept_id = %s AND slot_date = %s AND shift_time = %s AND booked < capacity
+        """, (dept_id, appt_date, shift))
+        if cursor.rowcount == 1:
+            cursor.execute("""
+                INSERT INTO Appointments (patient_name, phone, dept_id, appt_date, expected_arrival_time, status, id_card)
+                VALUES (%s, %s, %s, %s, %s, 'Pending', %s)
+            """, (name, phone, dept_id, appt_date, arrival_time, id_card))
+            appt_id = cursor.lastrowid
+        else:
+            appt_id = None
+    if appt_id is not None:
+        # 只让本科室包含该日期的缓存失效，其他科室的余号靠 SLOT_TTL 过期；
+        # 读主库由 db_transaction 标记在预约会话的 Route 上，不影响共享缓存的读路由
+        _cache.invalidate("slots", lambda key: key[1] == int(dept_id) and key[2] <= appt_date <= key[3])
+        return BookingResult(appt_id, f"预约成功：{slot_label(appt_date, shift)}")
+
+    return BookingResult(
+        message=f"{slot_label(appt_date, shift)} 号源已约满或未开放",
+        alternatives=available_slots(dept_id, appt_date).head(ALTERNATIVES),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预约号源维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="按排班与预约重算号源容量和已约人数")
+    p_rebuild.add_argument("--start", type=date.fromisoformat, default=date.today(), help="起始日期 YYYY-MM-DD")
+    p_rebuild.add_argument("--days", type=int, default=BOOKING_DAYS)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        end = args.start + timedelta(days=args.days - 1)
+        with raise_query_errors():
+            rows = rebuild(args.start, end)
+        print(f"{args.start} ~ {end} 号源重算完成，共 {rows} 个时段")
+
+
+if __name__ == "__main__":
+    main()
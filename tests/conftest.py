@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# 模块都在仓库根目录（扁平结构），测试直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """按 SQL 片段返回预设结果的游标，记录执行过的语句
+
+    responses: [(SQL 片段, 结果行列表)]，execute 时取第一个片段出现在 SQL 中的结果。
+    """
+
+    def __init__(self, responses=(), lastrowid=None, rowcount=1):
+        self.responses = list(responses)
+        self.executed = []
+        self.lastrowid = lastrowid
+        self.rowcount = rowcount
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+        self._rows = next((list(rows) for fragment, rows in self.responses if fragment in sql), [])
+
+    def executemany(self, sql, seq_params):
+        self.executed.append((" ".join(sql.split()), list(seq_params)))
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def statements(self):
+        return [sql for sql, _ in self.executed]
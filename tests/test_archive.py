@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+import pandas as pd
+
+import archive
+
+
+def test_failed_horizon_lookup_is_not_cached(monkeypatch):
+    results = [pd.DataFrame(), pd.DataFrame({"h": [date(2025, 3, 31)]})]
+    monkeypatch.setattr(archive, "run_query", lambda sql, params=None: results.pop(0))
+    monkeypatch.setattr(archive, "_horizons", {})
+    assert archive.horizon("Appointments") is None
+    assert archive.horizon("Appointments") == date(2025, 3, 31)
+    assert not results
+
+
+def test_failed_refresh_keeps_previous_horizon(monkeypatch):
+    monkeypatch.setattr(archive, "run_query", lambda sql, params=None: pd.DataFrame())
+    monkeypatch.setattr(archive, "_horizons", {"Appointments": (date(2025, 3, 31), 0.0)})
+    assert archive.horizon("Appointments", refresh=True) == date(2025, 3, 31)
+    assert archive._horizons["Appointments"][1] == 0.0
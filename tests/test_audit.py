@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+import pytest
+
+import audit
+
+
+def _entry(sql="UPDATE Visits SET status = 'Finished' WHERE visit_id = %s", params="[1]"):
+    return (time.time(), "前台", None, "execute", sql, params, 1, 0.001, "commit", None)
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    monkeypatch.setattr(audit, "FLUSH_INTERVAL", 0.3)
+    writer = audit.AuditWriter()
+    writer.flushes = []
+    writer._write_db = lambda batch: writer.flushes.append(len(batch))
+    yield writer
+    writer.close()
+
+
+def test_writer_batches_entries_within_flush_interval(writer):
+    for _ in range(5):
+        writer.record([_entry()])
+        time.sleep(0.02)
+    time.sleep(0.6)
+    assert writer.flushes == [5]
+    assert writer.stats()["written"] == 5
+
+
+def test_writer_flushes_at_batch_size(writer, monkeypatch):
+    monkeypatch.setattr(audit, "FLUSH_BATCH", 3)
+    writer.record([_entry() for _ in range(7)])
+    time.sleep(0.8)
+    assert writer.flushes[:2] == [3, 3]
+    assert sum(writer.flushes) == 7
+
+
+def test_writer_falls_back_to_file_when_db_fails(writer):
+    written = []
+
+    def fail(batch):
+        raise RuntimeError("db down")
+
+    writer._write_db = fail
+    writer._write_file = written.extend
+    writer.record([_entry(), _entry()])
+    writer.close()
+    assert len(written) == 2
+    assert writer.stats()["to_file"] == 2
+
+
+def test_close_flushes_pending_entries(writer):
+    writer.record([_entry() for _ in range(4)])
+    writer.close()
+    assert sum(writer.flushes) == 4
+    assert writer.stats()["pending"] == 0
+
+
+def test_record_never_raises(monkeypatch):
+    def broken(entries):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(audit._writer, "record", broken)
+    before = audit.stats()["lost"]
+    audit.record([("execute", "DELETE FROM Visits WHERE visit_id = %s", (1,), 1, 0.001)], "commit")
+    assert audit.stats()["lost"] == before + 1
+
+
+def test_params_text_keeps_batched_rows_and_truncates():
+    assert json.loads(audit._params_text([(1, "医保卡"), (2, "现金")])) == [[1, "医保卡"], [2, "现金"]]
+    text = audit._params_text([(i, "x" * 50) for i in range(1000)])
+    assert len(text) <= audit.PARAMS_MAX + 1
+    assert text.startswith('[[0, "x')
+    assert audit._params_text(None) is None
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from datetime import date, time
+from types import SimpleNamespace
+
+import pytest
+
+import bulk
+
+
+def _columns(kind, *names):
+    return [c for c in bulk.SPECS[kind]["columns"] if c.name in names]
+
+
+def test_parse_row_converts_values_and_applies_defaults():
+    columns = _columns("appointments", "patient_name", "dept_id", "appt_date", "expected_arrival_time", "status")
+    row = bulk._parse_row(columns, {"patient_name": " 张三 ", "dept_id": "3", "appt_date": "2026-03-02 00:00:00",
+                                    "expected_arrival_time": "09:30", "status": ""})
+    assert row == ["张三", 3, date(2026, 3, 2), time(9, 30), "Pending"]
+
+
+def test_parse_row_rejects_missing_required_cell():
+    with pytest.raises(ValueError, match="patient_name 不能为空"):
+        bulk._parse_row(_columns("appointments", "patient_name"), {"patient_name": "  "})
+
+
+@pytest.mark.parametrize("name, cell", [
+    ("dept_id", "三"),
+    ("status", "Done"),
+    ("patient_name", "张" * 51),
+])
+def test_parse_row_prefixes_errors_with_column(name, cell):
+    with pytest.raises(ValueError, match=f"^{name}: "):
+        bulk._parse_row(_columns("appointments", name), {name: cell})
+
+
+def test_bool_accepts_chinese_labels():
+    assert bulk._bool("在职") == 1
+    assert bulk._bool("已离职") == 0
+    with pytest.raises(ValueError):
+        bulk._bool("也许")
+
+
+def test_failed_rebuild_after_import_is_reported(monkeypatch):
+    @contextmanager
+    def transaction():
+        yield SimpleNamespace(executemany=lambda sql, rows: None)
+
+    def fail(*args):
+        raise RuntimeError("lost connection")
+
+    monkeypatch.setattr(bulk, "db_transaction", transaction)
+    monkeypatch.setattr(bulk.slots, "rebuild", fail)
+    day = str(date.today())
+    rows = [["patient_name", "id_card", "phone", "dept_id", "appt_date"],
+            {"patient_name": "张三", "id_card": "1", "phone": "1", "dept_id": "1", "appt_date": day}]
+    result = bulk.import_rows("appointments", rows)
+    assert result.inserted == 1
+    assert result.pending_rebuilds == [(f"python slots.py rebuild --start {day} --days 1", "lost connection")]
+
+
+def test_staff_import_marks_availability_index_stale(monkeypatch):
+    @contextmanager
+    def transaction():
+        yield SimpleNamespace(executemany=lambda sql, rows: None)
+
+    monkeypatch.setattr(bulk, "db_transaction", transaction)
+    monkeypatch.setattr(bulk.slots, "rebuild", lambda *args: None)
+    monkeypatch.setattr(bulk.refdata, "invalidate", lambda *tags: None)
+    index = bulk.availability._index
+    monkeypatch.setattr(index, "_built_at", 1e12)
+    rows = [["name", "role", "dept_id"], {"name": "李四", "role": "Doctor", "dept_id": "1"}]
+    result = bulk.import_rows("staff", rows)
+    assert result.inserted == 1 and not result.pending_rebuilds
+    assert index._built_at == 0.0
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import changefeed
+
+
+class _ChangeLog:
+    """模拟 ChangeLog：change_id 1..size 都是对 Visits 的更新"""
+
+    def __init__(self, size):
+        self.size = size
+
+    def run_query(self, sql, params=None, **kwargs):
+        if "MAX(change_id)" in sql:
+            return pd.DataFrame({"hw": [self.size]})
+        if sql.startswith("SELECT change_id, table_name"):
+            low, limit = params
+            ids = list(range(low + 1, min(self.size, low + limit) + 1))
+            return pd.DataFrame({"change_id": ids, "table_name": "Visits", "row_id": ids, "op": "U"})
+        if sql.startswith("SELECT change_id FROM ChangeLog"):
+            return pd.DataFrame({"change_id": list(range(params[0] + 1, self.size + 1))})
+        if "visit_id" in sql:
+            return pd.DataFrame(columns=["visit_id"])
+        return pd.DataFrame(columns=["appt_id"])
+
+
+def _feed(log, monkeypatch, high_water):
+    monkeypatch.setattr(changefeed, "run_query", log.run_query)
+    feed = changefeed.ChangeFeed()
+    feed._day, feed._high_water = date.today(), high_water
+    return feed
+
+
+def test_poll_drains_backlog_in_one_call(monkeypatch):
+    log = _ChangeLog(3000)
+    feed = _feed(log, monkeypatch, high_water=0)
+    assert feed.poll_once() == 3000
+    assert feed._high_water == 3000
+    assert feed.poll_once() == 0
+
+
+def test_poll_resyncs_snapshot_on_large_backlog(monkeypatch):
+    log = _ChangeLog(100000)
+    feed = _feed(log, monkeypatch, high_water=0)
+    version = feed.version
+    assert feed.poll_once() == 0
+    assert feed._high_water == 100000
+    assert feed.version == version + 1
+
+
+@pytest.mark.parametrize("name, masked", [("张三", "张*"), ("张三丰", "张*丰"), ("", "")])
+def test_mask_name(name, masked):
+    assert changefeed.mask_name(name) == masked
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import errors as mysql_errors
+
+import checkin
+from conftest import FakeCursor
+
+
+@pytest.fixture
+def transaction(monkeypatch):
+    """db_transaction 换成交出指定 FakeCursor 的上下文"""
+    holder = {}
+
+    @contextmanager
+    def fake():
+        yield holder["cursor"]
+
+    monkeypatch.setattr(checkin, "db_transaction", fake)
+
+    def use(cursor):
+        holder["cursor"] = cursor
+        return cursor
+
+    return use
+
+
+def test_check_in_creates_visit(transaction):
+    cursor = transaction(FakeCursor([
+        ("FROM Appointments", [(7, "张三", "138", 2, "Pending")]),
+        ("SELECT appt_id, visit_id FROM Visits", [(7, 70)]),
+    ]))
+    result = checkin.check_in(7, "110", "M", 5, "101", request_key="k1")
+    assert (result.status, result.visit_id) == (checkin.CREATED, 70)
+    assert any(sql.startswith("UPDATE Appointments SET status='Completed'") for sql in cursor.statements())
+
+
+def test_concurrent_duplicate_returns_first_visit(transaction):
+    # 第二个请求拿到预约锁时，第一个请求已提交：预约为 Completed，就诊已存在
+    cursor = transaction(FakeCursor([
+        ("FROM Appointments", [(7, "张三", "138", 2, "Completed")]),
+        ("request_key IN", [(7, 70, "张三")]),
+    ]))
+    result = checkin.check_in(7, "110", "M", 5, "101", request_key="k1")
+    assert (result.status, result.visit_id) == (checkin.DUPLICATE, 70)
+    statements = cursor.statements()
+    assert "FOR UPDATE" in statements[0] and "FROM Appointments" in statements[0]
+    assert all(sql.endswith("FOR SHARE") for sql in statements[1:] if "FROM Visits" in sql)
+
+
+def test_completed_appointment_without_key_returns_existing_visit(transaction):
+    transaction(FakeCursor([
+        ("FROM Appointments", [(7, "张三", "138", 2, "Completed")]),
+        ("appt_id IN", [(7, 70, "张三")]),
+    ]))
+    result = checkin.check_in(7, "110", "M", 5, "101")
+    assert (result.status, result.visit_id) == (checkin.DUPLICATE, 70)
+
+
+def test_check_in_many_reports_each_appointment(transaction):
+    transaction(FakeCursor([
+        ("FROM Appointments", [(1, "甲", "1", 2, "Pending"), (2, "乙", "2", 2, "Cancelled")]),
+        ("SELECT appt_id, visit_id FROM Visits", [(1, 10)]),
+    ]))
+    results = checkin.check_in_many([(2, "b", "F", 5, "101"), (1, "a", "M", 5, "101"),
+                                     (3, "c", "M", 5, "101"), (1, "a", "M", 5, "101")])
+    assert [(r.appt_id, r.status) for r in results] == [
+        (2, checkin.REJECTED), (1, checkin.CREATED), (3, checkin.REJECTED)]
+
+
+class _RacingCursor(FakeCursor):
+    """INSERT 时另一个事务已用同一 request_key 提交"""
+
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        if sql.strip().startswith("INSERT INTO Visits"):
+            self.responses = [("request_key", [(42,)])]
+            raise mysql_errors.IntegrityError("Duplicate entry 'k1' for key 'uk_request_key'")
+
+
+def test_walk_in_race_returns_existing_visit(transaction):
+    transaction(_RacingCursor())
+    assert checkin.register_walk_in("张三", "138", "110", "M", 2, 5, "101", request_key="k1") == (42, True)
+
+
+def test_walk_in_integrity_error_without_key_is_raised(transaction):
+    transaction(_RacingCursor())
+    with pytest.raises(mysql_errors.IntegrityError):
+        checkin.register_walk_in("张三", "138", "110", "M", 2, 5, "101")
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+from mysql.connector import errors as mysql_errors
+
+import db
+from conftest import FakeCursor
+
+
+class _Conn:
+    in_transaction = False
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        pass
+
+
+def _pool(size=1, timeout=1.0):
+    pool = db.ConnectionPool({}, size=size, timeout=timeout)
+    pool._connect = _Conn
+    return pool
+
+
+def test_pool_reuses_released_connection():
+    pool = _pool(size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.snapshot()["open"] == 1
+
+
+def test_pool_times_out_when_exhausted():
+    pool = _pool(size=1, timeout=0.1)
+    pool.acquire()
+    with pytest.raises(mysql_errors.PoolError):
+        pool.acquire()
+    assert pool.snapshot()["timeouts"] == 1
+
+
+def test_pool_discard_wakes_waiter():
+    pool = _pool(size=1, timeout=2.0)
+    conn = pool.acquire()
+    got = {}
+    waiter = threading.Thread(target=lambda: got.setdefault("conn", pool.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    pool.release(conn, discard=True)
+    waiter.join(3)
+    assert conn.closed
+    assert got["conn"] is not conn
+    # 被唤醒后立即新建连接，而不是等到超时
+    assert time.monotonic() - start < 1.0
+    assert pool.snapshot()["open"] == 1
+
+
+def test_pool_failed_connect_frees_slot():
+    pool = _pool(size=1, timeout=0.1)
+
+    def refuse():
+        raise mysql_errors.InterfaceError("refused")
+
+    pool._connect = refuse
+    with pytest.raises(mysql_errors.InterfaceError):
+        pool.acquire()
+    pool._connect = _Conn
+    assert pool.acquire() is not None
+
+
+class _Replica:
+    name = "r1:3306"
+
+    def __init__(self, lag):
+        self.lag = lag
+
+    def usable(self, max_lag):
+        return self.lag <= max_lag
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    node = _Replica(lag=0)
+    monkeypatch.setattr(db, "_replicas", [node])
+    yield node
+    db._route.current = None
+    db._route.primary = False
+
+
+def test_zero_max_lag_stays_on_primary(replica):
+    db._route.current = db.Route(max_lag=0)
+    assert db._pick_replica("SELECT 1") is None
+
+
+def test_replica_used_within_lag(replica):
+    db._route.current = db.Route(max_lag=5)
+    assert db._pick_replica("SELECT 1") is replica
+    assert db._pick_replica("UPDATE Visits SET status = 'Finished'") is None
+    with db.use_primary():
+        assert db._pick_replica("SELECT 1") is None
+
+
+def test_route_sticks_to_primary_after_write(replica):
+    route = db._route.current = db.Route(max_lag=5)
+    route.mark_write()
+    assert db._pick_replica("SELECT 1") is None
+    route.last_write -= db.STICKY_MARGIN + 1
+    assert db._pick_replica("SELECT 1") is replica
+
+
+def test_timed_cursor_records_executemany_params_for_audit():
+    class Raw:
+        rowcount = 2
+
+        def executemany(self, sql, seq_params):
+            self.seen = list(seq_params)
+
+    cursor = db.TimedCursor(Raw())
+    cursor.executemany("INSERT INTO Payments (visit_id, amount) VALUES (%s, %s)", ((v, 10) for v in (1, 2)))
+    assert cursor._cursor.seen == [(1, 10), (2, 10)]
+    assert cursor.writes[0][2] == [(1, 10), (2, 10)]
+
+
+def test_timed_cursor_does_not_audit_session_variables():
+    cursor = db.TimedCursor(FakeCursor())
+    cursor.execute("SET @skip_changelog = 1")
+    cursor.execute("DELETE FROM Visits WHERE visit_id = %s", (1,))
+    cursor.execute("SET @skip_changelog = NULL")
+    assert [w[1] for w in cursor.writes] == ["DELETE FROM Visits WHERE visit_id = %s"]
+
+
+def test_gather_timeout_starts_when_task_runs(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # 单线程池：第二个任务要排队等第一个跑完，排队时间不应算进它的超时
+    monkeypatch.setattr(db, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(db.st, "warning", lambda msg: pytest.fail(msg))
+    first = db.submit(time.sleep, 0.3, timeout=0.5)
+    second = db.submit(lambda: (time.sleep(0.3), "ok")[1], timeout=0.5)
+    assert db.gather({"first": first, "second": second}, timeout=0.5)["second"] == "ok"
+    db._executor.shutdown()
+
+
+def test_query_workers_not_below_pool_size():
+    assert db.QUERY_WORKERS >= db.POOL_SIZE
+
+
+class _StreamCursor:
+    """按 fetchmany / fetchone 逐行吐出结果的无缓冲游标"""
+
+    description = [("n",)]
+
+    def __init__(self, rows):
+        self._rows = list(rows)
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("rows, reused", [(4, True), (10, False)])
+def test_truncated_query_discards_connection_only_with_unread_rows(monkeypatch, rows, reused):
+    # 4 行 = 语句带 LIMIT max_rows + 1：多出的一行读完即结束，连接应归还复用
+    pool = _pool()
+    monkeypatch.setattr(db, "get_pool", lambda: pool)
+    monkeypatch.setattr(db, "_pick_replica", lambda query: None)
+    monkeypatch.setattr(_Conn, "cursor", lambda self, buffered=True: _StreamCursor([(i,) for i in range(rows)]),
+                        raising=False)
+    monkeypatch.setattr(db, "FETCH_SIZE", 2)
+    conn = pool.acquire()
+    pool.release(conn)
+    df = db.run_query("SELECT n FROM t LIMIT %s", (4,), max_rows=3)
+    assert len(df) == 3 and df.attrs["truncated"]
+    assert (pool.acquire() is conn) is reused
+    assert conn.closed is not reused
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+
+import payments
+from conftest import FakeCursor
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    cursor = FakeCursor()
+
+    @contextmanager
+    def fake():
+        yield cursor
+
+    monkeypatch.setattr(payments, "db_transaction", fake)
+    monkeypatch.setattr(payments.reports, "record_settlement", lambda cursor, visit_ids: None)
+    return cursor
+
+
+def test_bill_drops_zero_items_and_rejects_negative():
+    bill = payments.Bill(1, [("挂号费", "10"), ("药费", 0), ("诊疗费", 40.5)])
+    assert bill.total == Decimal("50.50")
+    assert [name for name, _ in bill.items] == ["挂号费", "诊疗费"]
+    with pytest.raises(ValueError):
+        payments.Bill(1, [("药费", -1)])
+    with pytest.raises(ValueError):
+        payments.Bill(1, [("药费", 1)], method="支票")
+
+
+def test_settle_skips_visits_already_paid(cursor):
+    cursor.responses = [
+        ("FROM Visits", [(1, "ToPay"), (2, "Finished")]),
+        ("SELECT visit_id, payment_id FROM Payments", [(1, 100)]),
+    ]
+    result = payments.settle([payments.Bill(1, [("挂号费", 10)]), payments.Bill(2, [("挂号费", 10)])])
+    assert (result.settled, result.skipped, result.total) == ([1], [2], Decimal("10.00"))
+    insert = next(p for sql, p in cursor.executed if sql.startswith("INSERT INTO PaymentItems"))
+    assert insert == [(100, "挂号费", Decimal("10.00"))]
+
+
+def test_concurrent_resubmit_returns_previous_result(cursor):
+    # 重复提交拿到就诊行锁时前一次已提交：就诊已结清，收费记录可见
+    cursor.responses = [
+        ("FROM Visits", [(1, "Finished"), (2, "Finished")]),
+        ("WHERE request_key", [(1, Decimal("10.00")), (2, Decimal("20.00"))]),
+    ]
+    result = payments.settle([payments.Bill(1, [("挂号费", 10)]), payments.Bill(2, [("挂号费", 20)])], "k1")
+    assert result.duplicate
+    assert (result.settled, result.total) == ([1, 2], Decimal("30.00"))
+    statements = cursor.statements()
+    assert "FROM Visits" in statements[0] and statements[0].endswith("FOR UPDATE")
+    assert statements[1].endswith("FOR SHARE")
+    assert not any(sql.startswith("UPDATE") for sql in statements)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+import profiling
+
+
+def _helper():
+    return profiling.call_site()
+
+
+def test_call_site_keeps_underscore_functions_outside_data_layer():
+    assert _helper().startswith("test_profiling.py:") and _helper().endswith(" _helper")
+
+
+def test_last_params_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(profiling, "PARAMS_LIMIT", 2)
+    profiling.clear()
+    profiling.record("query", "SELECT 1", (1,), 0.01)
+    profiling.record("query", "SELECT 2", (2,), 0.01)
+    profiling.record("query", "SELECT 1", (3,), 0.01)
+    profiling.record("query", "SELECT 3", (4,), 0.01)
+    assert list(profiling._last_params.items()) == [("SELECT 1", (3,)), ("SELECT 3", (4,))]
+    profiling.clear()
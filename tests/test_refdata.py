@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from refdata import TTLCache
+
+
+def _frame(value):
+    return pd.DataFrame({"v": [value]})
+
+
+def test_ttl_cache_hits_until_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("refdata.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10, maxsize=8)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return _frame(len(calls))
+
+    assert cache.get_or_load(("depts",), loader)["v"][0] == 1
+    assert cache.get_or_load(("depts",), loader)["v"][0] == 1
+    now[0] += 11
+    assert cache.get_or_load(("depts",), loader)["v"][0] == 2
+    stats = cache.snapshot()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.get_or_load(("a",), lambda: _frame("a"))
+    cache.get_or_load(("b",), lambda: _frame("b"))
+    cache.get_or_load(("a",), lambda: _frame("stale"))
+    cache.get_or_load(("c",), lambda: _frame("c"))
+    assert cache.get_or_load(("a",), lambda: _frame("reloaded"))["v"][0] == "a"
+    assert cache.get_or_load(("b",), lambda: _frame("reloaded"))["v"][0] == "reloaded"
+    assert cache.snapshot()["evictions"] >= 1
+
+
+def test_ttl_cache_invalidates_by_tag():
+    cache = TTLCache(ttl=60)
+    cache.get_or_load(("doctors", None), lambda: _frame(1))
+    cache.get_or_load(("doctors", 3), lambda: _frame(2))
+    cache.get_or_load(("rooms", None), lambda: _frame(3))
+    cache.invalidate("doctors")
+    assert cache.snapshot()["entries"] == 1
+    assert cache.get_or_load(("doctors", 3), lambda: _frame("new"))["v"][0] == "new"
+
+
+def test_ttl_cache_invalidates_matching_keys_only():
+    cache = TTLCache(ttl=60)
+    cache.get_or_load(("doctors", None), lambda: _frame(1))
+    cache.get_or_load(("doctors", 3), lambda: _frame(2))
+    cache.invalidate("doctors", lambda key: key[1] == 3)
+    assert cache.snapshot()["entries"] == 1
+    assert cache.get_or_load(("doctors", None), lambda: _frame("new"))["v"][0] == 1
+
+
+def test_ttl_cache_does_not_keep_empty_results():
+    cache = TTLCache(ttl=60)
+    cache.get_or_load(("depts",), pd.DataFrame)
+    assert cache.get_or_load(("depts",), lambda: _frame(1))["v"][0] == 1
+
+
+def test_ttl_cache_discards_load_invalidated_midway():
+    cache = TTLCache(ttl=60)
+
+    def loader():
+        # 加载过程中另一个会话修改了数据并使标签失效
+        cache.invalidate("doctors")
+        return _frame("stale")
+
+    assert cache.get_or_load(("doctors", None), loader)["v"][0] == "stale"
+    assert cache.get_or_load(("doctors", None), lambda: _frame("fresh"))["v"][0] == "fresh"
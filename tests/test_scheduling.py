@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from scheduling import OccupancyIndex, plan_schedule
+
+MONDAY = date(2026, 3, 2)
+TUESDAY = date(2026, 3, 3)
+
+
+def test_plan_fills_every_room_without_double_booking():
+    plan = plan_schedule([1, 2, 3], ["101", "102"], MONDAY, TUESDAY, occupancy=OccupancyIndex())
+    assert len(plan.rows) == 2 * 2 * 2   # 2 天 × 2 个时段 × 2 间诊室
+    assert not plan.conflicts
+    doctor_slots = [(doc, d, shift) for doc, d, shift, _ in plan.rows]
+    room_slots = [(room, d, shift) for _, d, shift, room in plan.rows]
+    assert len(set(doctor_slots)) == len(doctor_slots)
+    assert len(set(room_slots)) == len(room_slots)
+
+
+def test_plan_skips_existing_schedules():
+    occupancy = OccupancyIndex([(1, "101", MONDAY, "Morning")])
+    plan = plan_schedule([1, 2], ["101", "102"], MONDAY, MONDAY, shifts=["Morning"], occupancy=occupancy)
+    assert plan.rows == [(2, MONDAY, "Morning", "102")]
+    targets = {c["对象"] for c in plan.conflicts}
+    assert targets == {"医生 1", "诊室 101"}
+
+
+def test_plan_reports_rooms_without_free_doctor():
+    plan = plan_schedule([1], ["101", "102"], MONDAY, MONDAY, shifts=["Morning"], occupancy=OccupancyIndex())
+    assert len(plan.rows) == 1
+    assert plan.conflicts[0]["原因"] == "无空闲医生可分配"
+
+
+def test_plan_rotates_by_day_and_respects_weekdays():
+    plan = plan_schedule([1, 2], ["101"], MONDAY, TUESDAY, shifts=["Morning"], occupancy=OccupancyIndex())
+    assert [doc for doc, *_ in plan.rows] == [1, 2]
+    plan = plan_schedule([1, 2], ["101"], MONDAY, TUESDAY, shifts=["Morning"], weekdays=[1],
+                         occupancy=OccupancyIndex())
+    assert [d for _, d, _, _ in plan.rows] == [TUESDAY]
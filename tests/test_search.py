@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from search import classify
+
+
+@pytest.mark.parametrize("term, mode", [
+    ("11010519491231002X", "id_card"),
+    ("110105194912310021", "id_card"),
+    ("13800", "phone"),
+    ("13800138000", "phone"),
+    ("101", "room"),
+    ("A12", "room"),
+    ("张三", "name"),
+    ("欧阳娜娜", "name"),
+    ("张", "name_prefix"),
+])
+def test_classify(term, mode):
+    assert classify(term) == mode
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+import pytest
+
+import slots
+from conftest import FakeCursor
+
+
+@pytest.fixture(autouse=True)
+def no_database(monkeypatch):
+    def fail():
+        raise AssertionError("参数校验失败时不应访问数据库")
+
+    monkeypatch.setattr(slots, "db_transaction", fail)
+
+
+def test_shift_of():
+    assert slots.shift_of(time(11, 59)) == "Morning"
+    assert slots.shift_of(time(13, 30)) == "Afternoon"
+
+
+def test_book_rejects_arrival_outside_shift_hours():
+    result = slots.book("张三", "138", "1", 1, date.today() + timedelta(days=1), time(12, 30))
+    assert not result.ok
+    assert "13:30–17:30" in result.message
+
+
+def test_book_rejects_dates_outside_booking_window():
+    result = slots.book("张三", "138", "1", 1, date.today() + timedelta(days=slots.BOOKING_DAYS), time(9, 0))
+    assert not result.ok
+    assert str(slots.BOOKING_DAYS) in result.message
+
+
+def test_book_rejects_arrival_in_the_past():
+    if datetime.now().time() <= time(8, 0):
+        pytest.skip("需要在 08:00 之后运行")
+    result = slots.book("张三", "138", "1", 1, date.today(), time(8, 0))
+    assert not result.ok
+    assert "已过" in result.message
+
+
+def test_successful_booking_invalidates_only_the_booked_department(monkeypatch):
+    @contextmanager
+    def transaction():
+        yield FakeCursor(lastrowid=7)
+
+    day = date.today() + timedelta(days=1)
+    later = day + timedelta(days=1)
+    monkeypatch.setattr(slots, "db_transaction", transaction)
+    monkeypatch.setattr(slots, "_cache", slots.TTLCache(ttl=60))
+    monkeypatch.setattr(slots, "_route", slots.Route())
+    for key in (("slots", 1, day, later), ("slots", 1, later, later), ("slots", 2, day, later)):
+        slots._cache.get_or_load(key, lambda: pd.DataFrame({"remaining": [1]}))
+    result = slots.book("张三", "138", "1", 1, day, time(9, 0))
+    assert result.ok and result.appt_id == 7
+    assert slots._cache.snapshot()["entries"] == 2
+    assert slots._route.last_write is None
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""各角色页面：每个模块提供 render()，由 app.py 按当前角色 / 页面按需导入
+
+页面模块及其依赖（报表、导入导出、归档、排班等）只在第一次打开时导入，
+一次执行只渲染选中的那一页，未打开页面的查询不会执行。
+"""
+import importlib
+import sys
+import time
+
+import profiling
+
+ROLES = {
+    "患者 (在线预约)": "patient",
+    "前台 (挂号/收费)": "frontdesk",
+    "管理员 (报表/排班)": "admin",
+    "候诊大屏": "lobby",
+}
+
+
+def load(name):
+    """导入 views.<name>，首次导入的耗时记入 profiling"""
+    module = f"{__name__}.{name}"
+    if module in sys.modules:
+        return sys.modules[module]
+    start = time.perf_counter()
+    loaded = importlib.import_module(module)
+    profiling.record_import(module, time.perf_counter() - start)
+    return loaded
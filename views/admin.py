@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""医院行政管理后台：各功能页按需导入，只执行当前页的查询"""
+import streamlit as st
+
+import views
+from db import run_query
+from views.common import page_selector
+
+PAGES = {
+    "📅 排班管理": "admin_schedule",
+    "💰 财务报表": "admin_finance",
+    "📂 患者查询": "admin_search",
+    "👥 员工管理": "admin_staff",
+    "📦 数据导入导出": "admin_data",
+    "⏱️ 性能分析": "admin_profiling",
+    "🧾 操作日志": "admin_audit",
+}
+
+
+def render():
+    st.title("🛡️ 医院行政管理后台")
+
+    page = page_selector("admin_page", list(PAGES))
+    views.load(PAGES[page]).render()
+
+    if st.button("查看所有表结构"):
+        tables = run_query("SHOW TABLES")
+        for tbl in tables.iloc[:, 0]:
+            st.write(f"### 表名: {tbl}")
+            st.dataframe(run_query(f"DESCRIBE {tbl}"))
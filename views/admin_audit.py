@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 操作日志：按日期与角色查询 AuditLog"""
+from datetime import date
+
+import streamlit as st
+
+import audit
+import views
+from views.common import load_more, row_limit
+
+# 操作日志每次加载的行数
+AUDIT_ROWS = 200
+
+
+def render():
+    st.subheader("🧾 操作日志")
+    st.caption("所有写操作（挂号、结算、排班、人事变动等）提交或回滚后由后台线程批量写入，最多延迟约 "
+               f"{audit.FLUSH_INTERVAL:g} 秒；数据库不可用时暂存在本地文件 {audit.AUDIT_FILE}。")
+
+    c1, c2, c3 = st.columns(3)
+    start_date = c1.date_input("开始日期", value=date.today(), key="audit_start")
+    end_date = c2.date_input("结束日期", value=date.today(), key="audit_end")
+    actor_opts = {"全部角色": None, **{role: role for role in views.ROLES}, "后台任务": "system"}
+    actor = actor_opts[c3.selectbox("操作角色", list(actor_opts.keys()), key="audit_actor")]
+
+    limit = row_limit("audit_rows", (start_date, end_date, actor), AUDIT_ROWS)
+    df_log = audit.fetch_log(start_date, end_date, actor, max_rows=limit)
+    if df_log.empty:
+        st.info("该时间段内没有操作记录。")
+    else:
+        st.dataframe(df_log, use_container_width=True, hide_index=True)
+        load_more("audit_rows", df_log, AUDIT_ROWS)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 数据导入导出与历史数据归档"""
+import io
+
+import pandas as pd
+import streamlit as st
+
+import archive
+import bulk
+
+
+def render():
+    st.subheader("📦 批量导入 / 导出")
+    st.caption("大批量迁移或夜间抽取请使用命令行：python bulk.py import|export ...")
+    kind_labels = {"预约 (Appointments)": "appointments", "就诊 (Visits)": "visits", "员工 (Staff)": "staff"}
+
+    col_imp, col_exp = st.columns(2)
+    with col_imp:
+        st.markdown("### ⬆️ 导入")
+        imp_kind = kind_labels[st.selectbox("导入数据类型", list(kind_labels.keys()), key="imp_kind")]
+        upload = st.file_uploader("选择 CSV / Parquet 文件", type=["csv", "parquet"])
+        if upload is not None and st.button("开始导入"):
+            try:
+                with st.spinner("正在分批写入..."):
+                    result = bulk.import_file(imp_kind, upload)
+            except ValueError as e:
+                st.error(f"导入失败: {e}")
+            except Exception as e:
+                st.error(f"导入中断（已完成的批次已写入，可在对应列表中核对）: {e}")
+            else:
+                (st.success if not (result.rejected or result.pending_rebuilds) else st.warning)(result.summary())
+                for command, error in result.pending_rebuilds:
+                    st.error(f"数据已写入，但导入后的重算失败：{error}。请稍后执行 `{command}`。")
+                if result.errors:
+                    st.dataframe(pd.DataFrame(result.errors, columns=["行号", "错误"]), use_container_width=True)
+
+    with col_exp:
+        st.markdown("### ⬇️ 导出")
+        exp_kind = kind_labels[st.selectbox("导出数据类型", list(kind_labels.keys()), key="exp_kind")]
+        exp_fmt = st.radio("文件格式", ["csv", "parquet"], horizontal=True)
+        c1, c2 = st.columns(2)
+        exp_start = c1.date_input("起始日期", value=None, key="exp_start")
+        exp_end = c2.date_input("结束日期", value=None, key="exp_end")
+        if st.button("生成导出文件"):
+            buf = io.BytesIO()
+            try:
+                with st.spinner("正在导出..."):
+                    rows = bulk.export_table(exp_kind, buf, exp_fmt, exp_start, exp_end)
+            except Exception as e:
+                st.error(f"导出失败: {e}")
+            else:
+                st.success(f"共导出 {rows} 行")
+                st.download_button("下载文件", buf.getvalue(), file_name=f"{exp_kind}.{exp_fmt}")
+
+    with st.expander("🗄️ 历史数据归档"):
+        st.caption("把早于 N 个月、已结束的就诊与预约分批移入归档表，在线队列只扫描近期数据；"
+                   "检索、导出、汇总重算在日期范围需要时自动包含归档数据。定时任务可用：python archive.py run")
+        for table in archive.ARCHIVES:
+            st.write(f"{table} 已归档至：{archive.horizon(table) or '（无）'}")
+        arc_months = st.number_input("保留最近几个月", min_value=1, value=archive.ARCHIVE_MONTHS, step=1)
+        if st.button(f"归档 {archive.cutoff_date(arc_months)} 之前的记录"):
+            progress = st.empty()
+            try:
+                moved = archive.run(arc_months, on_batch=lambda table, n: progress.caption(f"{table}: 已移动 {n} 行"))
+            except Exception as e:
+                st.error(f"归档失败（已完成的批次不受影响）: {e}")
+            else:
+                progress.empty()
+                st.success("，".join(f"{table} 移动 {n} 行" for table, n in moved.items()))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 财务报表：读取 RevenueDaily 日汇总，支持加载更多与区间重算"""
+from datetime import date
+
+import streamlit as st
+
+import reports
+from views.common import load_more, row_limit
+
+# 财务报表每次加载的行数
+REPORT_ROWS = 500
+
+
+def render():
+    st.subheader("门诊收入统计")
+
+    col_filter1, col_filter2 = st.columns(2)
+    start_date = col_filter1.date_input("开始日期", value=date.today().replace(day=1))
+    end_date = col_filter2.date_input("结束日期", value=date.today())
+
+    group_by = st.radio("统计维度", reports.REPORT_DIMENSIONS, horizontal=True)
+
+    report_limit = row_limit("report_rows", (group_by, start_date, end_date), REPORT_ROWS)
+    df_report = reports.revenue_report(group_by, start_date, end_date, max_rows=report_limit)
+
+    total_rev = df_report["总收入"].sum() if not df_report.empty else 0
+    st.metric("区间总营收" + ("（已加载部分）" if df_report.attrs.get("truncated") else ""), f"¥ {total_rev:,.2f}")
+
+    if not df_report.empty:
+        st.dataframe(df_report, use_container_width=True)
+        load_more("report_rows", df_report, REPORT_ROWS)
+        st.bar_chart(df_report.set_index("维度")["总收入"])
+    else:
+        st.info("该时间段内无已结算数据。")
+
+    with st.expander("🔧 汇总表维护"):
+        st.caption("报表读取 RevenueDaily 日汇总表，收银结算时自动累加。历史数据导入或汇总异常时可按上方日期区间重算。")
+        if st.button("重算所选区间汇总"):
+            try:
+                rows = reports.rebuild_rollup(start_date, end_date)
+            except Exception as e:
+                st.error(f"重算失败: {e}")
+            else:
+                st.success(f"重算完成，写入 {rows} 行汇总。")
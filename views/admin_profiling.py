@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 性能分析：慢查询与页面耗时"""
+import streamlit as st
+
+import profiling
+
+
+def render():
+    st.subheader("⏱️ 慢查询分析")
+    st.caption(f"统计本进程最近 {profiling.SAMPLE_LIMIT} 条语句的执行耗时，按 p95 降序。")
+    df_prof = profiling.summary()
+    if df_prof.empty:
+        st.info("暂无查询样本。")
+    else:
+        st.dataframe(df_prof, use_container_width=True)
+
+        selects = df_prof[df_prof["SQL"].str.upper().str.startswith("SELECT")]["SQL"].unique().tolist()
+        if selects:
+            sel_sql = st.selectbox("选择语句查看执行计划", selects)
+            if st.button("EXPLAIN"):
+                st.dataframe(profiling.explain(sel_sql), use_container_width=True)
+
+    if st.button("清空样本"):
+        profiling.clear()
+        st.rerun()
+
+    st.markdown("---")
+    st.subheader("🚀 页面耗时")
+    st.caption("每次页面执行按阶段计时：导入依赖 / 侧边栏 / 加载视图 / 渲染。冷启动为本进程第一次执行，之后依赖与页面模块已缓存。")
+    cold = profiling.cold_start()
+    if cold:
+        st.write("冷启动：")
+        st.json(cold)
+    df_pages = profiling.page_summary()
+    if df_pages.empty:
+        st.info("暂无页面重跑样本。")
+    else:
+        st.dataframe(df_pages, use_container_width=True)
+    df_imports = profiling.import_times()
+    if not df_imports.empty:
+        st.write("页面模块首次导入耗时：")
+        st.dataframe(df_imports, use_container_width=True, hide_index=True)
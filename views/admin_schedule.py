@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 排班管理：单条排班与按日期区间批量生成"""
+from datetime import date, timedelta
+
+import pandas as pd
+import streamlit as st
+
+import availability
+import refdata
+import scheduling
+
+
+def render():
+    st.subheader("📅 医生排班设置")
+
+    depts = refdata.get_departments()
+    dept_map = dict(zip(depts['dept_name'], depts['dept_id']))
+
+    sel_dept_name = st.selectbox("1. 选择排班科室", list(dept_map.keys()))
+    target_dept_id = dept_map[sel_dept_name]
+
+    matching_docs = refdata.get_active_doctors(target_dept_id)
+    matching_rooms = refdata.get_available_rooms(target_dept_id)
+
+    with st.form("advanced_schedule_form"):
+        col1, col2 = st.columns(2)
+
+        if not matching_docs.empty:
+            doc_opts = {row['name']: row['staff_id'] for _, row in matching_docs.iterrows()}
+            selected_doc_name = col1.selectbox("2. 指派医生", list(doc_opts.keys()))
+        else:
+            col1.error("该科室暂无可排班医生")
+            selected_doc_name = None
+
+        if not matching_rooms.empty:
+            selected_room = col2.selectbox("3. 分配诊室", matching_rooms['room_no'].tolist())
+        else:
+            col2.error("该科室暂无可分配诊室")
+            selected_room = None
+
+        c3, c4 = st.columns(2)
+        shift_date = c3.date_input("排班日期", min_value=date.today())
+        shift_time = c4.selectbox("时段", ["Morning", "Afternoon"])
+
+        if st.form_submit_button("保存排班"):
+            if selected_doc_name and selected_room:
+                target_doc_id = doc_opts[selected_doc_name]
+
+                try:
+                    holder = scheduling.save_single(target_doc_id, selected_room, shift_date, shift_time)
+                except Exception as e:
+                    st.error(f"操作失败: {e}")
+                else:
+                    if holder is not None:
+                        st.error(f"❌ 冲突：诊室 {selected_room} 在该时段已有其他医生排班！")
+                    else:
+                        availability.on_schedule_saved([(target_doc_id, shift_date, shift_time, selected_room)])
+                        st.success(f"✅ 排班成功：{selected_doc_name} 于 {selected_room} 诊室")
+                        st.rerun()
+            else:
+                st.warning("请确保已选择医生和诊室。")
+
+    with st.expander("📆 批量排班（按日期区间生成）"):
+        batch_doc_opts = dict(zip(matching_docs['name'], matching_docs['staff_id'])) if not matching_docs.empty else {}
+        batch_rooms = matching_rooms['room_no'].tolist() if not matching_rooms.empty else []
+
+        b1, b2 = st.columns(2)
+        b_start = b1.date_input("起始日期", value=date.today(), min_value=date.today(), key="batch_start")
+        b_end = b2.date_input("结束日期", value=date.today() + timedelta(days=27), min_value=date.today(), key="batch_end")
+        b3, b4 = st.columns(2)
+        b_docs = b3.multiselect("参与医生（按轮转顺序）", list(batch_doc_opts.keys()), default=list(batch_doc_opts.keys()))
+        b_rooms = b4.multiselect("使用诊室", batch_rooms, default=batch_rooms)
+        b5, b6, b7 = st.columns(3)
+        b_shifts = b5.multiselect("时段", scheduling.SHIFTS, default=scheduling.SHIFTS)
+        weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+        b_weekdays = b6.multiselect("工作日", weekday_names, default=weekday_names[:5])
+        b_pattern = b7.selectbox("轮转方式", list(scheduling.PATTERNS.keys()), index=2)
+
+        if st.button("生成排班预览"):
+            st.session_state["schedule_plan"] = scheduling.plan_schedule(
+                [batch_doc_opts[n] for n in b_docs], b_rooms, b_start, b_end, b_shifts,
+                [weekday_names.index(w) for w in b_weekdays], b_pattern,
+            )
+
+        plan = st.session_state.get("schedule_plan")
+        if plan is not None:
+            doc_names = {v: k for k, v in batch_doc_opts.items()}
+            st.write(f"计划新增 {len(plan.rows)} 条排班，发现 {len(plan.conflicts)} 处冲突。")
+            if plan.rows:
+                st.dataframe(pd.DataFrame(
+                    [(d, t, r, doc_names.get(doc, doc)) for doc, d, t, r in plan.rows],
+                    columns=["日期", "时段", "诊室", "医生"],
+                ), use_container_width=True)
+            if plan.conflicts:
+                st.dataframe(pd.DataFrame(plan.conflicts), use_container_width=True)
+            if plan.rows and st.button("确认写入排班", type="primary"):
+                try:
+                    saved = scheduling.save_plan(plan)
+                except Exception as e:
+                    st.error(f"写入失败（可能已有他人修改排班，请重新生成预览）: {e}")
+                else:
+                    del st.session_state["schedule_plan"]
+                    availability.on_schedule_saved(plan.rows)
+                    st.success(f"✅ 已写入 {saved} 条排班")
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 患者查询"""
+import streamlit as st
+
+import search
+from views.common import page_cursor, page_nav
+
+
+def render():
+    st.subheader("患者档案检索")
+    search_term = st.text_input("输入关键字 (姓名 / 电话 / 身份证号 / 诊室号)", placeholder="例如：张三 或 1380000...")
+
+    if st.button("🔍 搜索患者"):
+        st.session_state["search_term"] = search_term.strip()
+
+    active_term = st.session_state.get("search_term")
+    if active_term:
+        after = page_cursor("search_page", active_term)
+        df_patient, has_more, mode = search.search_visits(active_term, after)
+        st.caption(f"检索方式：{search.MODE_LABELS[mode]}")
+
+        if not df_patient.empty:
+            st.dataframe(df_patient)
+            if mode == "name":
+                st.caption(f"按相关度显示前 {search.NAME_TOP_N} 条，如需更多请输入完整姓名或改用电话 / 身份证号检索。")
+            else:
+                page_nav("search_page", has_more, search.next_cursor(df_patient))
+        else:
+            st.warning("未找到匹配的患者信息。")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""管理后台 · 员工管理：花名册、入职、信息修改与离职"""
+import streamlit as st
+
+import availability
+import refdata
+from db import db_transaction, run_action, run_query
+from views.common import page_selector, refresh_slots
+
+
+def render():
+    st.subheader("👥 人力资源管理")
+
+    dept_df_raw = refdata.get_departments()
+    dept_opts = dict(zip(dept_df_raw['dept_name'], dept_df_raw['dept_id'])) if not dept_df_raw.empty else {}
+
+    st.markdown("### 📋 在职员工花名册")
+    df_staff = refdata.get_staff_roster()
+    st.dataframe(df_staff, use_container_width=True)
+
+    st.markdown("---")
+
+    col_hire, col_manage = st.columns(2)
+
+    with col_hire:
+        st.info("### ➕ 办理入职 (Hire)")
+        with st.form("hire_staff_form"):
+            new_name = st.text_input("姓名 (必填)")
+            c1, c2 = st.columns(2)
+            new_role = c2.selectbox("岗位", ["Doctor", "Nurse", "Admin", "Cashier"])
+
+            c3, c4 = st.columns(2)
+            new_dept_name = c3.selectbox("所属科室", list(dept_opts.keys()))
+            new_title = c4.text_input("职称 (如: 主治医师)")
+
+            new_phone = st.text_input("联系电话")
+
+            if st.form_submit_button("确认录入"):
+                if new_name and new_phone:
+                    dept_id = dept_opts[new_dept_name]
+                    insert_sql = """
+                        INSERT INTO Staff (name, role, dept_id, title, phone, is_active)
+                        VALUES (%s, %s, %s, %s, %s, 1)
+                    """
+                    try:
+                        with db_transaction() as cursor:
+                            cursor.execute(insert_sql, (new_name, new_role, dept_id, new_title, new_phone))
+                            new_id = cursor.lastrowid
+                    except Exception as e:
+                        st.error(f"操作失败: {e}")
+                    else:
+                        refdata.invalidate("Staff")
+                        availability.on_staff_changed(new_id)
+                        refresh_slots()
+                        st.success(f"员工 {new_name} 入职办理成功！")
+                        st.rerun()
+                else:
+                    st.error("姓名和电话为必填项。")
+
+    with col_manage:
+        st.warning("### ⚙️ 档案管理 / 离职 (Fire)")
+
+        staff_select_df = refdata.get_staff_options()
+        if not staff_select_df.empty:
+            staff_opts = {f"{r['staff_id']} - {r['name']} ({'在职' if r['is_active'] else '离职'})": r['staff_id'] for i, r in staff_select_df.iterrows()}
+            selected_staff_key = st.selectbox("选择要操作的员工", options=list(staff_opts.keys()))
+            selected_staff_id = staff_opts[selected_staff_key]
+
+            curr_info_df = run_query("SELECT * FROM Staff WHERE staff_id = %s", (selected_staff_id,))
+
+            if not curr_info_df.empty:
+                curr = curr_info_df.iloc[0]
+
+                action = page_selector("staff_action", ["✏️ 修改信息", "❌ 办理离职"])
+
+                if action == "✏️ 修改信息":
+                    with st.form("edit_staff_subform"):
+                        e_phone = st.text_input("新电话", value=curr['phone'])
+                        e_title = st.text_input("新职称", value=curr['title'])
+                        e_role = st.selectbox("新岗位", ["Doctor", "Nurse", "Admin", "Cashier"], index=["Doctor", "Nurse", "Admin", "Cashier"].index(curr['role']))
+
+                        if st.form_submit_button("保存变更"):
+                            up_sql = "UPDATE Staff SET phone=%s, title=%s, role=%s WHERE staff_id=%s"
+                            if run_action(up_sql, (e_phone, e_title, e_role, selected_staff_id)):
+                                refdata.invalidate("Staff")
+                                availability.on_staff_changed(selected_staff_id)
+                                refresh_slots()
+                                st.success("信息更新成功！")
+                                st.rerun()
+
+                else:
+                    if curr['is_active'] == 0:
+                        st.error("该员工已经是【离职】状态。")
+                    else:
+                        st.write(f"您正在为 **{curr['name']}** 办理离职手续。")
+                        st.warning("⚠️ 注意：离职操作将保留其历史数据，但该员工将无法再被排班。")
+
+                        fire_confirm = st.checkbox("我确认执行解雇/离职操作")
+
+                        if st.button("确认解雇 (Fire)", type="primary"):
+                            if fire_confirm:
+                                fire_sql = "UPDATE Staff SET is_active = 0 WHERE staff_id = %s"
+                                if run_action(fire_sql, (selected_staff_id,)):
+                                    refdata.invalidate("Staff")
+                                    availability.on_staff_changed(selected_staff_id)
+                                    refresh_slots()
+                                    st.error(f"员工 {curr['name']} 已确认为离职状态。")
+                                    st.rerun()
+                            else:
+                                st.warning("请先勾选确认框。")
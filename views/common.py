@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""页面共用的小部件：键集分页、加载更多、幂等键、页面选择器等"""
+import uuid
+
+import streamlit as st
+
+import slots
+
+
+def page_selector(key, labels):
+    """代替 st.tabs：只渲染选中的一页，返回选中的标签
+
+    st.tabs 会执行所有标签页的代码（包括查询）；这里用单选按钮 + session_state，
+    切换到其他角色再回来时仍停留在原来的页面。
+    """
+    saved = st.session_state.get(f"{key}_saved")
+    choice = st.radio("页面", labels, index=labels.index(saved) if saved in labels else 0,
+                      horizontal=True, key=key, label_visibility="collapsed")
+    st.session_state[f"{key}_saved"] = choice
+    return choice
+
+
+def page_cursor(key, filters):
+    """键集分页：返回当前页的起始游标，筛选条件变化时回到第一页"""
+    state = st.session_state.setdefault(key, {"filters": filters, "cursors": [None]})
+    if state["filters"] != filters:
+        state.update(filters=filters, cursors=[None])
+    return state["cursors"][-1]
+
+
+def page_nav(key, has_more, next_cursor):
+    """上一页 / 下一页按钮，next_cursor 为当前页最后一行的游标"""
+    state = st.session_state[key]
+    c_prev, c_info, c_next = st.columns([1, 2, 1])
+    if c_prev.button("⬅️ 上一页", key=f"{key}_prev", disabled=len(state["cursors"]) == 1):
+        state["cursors"].pop()
+        st.rerun()
+    c_info.caption(f"第 {len(state['cursors'])} 页")
+    if c_next.button("下一页 ➡️", key=f"{key}_next", disabled=not has_more):
+        state["cursors"].append(next_cursor)
+        st.rerun()
+
+
+def row_limit(key, filters, step):
+    """「加载更多」的行数上限，筛选条件变化时回到 step"""
+    state = st.session_state.setdefault(key, {"filters": filters, "limit": step})
+    if state["filters"] != filters:
+        state.update(filters=filters, limit=step)
+    return state["limit"]
+
+
+def load_more(key, df, step):
+    """结果被行数上限截断时显示「加载更多」按钮"""
+    if not df.attrs.get("truncated"):
+        return
+    c_info, c_more = st.columns([3, 1])
+    c_info.caption(f"已显示前 {len(df)} 行，结果未全部加载。")
+    if c_more.button("加载更多", key=f"{key}_more"):
+        st.session_state[key]["limit"] += step
+        st.rerun()
+
+
+def request_key(name):
+    """表单的幂等键：同一次填写的重复提交共用一个键，成功后调用 rotate_request_key 换新"""
+    key = f"request_key_{name}"
+    if key not in st.session_state:
+        st.session_state[key] = uuid.uuid4().hex
+    return st.session_state[key]
+
+
+def rotate_request_key(name):
+    st.session_state.pop(f"request_key_{name}", None)
+
+
+def refresh_slots():
+    """人员变动会改变出诊医生数，重算可预约窗口内的号源容量"""
+    try:
+        slots.rebuild()
+    except Exception as e:
+        st.warning(f"预约号源重算失败，请稍后运行 python slots.py rebuild：{e}")
+
+
+def pick_assignment(assignments, doc_options, room_list, key):
+    """按当前时段排班选择 医生+诊室，返回 (doctor_id, room_no, dept_id)
+
+    当前时段没有排班时退回到在职医生 / 空闲诊室两个下拉框（doc_options 只应包含在职医生），此时 dept_id 为 None。
+    """
+    if assignments:
+        labels = {a.label: a for a in assignments}
+        picked = labels[st.selectbox("分配医生 / 诊室（当前时段出诊，按候诊人数排序）", list(labels.keys()), key=key)]
+        return picked.doctor_id, picked.room_no, picked.dept_id
+    st.caption("⚠️ 当前时段暂无排班，显示全部在职医生与空闲诊室。")
+    c1, c2 = st.columns(2)
+    doc_key = c1.selectbox("分配医生", options=list(doc_options.keys()), key=f"{key}_doc")
+    room = c2.selectbox("分配诊室", options=room_list, key=f"{key}_room")
+    return doc_options.get(doc_key), room, None
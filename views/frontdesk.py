@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""前台工作台：预约核验、现场挂号、缴费结算，以及今日实时队列"""
+from datetime import date, datetime
+
+import pandas as pd
+import streamlit as st
+
+import availability
+import changefeed
+import checkin
+import payments
+import queues
+import refdata
+from db import gather, submit
+from views.common import page_cursor, page_nav, page_selector, pick_assignment, request_key, rotate_request_key
+
+PAGES = ["📋 预约核验 (转挂号)", "🏥 现场挂号", "💰 缴费结算"]
+
+# 收银台分项费用的默认金额
+FEE_DEFAULTS = {"挂号费": 10.0, "诊疗费": 40.0}
+
+STATUS_LABELS = {"Waiting": "候诊中", "Consulting": "就诊中", "ToPay": "待缴费"}
+# 实时队列中变动行的提示保留时间（秒）
+LIVE_MARK_SECONDS = 30
+
+_REFERENCE = {
+    "医生列表": refdata.get_doctors,
+    "诊室列表": refdata.get_available_rooms,
+    "科室列表": refdata.get_departments,
+    "出诊安排": availability.options,
+}
+
+
+@st.fragment(run_every=changefeed.POLL_INTERVAL)
+def _live_queue():
+    """前台实时队列：定时只重绘本片段，数据来自进程内变更快照，不查询数据库"""
+    feed = changefeed.get_feed()
+    version, deltas = feed.deltas_since(st.session_state.get("live_queue_version", feed.version))
+    st.session_state["live_queue_version"] = version
+    marks = st.session_state.setdefault("live_queue_marks", {})
+    now = datetime.now().timestamp()
+    for _, table, row_id, _ in deltas:
+        if table == "Visits":
+            marks[row_id] = now
+    for row_id in [r for r, t in marks.items() if now - t > LIVE_MARK_SECONDS]:
+        del marks[row_id]
+
+    visits, pending = feed.active_visits(), feed.pending_appointments()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("今日待核验预约", len(pending))
+    c2.metric("候诊 / 就诊中", sum(v["status"] != "ToPay" for v in visits))
+    c3.metric("今日待缴费", sum(v["status"] == "ToPay" for v in visits))
+    if visits:
+        df = pd.DataFrame(visits)
+        df["status"] = df["status"].map(STATUS_LABELS)
+        df.insert(0, "变动", ["🔔" if v in marks else "" for v in df["visit_id"]])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    if feed.last_error:
+        st.warning(f"实时队列更新失败，显示的可能是旧数据：{feed.last_error}")
+
+
+def _reference(*names):
+    """只加载本页用到的参考数据；互不依赖的查询并发执行，耗时取决于最慢的一条"""
+    ref = gather({name: submit(_REFERENCE[name]) for name in names}, defaults={"出诊安排": []})
+    doc_df = ref.get("医生列表")
+    room_df = ref.get("诊室列表")
+    if doc_df is not None:
+        ref["医生选项"] = {f"{row['name']} (ID:{row['staff_id']})": row['staff_id'] for i, row in doc_df.iterrows()} if not doc_df.empty else {}
+        # 分配医生只能选在职的；已离职医生仍保留在「医生选项」里供缴费页筛选
+        active = doc_df[doc_df["is_active"] == 1] if not doc_df.empty else doc_df
+        ref["在职医生选项"] = {f"{row['name']} (ID:{row['staff_id']})": row['staff_id'] for i, row in active.iterrows()} if not active.empty else {}
+    if room_df is not None:
+        ref["诊室选项"] = room_df['room_no'].tolist() if not room_df.empty else []
+    return ref
+
+
+def _dept_filter_options(dept_df):
+    dept_filter_opts = {"全部科室": None}
+    dept_filter_opts.update(dict(zip(dept_df['dept_name'], dept_df['dept_id'])) if not dept_df.empty else {})
+    return dept_filter_opts
+
+
+def _verify_page():
+    ref = _reference("医生列表", "诊室列表", "科室列表", "出诊安排")
+    doc_options, room_list, assignments = ref["在职医生选项"], ref["诊室选项"], ref["出诊安排"]
+    dept_filter_opts = _dept_filter_options(ref["科室列表"])
+
+    st.subheader("今日待核验预约")
+    f1, f2 = st.columns(2)
+    q_date = f1.date_input("预约日期", value=date.today(), key="appt_q_date")
+    q_dept = dept_filter_opts[f2.selectbox("科室", list(dept_filter_opts.keys()), key="appt_q_dept")]
+    appt_after = page_cursor("appt_page", (q_date, q_dept))
+
+    df_appt, has_more = queues.fetch_pending_appointments(q_date, q_dept, appt_after)
+    st.dataframe(df_appt, use_container_width=True)
+    page_nav("appt_page", has_more, int(df_appt['appt_id'].iloc[-1]) if has_more else None)
+
+    st.markdown("### 🟢 核验并分配诊室")
+    with st.form("verify_form"):
+        c1, c2 = st.columns(2)
+        p_appt_id = c1.number_input("请输入预约 ID (Appt ID)", min_value=1, step=1)
+
+        c3, c4 = st.columns(2)
+        p_id_card = c3.text_input("核验身份证号 (必填)", max_chars=18)
+        p_gender = c4.selectbox("性别 (补录)", ["M", "F"])
+
+        p_doctor_id, p_room, _ = pick_assignment(assignments, doc_options, room_list, "verify_assign")
+
+        if st.form_submit_button("确认到院 & 生成缴费单"):
+            if not p_id_card:
+                st.warning("请填写核验身份证号。")
+            else:
+                try:
+                    res = checkin.check_in(p_appt_id, p_id_card, p_gender, p_doctor_id,
+                                           p_room, request_key("verify"))
+                except Exception as e:
+                    st.error(f"操作失败: {e}")
+                else:
+                    if res.status == checkin.CREATED:
+                        availability.on_visit_created(p_room)
+                        rotate_request_key("verify")
+                        st.success(f"✅ 核验成功！患者 {res.patient_name} 已直接转入【待缴费】状态。")
+                        st.rerun()
+                    elif res.status == checkin.DUPLICATE:
+                        st.info(f"{res.message}：患者 {res.patient_name}，就诊号 {res.visit_id}。")
+                    else:
+                        st.error(f"无效的预约ID：{res.message}。")
+
+    with st.expander("📑 批量核验（当前页）"):
+        # 与单条核验一样按当前时段排班分配；没有排班时退回在职医生 + 空闲诊室
+        if assignments:
+            assign_opts = {a.label: (a.doctor_id, a.room_no) for a in assignments}
+            assign_cols = {"分配": list(assign_opts)}
+        else:
+            assign_opts = None
+            assign_cols = {"医生": list(doc_options), "诊室": room_list}
+        if df_appt.empty or not all(assign_cols.values()):
+            st.caption("当前页没有待核验预约，或暂无可分配的医生 / 诊室。")
+        else:
+            if assign_opts is None:
+                st.caption("⚠️ 当前时段暂无排班，显示全部在职医生与空闲诊室。")
+            editor_df = df_appt[["appt_id", "patient_name", "id_card"]].assign(
+                选择=False, 性别="M", **{col: opts[0] for col, opts in assign_cols.items()})
+            edited = st.data_editor(
+                editor_df,
+                column_config={
+                    "选择": st.column_config.CheckboxColumn(),
+                    "性别": st.column_config.SelectboxColumn(options=["M", "F"], required=True),
+                    **{col: st.column_config.SelectboxColumn(options=opts, required=True)
+                       for col, opts in assign_cols.items()},
+                },
+                disabled=["appt_id", "patient_name", "id_card"],
+                hide_index=True,
+                key="batch_checkin_editor",
+            )
+            if st.button("批量确认到院"):
+                items = [(int(r["appt_id"]), r["id_card"], r["性别"],
+                          *(assign_opts[r["分配"]] if assign_opts else (doc_options[r["医生"]], r["诊室"])))
+                         for _, r in edited[edited["选择"]].iterrows()]
+                if not items:
+                    st.warning("请先勾选要核验的预约。")
+                else:
+                    try:
+                        results = checkin.check_in_many(items, request_key("batch_verify"))
+                    except Exception as e:
+                        st.error(f"操作失败: {e}")
+                    else:
+                        rotate_request_key("batch_verify")
+                        for item, r in zip(items, results):
+                            if r.status == checkin.CREATED:
+                                availability.on_visit_created(item[4])
+                        st.dataframe(pd.DataFrame([r.as_row() for r in results]), use_container_width=True)
+
+
+def _onsite_page():
+    ref = _reference("医生列表", "诊室列表", "科室列表", "出诊安排")
+    doc_options, room_list, assignments = ref["在职医生选项"], ref["诊室选项"], ref["出诊安排"]
+    dept_df = ref["科室列表"]
+
+    st.subheader("🏥 现场挂号录入")
+    with st.form("onsite_form"):
+        col1, col2 = st.columns(2)
+        o_name = col1.text_input("患者姓名")
+        o_phone = col2.text_input("联系电话")
+
+        col3, col4 = st.columns(2)
+        o_id_card = col3.text_input("身份证号")
+        o_gender = col4.selectbox("性别", ["M", "F"])
+
+        dept_opts = {row['dept_name']: row['dept_id'] for i, row in dept_df.iterrows()} if not dept_df.empty else {}
+
+        o_doc_id, o_room, o_dept_id = pick_assignment(assignments, doc_options, room_list, "onsite_assign")
+        if o_dept_id is None:
+            sel_dept = st.selectbox("挂号科室", list(dept_opts.keys()))
+
+        if st.form_submit_button("现场挂号 (生成缴费单)"):
+            if o_name and o_id_card:
+                if o_dept_id is None:
+                    o_dept_id = dept_opts[sel_dept]
+
+                try:
+                    visit_id, duplicate = checkin.register_walk_in(
+                        o_name, o_phone, o_id_card, o_gender, o_dept_id, o_doc_id, o_room, request_key("onsite"))
+                except Exception as e:
+                    st.error(f"操作失败: {e}")
+                else:
+                    if duplicate:
+                        st.info(f"重复提交，该挂号已生成（就诊号 {visit_id}）。")
+                    else:
+                        availability.on_visit_created(o_room)
+                        rotate_request_key("onsite")
+                        st.success(f"现场挂号成功！请引导患者前往缴费。")
+                        st.rerun()
+            else:
+                st.warning("请填写完整的姓名和身份证号。")
+
+
+def _cashier_page():
+    ref = _reference("医生列表", "科室列表")
+    doc_options = ref["医生选项"]
+    dept_filter_opts = _dept_filter_options(ref["科室列表"])
+
+    st.subheader("💰 收银台")
+    f1, f2, f3 = st.columns(3)
+    pay_date = f1.date_input("就诊日期", value=None, key="pay_q_date", help="留空表示不限日期")
+    pay_dept = dept_filter_opts[f2.selectbox("科室", list(dept_filter_opts.keys()), key="pay_q_dept")]
+    doc_filter_opts = {"全部医生": None, **doc_options}
+    pay_doc = doc_filter_opts[f3.selectbox("医生", list(doc_filter_opts.keys()), key="pay_q_doc")]
+    pay_after = page_cursor("pay_page", (pay_date, pay_dept, pay_doc))
+
+    df_pay, has_more = queues.fetch_topay_visits(pay_date, pay_dept, pay_doc, pay_after)
+    if df_pay.empty:
+        st.info("当前没有待缴费的患者。")
+        if pay_after is not None:
+            page_nav("pay_page", False, None)
+    else:
+        pay_key = request_key("pay")
+        c1, c2 = st.columns([1, 2])
+        pay_method = c1.selectbox("默认支付方式", payments.METHODS)
+        c2.caption("勾选要结清的患者并填写分项费用，可一次结清多人；每人的支付方式可单独修改。")
+        editor_df = df_pay.assign(选择=False, 支付方式=pay_method,
+                                  **{name: FEE_DEFAULTS.get(name, 0.0) for name in payments.FEE_ITEMS})
+        edited = st.data_editor(
+            editor_df,
+            column_config={
+                "选择": st.column_config.CheckboxColumn(),
+                "支付方式": st.column_config.SelectboxColumn(options=payments.METHODS, required=True),
+                **{name: st.column_config.NumberColumn(min_value=0.0, step=0.01, format="%.2f", required=True)
+                   for name in payments.FEE_ITEMS},
+            },
+            disabled=list(df_pay.columns),
+            hide_index=True,
+            use_container_width=True,
+            key=f"pay_editor_{pay_key}",
+        )
+        page_nav("pay_page", has_more, int(df_pay['visit_id'].iloc[-1]))
+
+        chosen = edited[edited["选择"]]
+        due = chosen[payments.FEE_ITEMS].sum().sum() if not chosen.empty else 0.0
+        if st.button(f"✅ 确认收款（{len(chosen)} 人，¥ {due:,.2f}）", disabled=chosen.empty):
+            try:
+                bills = [payments.Bill(r["visit_id"], [(name, r[name]) for name in payments.FEE_ITEMS], r["支付方式"])
+                         for _, r in chosen.iterrows()]
+                result = payments.settle(bills, pay_key)
+            except Exception as e:
+                st.error(f"操作失败: {e}")
+            else:
+                if result.settled:
+                    availability.on_visit_settled()
+                    rotate_request_key("pay")
+                    st.balloons()
+                    st.success(("重复提交，已返回先前结果：" if result.duplicate else "缴费成功！") + result.summary())
+                    st.rerun()
+                else:
+                    st.error(f"所选就诊均已结清或不存在，请刷新列表。{result.summary()}")
+
+
+_PAGE_RENDERERS = dict(zip(PAGES, (_verify_page, _onsite_page, _cashier_page)))
+
+
+def render():
+    st.title("🖥️ 前台工作台")
+    with st.expander("📡 今日实时队列（自动刷新）", expanded=False):
+        _live_queue()
+
+    # 只执行选中页面的查询
+    _PAGE_RENDERERS[page_selector("frontdesk_page", PAGES)]()
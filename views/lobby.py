@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""候诊大屏：按诊室显示就诊 / 候诊患者（姓名脱敏），只读变更快照"""
+from datetime import datetime
+
+import streamlit as st
+
+import changefeed
+
+
+@st.fragment(run_every=changefeed.POLL_INTERVAL)
+def _lobby_board():
+    feed = changefeed.get_feed()
+    visits = feed.active_visits()
+    st.caption(f"更新时间 {datetime.now():%H:%M:%S}")
+    by_room = {}
+    for v in visits:
+        if v["status"] != "ToPay":
+            by_room.setdefault(v["room_no"], []).append(v)
+    if not by_room:
+        st.info("当前没有候诊患者。")
+    else:
+        cols = st.columns(min(4, len(by_room)))
+        for i, (room_no, rows) in enumerate(sorted(by_room.items())):
+            with cols[i % len(cols)]:
+                st.subheader(f"🚪 {room_no}")
+                st.caption(f"{rows[0]['dept_name']} · {rows[0]['doctor']}")
+                consulting = [changefeed.mask_name(r["patient_name"]) for r in rows if r["status"] == "Consulting"]
+                waiting = [changefeed.mask_name(r["patient_name"]) for r in rows if r["status"] == "Waiting"]
+                st.markdown(f"**正在就诊**：{'、'.join(consulting) or '—'}")
+                st.markdown(f"**候诊（{len(waiting)}）**：{'、'.join(waiting) or '—'}")
+    topay = [v for v in visits if v["status"] == "ToPay"]
+    if topay:
+        st.markdown("---")
+        st.markdown("### 💰 请以下患者到收费处缴费")
+        st.markdown("　".join(f"{changefeed.mask_name(v['patient_name'])}（{v['visit_id']}）" for v in topay))
+
+
+def render():
+    st.title("📺 候诊叫号")
+    _lobby_board()
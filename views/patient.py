@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""患者在线预约：按科室查看可约时段，占号后写入预约"""
+import streamlit as st
+
+import refdata
+import slots
+
+
+def render():
+    st.title("📱 患者在线预约")
+    dept_df = refdata.get_departments()
+    if dept_df.empty:
+        st.error("数据库中未发现科室信息，请联系管理员初始化数据。")
+    else:
+        dept_options = dict(zip(dept_df['dept_name'], dept_df['dept_id']))
+        # 科室放在表单外：切换科室时立即刷新可约时段
+        selected_dept_name = st.selectbox("选择科室", options=list(dept_options.keys()))
+        target_dept_id = dept_options[selected_dept_name]
+        slot_df = slots.available_slots(target_dept_id)
+        if slot_df.empty:
+            st.warning(f"{selected_dept_name} 近 {slots.BOOKING_DAYS} 天暂无可预约号源，请选择其他科室或稍后再试。")
+        else:
+            slot_options = {
+                slots.slot_label(r.slot_date, r.shift_time, r.remaining): (r.slot_date, r.shift_time)
+                for r in slot_df.itertuples()
+            }
+            selected_slot = st.selectbox("预约时段", options=list(slot_options.keys()))
+            appt_date, shift_time = slot_options[selected_slot]
+            shift_begin, shift_end = slots.SHIFT_HOURS[shift_time]
+            with st.form("appt_form"):
+                col1, col2 = st.columns(2)
+                name = col1.text_input("姓名")
+                phone = col2.text_input("手机号")
+                personal_id = st.text_input("身份证号")
+                arrival_time = st.time_input(f"预计到达时间（{shift_begin:%H:%M}–{shift_end:%H:%M}）",
+                                             value=shift_begin, step=300, key=f"arrival_{shift_time}")
+                submitted = st.form_submit_button("提交预约")
+
+                if submitted:
+                    if not name or not phone:
+                        st.warning("请填写完整的姓名和电话。")
+                    elif slots.shift_of(arrival_time) != shift_time:
+                        st.warning(f"到达时间与所选时段不符，请选择 {shift_begin:%H:%M}–{shift_end:%H:%M}。")
+                    else:
+                        try:
+                            result = slots.book(name, phone, personal_id, target_dept_id, appt_date, arrival_time)
+                        except Exception as e:
+                            st.error(f"预约失败: {e}")
+                        else:
+                            if result.ok:
+                                st.success(f"{result.message}，科室：{selected_dept_name}，预约号 {result.appt_id}")
+                                st.balloons()
+                            else:
+                                st.warning(result.message)
+                                if result.alternatives is not None and not result.alternatives.empty:
+                                    st.info("以下时段仍可预约：" + "、".join(
+                                        slots.slot_label(r.slot_date, r.shift_time, r.remaining)
+                                        for r in result.alternatives.itertuples()
+                                    ))